@@ -3,7 +3,7 @@ Calance Edge Backend
 Flask application providing AI-powered sales enablement API endpoints
 """
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, render_template, send_file, has_request_context
 from flask_cors import CORS
 import os
 import logging
@@ -13,13 +13,33 @@ import re
 import httpx
 import asyncio
 import uuid
-import nest_asyncio
+import time
+import atexit
+import contextlib
+import contextvars
+import hashlib
+import random
+import functools
+import string
+from email.utils import parsedate_to_datetime
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from types import MappingProxyType
+import threading
+import queue
+import sqlite3
+import tempfile
 from reportlab.lib.pagesizes import letter, A4
 from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, Image as RLImage
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import inch
 from reportlab.lib import colors
 from PIL import Image as PILImage
+try:
+    import numpy as np
+except ImportError:
+    # Optional: infographic layout analysis falls back to fixed regions without it
+    np = None
 import io
 import base64
 
@@ -38,17 +58,168 @@ class Config:
     MODEL_PRESENTATION_REFINEMENT = os.environ.get('MODEL_PRESENTATION_REFINEMENT', 'anthropic/claude-sonnet-4.5')
     MODEL_RECRUITING_GENERATION = os.environ.get('MODEL_RECRUITING_GENERATION', 'anthropic/claude-haiku-4.5')
 
+    # Model Fallback Routing: ordered fallback candidates per task (comma-separated)
+    MODEL_FALLBACKS = {
+        'case_study_analysis': [m for m in os.environ.get('MODEL_CASE_STUDY_ANALYSIS_FALLBACKS', 'anthropic/claude-haiku-4.5').split(',') if m],
+        'case_study_image': [m for m in os.environ.get('MODEL_CASE_STUDY_IMAGE_FALLBACKS', 'google/gemini-2.5-flash-image-preview').split(',') if m],
+        'case_study_refinement': [m for m in os.environ.get('MODEL_CASE_STUDY_REFINEMENT_FALLBACKS', 'anthropic/claude-haiku-4.5').split(',') if m],
+        'presentation_generation': [m for m in os.environ.get('MODEL_PRESENTATION_GENERATION_FALLBACKS', '').split(',') if m],
+        'recruiting_generation': [m for m in os.environ.get('MODEL_RECRUITING_GENERATION_FALLBACKS', 'anthropic/claude-sonnet-4.5').split(',') if m]
+    }
+    # A candidate is skipped while its rolling p95 latency (seconds) or error rate is over budget
+    ROUTER_P95_THRESHOLDS = json.loads(os.environ.get('ROUTER_P95_THRESHOLDS', '{"case_study_analysis": 60, "case_study_image": 120}'))
+    ROUTER_DEFAULT_P95_THRESHOLD = float(os.environ.get('ROUTER_DEFAULT_P95_THRESHOLD', '90'))
+    ROUTER_MAX_ERROR_RATE = float(os.environ.get('ROUTER_MAX_ERROR_RATE', '0.5'))
+    ROUTER_WINDOW_SECONDS = float(os.environ.get('ROUTER_WINDOW_SECONDS', '600'))
+    ROUTER_MIN_SAMPLES = int(os.environ.get('ROUTER_MIN_SAMPLES', '5'))
+
+    # Hedged Requests for the infographic stage (off by default; cap is per worker)
+    HEDGE_ENABLED = os.environ.get('HEDGE_ENABLED', 'False').lower() == 'true'
+    HEDGE_PERCENTILE = float(os.environ.get('HEDGE_PERCENTILE', '90'))
+    HEDGE_DEFAULT_DELAY = float(os.environ.get('HEDGE_DEFAULT_DELAY', '75'))
+    HEDGE_MIN_DELAY = float(os.environ.get('HEDGE_MIN_DELAY', '20'))
+    HEDGE_MAX_PER_MINUTE = int(os.environ.get('HEDGE_MAX_PER_MINUTE', '4'))
+
+    # Static Brand Assets
+    STATIC_ASSET_CHECK_INTERVAL = float(os.environ.get('STATIC_ASSET_CHECK_INTERVAL', '5'))
+    LOGO_PROMPT_VARIANT = os.environ.get('LOGO_PROMPT_VARIANT', 'original')
+    LOGO_PROMPT_MAX_SIZE = int(os.environ.get('LOGO_PROMPT_MAX_SIZE', '512'))
+
+    # Provider Prompt Caching (cache_control breakpoints on static prompt prefixes)
+    PROMPT_CACHE_ENABLED = os.environ.get('PROMPT_CACHE_ENABLED', 'True').lower() == 'true'
+    PROMPT_CACHE_MODELS = tuple(
+        prefix.strip() for prefix in os.environ.get('PROMPT_CACHE_MODELS', 'anthropic/,google/').split(',')
+        if prefix.strip()
+    )
+
+    # Circuit Breakers per upstream model (state is per worker)
+    BREAKER_ENABLED = os.environ.get('BREAKER_ENABLED', 'True').lower() == 'true'
+    BREAKER_FAILURE_THRESHOLD = int(os.environ.get('BREAKER_FAILURE_THRESHOLD', '5'))
+    BREAKER_RESET_SECONDS = float(os.environ.get('BREAKER_RESET_SECONDS', '30'))
+    BREAKER_HALF_OPEN_PROBES = int(os.environ.get('BREAKER_HALF_OPEN_PROBES', '1'))
+
+    # OpenRouter HTTP Connection Pool (one pooled client per worker process)
+    OPENROUTER_HTTP2 = os.environ.get('OPENROUTER_HTTP2', 'True').lower() == 'true'
+    OPENROUTER_MAX_CONNECTIONS = int(os.environ.get('OPENROUTER_MAX_CONNECTIONS', '100'))
+    OPENROUTER_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('OPENROUTER_MAX_KEEPALIVE_CONNECTIONS', '20'))
+    OPENROUTER_KEEPALIVE_EXPIRY = float(os.environ.get('OPENROUTER_KEEPALIVE_EXPIRY', '60'))
+    OPENROUTER_CONNECT_TIMEOUT = float(os.environ.get('OPENROUTER_CONNECT_TIMEOUT', '10'))
+    OPENROUTER_POOL_TIMEOUT = float(os.environ.get('OPENROUTER_POOL_TIMEOUT', '30'))
+
+    # Local data directory for state shared by all workers on the host
+    DATA_DIR = os.environ.get('DATA_DIR', os.path.join(tempfile.gettempdir(), 'calance-edge'))
+
+    # Background Job Configuration
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', '8'))
+    JOB_TTL_SECONDS = int(os.environ.get('JOB_TTL_SECONDS', '3600'))
+    # Workers refresh their jobs' heartbeat; a job not refreshed within the lease is failed
+    JOB_HEARTBEAT_SECONDS = float(os.environ.get('JOB_HEARTBEAT_SECONDS', '15'))
+    JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', '90'))
+    # How often /api/jobs/<id>/stream re-reads the shared job store
+    JOB_STREAM_POLL_SECONDS = float(os.environ.get('JOB_STREAM_POLL_SECONDS', '1'))
+
+    # Case Study Version History (undo), shared by all workers
+    VERSION_MAX_PER_GENERATION = int(os.environ.get('VERSION_MAX_PER_GENERATION', '3'))
+    VERSION_TTL_SECONDS = int(os.environ.get('VERSION_TTL_SECONDS', '604800'))
+
+    # Image Blob Store (content-addressed images served from /api/images/<hash>)
+    IMAGE_BLOB_TTL_SECONDS = int(os.environ.get('IMAGE_BLOB_TTL_SECONDS', '604800'))
+
+    # Binary PDF export: rendered PDFs larger than this spill to a temp file
+    PDF_SPOOL_MAX_BYTES = int(os.environ.get('PDF_SPOOL_MAX_BYTES', str(8 * 1024 * 1024)))
+
+    # Decoded image cache shared by crop, PDF and refinement paths (per worker)
+    IMAGE_HANDLE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_HANDLE_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+    # Region crops built in the background after each infographic, reused by refinement
+    CROP_PYRAMID_ENABLED = os.environ.get('CROP_PYRAMID_ENABLED', 'True').lower() == 'true'
+
+    # Detect infographic regions per image (needs NumPy; fixed regions otherwise)
+    LAYOUT_ANALYSIS_ENABLED = os.environ.get('LAYOUT_ANALYSIS_ENABLED', 'True').lower() == 'true'
+
+    # Downscale/recompress reference images before they are sent upstream
+    UPLOAD_IMAGE_OPTIMIZE = os.environ.get('UPLOAD_IMAGE_OPTIMIZE', 'True').lower() == 'true'
+    UPLOAD_REFERENCE_MAX_SIDE = int(os.environ.get('UPLOAD_REFERENCE_MAX_SIDE', '1024'))
+    UPLOAD_REFERENCE_MAX_BYTES = int(os.environ.get('UPLOAD_REFERENCE_MAX_BYTES', str(350 * 1024)))
+    UPLOAD_CROP_MAX_SIDE = int(os.environ.get('UPLOAD_CROP_MAX_SIDE', '768'))
+    UPLOAD_CROP_MAX_BYTES = int(os.environ.get('UPLOAD_CROP_MAX_BYTES', str(150 * 1024)))
+    UPLOAD_LOGO_MAX_BYTES = int(os.environ.get('UPLOAD_LOGO_MAX_BYTES', str(64 * 1024)))
+    UPLOAD_VARIANT_CACHE_MAX_BYTES = int(os.environ.get('UPLOAD_VARIANT_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+    UPLOAD_CROP_THUMB_MAX_SIDE = int(os.environ.get('UPLOAD_CROP_THUMB_MAX_SIDE', '384'))
+    UPLOAD_CROP_THUMB_MAX_BYTES = int(os.environ.get('UPLOAD_CROP_THUMB_MAX_BYTES', str(40 * 1024)))
+
+    # Refinement context budget: as many crops as fit alongside the full infographic
+    REFINEMENT_IMAGE_MAX_BYTES = int(os.environ.get('REFINEMENT_IMAGE_MAX_BYTES', str(800 * 1024)))
+    REFINEMENT_IMAGE_MAX_SECONDS = float(os.environ.get('REFINEMENT_IMAGE_MAX_SECONDS', '6'))
+    # Estimated upstream cost of an image: fixed per image plus per MB of payload
+    REFINEMENT_IMAGE_SECONDS_EACH = float(os.environ.get('REFINEMENT_IMAGE_SECONDS_EACH', '0.75'))
+    REFINEMENT_IMAGE_SECONDS_PER_MB = float(os.environ.get('REFINEMENT_IMAGE_SECONDS_PER_MB', '4'))
+
+    # Export Render Cache (rendered PDFs keyed by content hash; memory LRU spilling to disk)
+    RENDER_CACHE_MEMORY_MAX_BYTES = int(os.environ.get('RENDER_CACHE_MEMORY_MAX_BYTES', str(64 * 1024 * 1024)))
+    RENDER_CACHE_DISK_ENABLED = os.environ.get('RENDER_CACHE_DISK_ENABLED', 'True').lower() == 'true'
+    RENDER_CACHE_DISK_MAX_BYTES = int(os.environ.get('RENDER_CACHE_DISK_MAX_BYTES', str(512 * 1024 * 1024)))
+    # Return images as /api/images links instead of data URLs unless a request says otherwise
+    IMAGE_LINKS_DEFAULT = os.environ.get('IMAGE_LINKS_DEFAULT', 'False').lower() == 'true'
+    # Public base URL for image links; links are relative when unset
+    PUBLIC_API_URL = os.environ.get('PUBLIC_API_URL', '').rstrip('/')
+
+    # Stream Claude analysis tokens so Step 2 can start before Step 1 finishes
+    ANALYSIS_STREAMING = os.environ.get('ANALYSIS_STREAMING', 'True').lower() == 'true'
+
+    # LLM Response Cache (opt-in per request with "cache": "prefer")
+    LLM_CACHE_MEMORY_MAX_BYTES = int(os.environ.get('LLM_CACHE_MEMORY_MAX_BYTES', str(64 * 1024 * 1024)))
+    LLM_CACHE_DISK_ENABLED = os.environ.get('LLM_CACHE_DISK_ENABLED', 'False').lower() == 'true'
+    LLM_CACHE_DISK_MAX_BYTES = int(os.environ.get('LLM_CACHE_DISK_MAX_BYTES', str(512 * 1024 * 1024)))
+    LLM_CACHE_TTLS = {
+        'case_study': int(os.environ.get('LLM_CACHE_TTL_CASE_STUDY', '86400')),
+        'refinement': int(os.environ.get('LLM_CACHE_TTL_REFINEMENT', '3600')),
+        'presentation': int(os.environ.get('LLM_CACHE_TTL_PRESENTATION', '86400')),
+        'recruiting': int(os.environ.get('LLM_CACHE_TTL_RECRUITING', '86400'))
+    }
+
+    # Upstream Retry Policy (defaults, with optional per-model overrides as JSON)
+    RETRY_MAX_ATTEMPTS = int(os.environ.get('RETRY_MAX_ATTEMPTS', '3'))
+    RETRY_DEADLINE_SECONDS = float(os.environ.get('RETRY_DEADLINE_SECONDS', '180'))
+    RETRY_BASE_DELAY = float(os.environ.get('RETRY_BASE_DELAY', '1.0'))
+    RETRY_MAX_DELAY = float(os.environ.get('RETRY_MAX_DELAY', '20'))
+    RETRY_MODEL_POLICIES = json.loads(os.environ.get('RETRY_MODEL_POLICIES', '{}'))
+
+    # Per-model Rate/Concurrency Governor (shared by all workers; 0 disables a limit)
+    GOVERNOR_ENABLED = os.environ.get('GOVERNOR_ENABLED', 'True').lower() == 'true'
+    GOVERNOR_DEFAULT_RPM = int(os.environ.get('GOVERNOR_DEFAULT_RPM', '120'))
+    GOVERNOR_DEFAULT_TPM = int(os.environ.get('GOVERNOR_DEFAULT_TPM', '400000'))
+    GOVERNOR_DEFAULT_MAX_IN_FLIGHT = int(os.environ.get('GOVERNOR_DEFAULT_MAX_IN_FLIGHT', '32'))
+    GOVERNOR_MODEL_LIMITS = json.loads(os.environ.get('GOVERNOR_MODEL_LIMITS', '{}'))
+    GOVERNOR_MAX_WAIT_SECONDS = float(os.environ.get('GOVERNOR_MAX_WAIT_SECONDS', '120'))
+    GOVERNOR_LEASE_SECONDS = float(os.environ.get('GOVERNOR_LEASE_SECONDS', '600'))
+
     # CORS Configuration
     CORS_ORIGINS = os.environ.get('CORS_ORIGINS',
         'http://localhost:3000,http://127.0.0.1:3000,http://localhost:5173,http://127.0.0.1:5173,http://localhost:5174,http://127.0.0.1:5174,http://localhost:5175,http://127.0.0.1:5175,http://localhost:5176,http://127.0.0.1:5176').split(',')
 
+class CalanceFlask(Flask):
+    """Flask app that runs async views on the worker's persistent event loop"""
+
+    def async_to_sync(self, func):
+        # Route coroutines share one loop per worker (see AsyncLoopRunner) instead
+        # of a fresh loop per request, so in-flight generations only hold a thread
+        # Async views return plain dicts, which Flask serialises back on the request
+        # thread after this returns, so large results are never encoded on the loop
+        def wrapper(*args, **kwargs):
+            if has_request_context() and request.is_json:
+                # Read and parse the body on the request thread; the view's get_json()
+                # then returns the cached result instead of parsing on the shared loop.
+                # A body that does not parse is rejected here rather than re-parsed there.
+                if request.get_json(silent=True) is None and request.get_data():
+                    return jsonify({"error": "Request body is not valid JSON"}), 400
+            return async_runner.run(func(*args, **kwargs))
+        return wrapper
+
 # Initialize Flask app
-app = Flask(__name__)
+app = CalanceFlask(__name__)
 app.config.from_object(Config)
 
-# Apply nest_asyncio to allow async functions in Flask
-nest_asyncio.apply()
-
 # Enable CORS for frontend
 CORS(app, origins=app.config['CORS_ORIGINS'])
 
@@ -93,59 +264,389 @@ CALANCE_BRAND = {
     }
 }
 
+class StaticAssetRegistry:
+    """Brand assets loaded, validated and encoded once per process
+
+    Each asset is read from disk once and kept with its precomputed variants
+    (re-encoded format and/or a bounded size for prompts) as raw bytes and data
+    URLs. On access the file's mtime is re-checked at most every
+    STATIC_ASSET_CHECK_INTERVAL seconds and the asset is rebuilt when it changed;
+    a file that fails validation keeps the last good version in service. Values
+    derived from a variant (see derived()) are kept until the asset is rebuilt.
+    """
+
+    MIME_TYPES = {"WEBP": "image/webp", "PNG": "image/png", "JPEG": "image/jpeg"}
+
+    def __init__(self, base_dir):
+        self.base_dir = base_dir
+        self._specs = {}
+        self._assets = {}
+        self._checked_at = {}
+        self._lock = threading.Lock()
+        self._stats = {"loads": 0, "reloads": 0, "load_errors": 0}
+
+    def register(self, name, filename, variants=None):
+        """Register an asset; variants maps a name to {"format": ..., "max_size": ...}"""
+        self._specs[name] = {"filename": filename, "variants": variants or {}}
+
+    def preload(self):
+        for name in self._specs:
+            self._refresh(name, force=True)
+
+    def _encode(self, data, mime):
+        return {
+            "bytes": data,
+            "mime": mime,
+            "data_url": f"data:{mime};base64,{base64.b64encode(data).decode('utf-8')}",
+            "sha256": hashlib.sha256(data).hexdigest()
+        }
+
+    def _build(self, name, path):
+        with open(path, "rb") as f:
+            raw = f.read()
+        with PILImage.open(io.BytesIO(raw)) as img:
+            img.verify()
+        with PILImage.open(io.BytesIO(raw)) as img:
+            source_format = img.format
+            variants = {"original": self._encode(raw, self.MIME_TYPES.get(source_format, "application/octet-stream"))}
+            for variant, spec in self._specs[name]["variants"].items():
+                fmt = spec.get("format", source_format).upper()
+                rendered = img.copy()
+                if spec.get("max_size"):
+                    rendered.thumbnail((spec["max_size"], spec["max_size"]), PILImage.LANCZOS)
+                if fmt == "JPEG" and rendered.mode not in ("RGB", "L"):
+                    rendered = rendered.convert("RGB")
+                buffer = io.BytesIO()
+                rendered.save(buffer, format=fmt)
+                variants[variant] = self._encode(buffer.getvalue(), self.MIME_TYPES.get(fmt, "application/octet-stream"))
+        return variants
+
+    def _refresh(self, name, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked_at.get(name, 0) < app.config['STATIC_ASSET_CHECK_INTERVAL']:
+            return
+        path = os.path.join(self.base_dir, self._specs[name]["filename"])
+        with self._lock:
+            self._checked_at[name] = now
+            try:
+                mtime = os.path.getmtime(path)
+                current = self._assets.get(name)
+                if current and current["mtime"] == mtime:
+                    return
+                self._assets[name] = {"mtime": mtime, "variants": self._build(name, path), "derived": {}}
+                self._stats["reloads" if current else "loads"] += 1
+                logger.info(f"{'Reloaded' if current else 'Loaded'} static asset {name} from {path}")
+            except Exception as e:
+                self._stats["load_errors"] += 1
+                logger.error(f"Failed to load static asset {name} from {path}: {e}")
+
+    def get(self, name, variant="original"):
+        """Encoded variant of an asset ({"bytes", "mime", "data_url", "sha256"}), or None"""
+        if name not in self._specs:
+            return None
+        self._refresh(name)
+        asset = self._assets.get(name)
+        return asset["variants"].get(variant) if asset else None
+
+    def data_url(self, name, variant="original"):
+        entry = self.get(name, variant)
+        return entry["data_url"] if entry else None
+
+    def derived(self, name, variant, key, build):
+        """build(data_url) for a variant, computed once per loaded version of the asset"""
+        if self.get(name, variant) is None:
+            return None
+        asset = self._assets[name]
+        entry = asset["variants"][variant]
+        with self._lock:
+            cached = asset["derived"].get((variant, key))
+        if cached is None:
+            cached = build(entry["data_url"])
+            with self._lock:
+                asset["derived"][(variant, key)] = cached
+        return cached
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "assets": {
+                    name: {variant: len(entry["bytes"]) for variant, entry in asset["variants"].items()}
+                    for name, asset in self._assets.items()
+                }
+            }
+
+# Logo is in same directory as app.py in Docker container
+static_assets = StaticAssetRegistry(os.path.dirname(os.path.abspath(__file__)))
+static_assets.register("logo", "calance-logo.webp", variants={
+    "png": {"format": "PNG"},
+    "prompt": {"format": "WEBP", "max_size": app.config['LOGO_PROMPT_MAX_SIZE']}
+})
+static_assets.preload()
+
 def load_logo_as_base64():
-    """Load Calance logo and convert to base64 data URL for image generation"""
-    try:
-        # Use relative path - logo is in same directory as app.py in Docker container
-        import os
-        logo_path = os.path.join(os.path.dirname(__file__), "calance-logo.webp")
-        with open(logo_path, "rb") as f:
-            encoded = base64.b64encode(f.read()).decode('utf-8')
-        logger.info(f"Successfully loaded logo from {logo_path}")
-        return f"data:image/webp;base64,{encoded}"
-    except Exception as e:
-        logger.error(f"Failed to load logo from {logo_path if 'logo_path' in locals() else 'unknown path'}: {e}")
-        return None
+    """Calance logo as a base64 data URL for image generation (LOGO_PROMPT_VARIANT)"""
+    logo = static_assets.derived(
+        "logo", app.config['LOGO_PROMPT_VARIANT'], "upload",
+        lambda data_url: upload_images.data_url(data_url, "logo")
+    )
+    if logo is None:
+        logger.error("Calance logo is not available")
+    return logo
 
 # ============================================
-# AI Service Integration
+# Prompt Templates
 # ============================================
 
-class AIService:
-    """Service for interacting with OpenRouter API"""
+# Rough BPE-style pieces: letter runs, digit runs, and single other characters
+TOKEN_PIECE_PATTERN = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
 
-    def __init__(self):
-        self.api_key = app.config.get('OPENROUTER_API_KEY')
-        self.base_url = app.config.get('OPENROUTER_BASE_URL')
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": app.config.get('CORS_ORIGINS', ['http://localhost:5174'])[0],  # First CORS origin
-            "X-Title": "Calance Edge"
-        }
+# Only short texts (template literals, field values) repeat often enough to
+# memoise; user notes are counted directly so they never pin memory
+TOKEN_COUNT_MEMO_MAX_CHARS = 512
+# Per-template bound on memoised budgeted renders, in characters of output
+PROMPT_RENDER_MEMO_MAX_CHARS = 256 * 1024
 
-    async def _analyze_freeform_content(self, raw_notes, client_name='', industry=''):
-        """Step 1: Use Claude to extract CONCISE BULLET POINTS for infographic generation"""
+def approx_token_count(text):
+    """Local approximation of an LLM tokenizer's count for text
 
-        analysis_prompt = f"""You are extracting key information from project notes to create a ONE-PAGE INFOGRAPHIC case study.
+    Short words count as one token and long words as one per ~6 letters, digits
+    group in threes, and punctuation/non-ASCII characters count one each.
+    """
+    if len(text) > TOKEN_COUNT_MEMO_MAX_CHARS:
+        return _count_tokens(text)
+    return _count_short_tokens(text)
+
+@functools.lru_cache(maxsize=4096)
+def _count_short_tokens(text):
+    return _count_tokens(text)
+
+def _count_tokens(text):
+    tokens = 0
+    for piece in TOKEN_PIECE_PATTERN.findall(text):
+        if piece[0].isalpha() and piece.isascii():
+            tokens += 1 + (len(piece) - 1) // 6
+        elif piece[0].isdigit():
+            tokens += 1 + (len(piece) - 1) // 3
+        else:
+            tokens += 1
+    return tokens
 
-CLIENT NOTES:
-{raw_notes}
+def fit_text_to_tokens(text, max_tokens):
+    """Degrade text until it fits max_tokens
 
-METADATA:
-- Client Name: {client_name or 'Not provided'}
-- Industry: {industry or 'Not provided'}
+    Trailing lines are dropped first (bullet lists lose their last items), then
+    the remaining text is cut at a word boundary with an ellipsis. Never splits
+    a word; returns '' when not even one word fits.
+    """
+    if max_tokens is None or approx_token_count(text) <= max_tokens:
+        return text
+
+    # Candidates are counted without memoisation: each is only ever tried once
+    lines = text.split('\n')
+    while len(lines) > 1:
+        lines.pop()
+        candidate = '\n'.join(lines).rstrip()
+        if _count_tokens(candidate) <= max_tokens:
+            return candidate
+
+    words = lines[0].split(' ')
+    low, high = 0, len(words)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if _count_tokens(' '.join(words[:middle]) + '…') <= max_tokens:
+            low = middle
+        else:
+            high = middle - 1
+    return ' '.join(words[:low]).rstrip(' ,;:') + '…' if low else ''
+
+def allocate_token_budget(needs, available, priorities, minimums):
+    """Split available tokens between slots
+
+    Every slot first gets its minimum share (highest priority first, so low
+    priority minimums give way when the budget is tight). The rest goes out by
+    priority level; within a level, short slots are filled completely and long
+    ones share what remains. Deterministic for a given input.
+    """
+    grants = {}
+    remaining = max(available, 0)
+    by_priority = sorted(needs, key=lambda slot: -priorities.get(slot, 0))
+    for slot in by_priority:
+        grants[slot] = min(needs[slot], minimums.get(slot, 0), remaining)
+        remaining -= grants[slot]
+
+    for level in sorted({priorities.get(slot, 0) for slot in needs}, reverse=True):
+        level_slots = sorted((slot for slot in needs if priorities.get(slot, 0) == level),
+                             key=lambda slot: needs[slot])
+        for index, slot in enumerate(level_slots):
+            share = remaining // (len(level_slots) - index)
+            extra = min(needs[slot] - grants[slot], share)
+            grants[slot] += extra
+            remaining -= extra
+    return grants
+
+class PromptTemplate:
+    """Prompt template compiled once into static text and named slots
+
+    Constants (brand JSON, tagline, ...) are folded into the static text at
+    compile time, so rendering is a single join over pre-built segments. The
+    leading static run is exposed as `prefix`; templates keep instructions first
+    and request data last so that prefix is identical across requests and can be
+    reused by provider-side prompt caching.
+
+    render() enforces per-slot token `limits` and an overall max_tokens budget
+    while assembling. Static text is never trimmed; the slots split whatever
+    remains according to their `priorities` and `min_tokens` shares. Budgeted
+    renders are memoised under a hash of their input, bounded by
+    PROMPT_RENDER_MEMO_MAX_CHARS; unbudgeted ones are plain joins.
+    """
+
+    def __init__(self, text, constants=None, limits=None, priorities=None, min_tokens=None):
+        constants = constants or {}
+        self.limits = limits or {}
+        self.priorities = priorities or {}
+        self.min_tokens = min_tokens or {}
+        self._parts = []
+        literal = []
+        for text_part, field, spec, conversion in string.Formatter().parse(text):
+            literal.append(text_part)
+            if field is None:
+                continue
+            if spec or conversion:
+                raise ValueError(f"Prompt slot {{{field}}} cannot use format specs or conversions")
+            if field in constants:
+                literal.append(str(constants[field]))
+                continue
+            self._parts.append((''.join(literal), field))
+            literal = []
+        self._parts.append((''.join(literal), None))
+
+        self.slot_counts = {}
+        for _, slot in self._parts:
+            if slot:
+                self.slot_counts[slot] = self.slot_counts.get(slot, 0) + 1
+        self.static_tokens = sum(approx_token_count(literal) for literal, _ in self._parts)
+        self.prefix = self._parts[0][0]
+        self._memo = OrderedDict()
+        self._memo_chars = 0
+        self._memo_lock = threading.Lock()
+
+    def _join(self, texts):
+        return ''.join(literal + (texts[slot] if slot else '') for literal, slot in self._parts)
+
+    def _memoised(self, key, render):
+        with self._memo_lock:
+            text = self._memo.get(key)
+            if text is not None:
+                self._memo.move_to_end(key)
+                return text
+        text = render()
+        with self._memo_lock:
+            if key not in self._memo and len(text) <= PROMPT_RENDER_MEMO_MAX_CHARS:
+                self._memo[key] = text
+                self._memo_chars += len(text)
+                while self._memo_chars > PROMPT_RENDER_MEMO_MAX_CHARS:
+                    _, evicted = self._memo.popitem(last=False)
+                    self._memo_chars -= len(evicted)
+        return text
+
+    def _render_budgeted(self, max_tokens, items):
+        texts = {slot: fit_text_to_tokens(text, self.limits.get(slot)) for slot, text in items}
+        if max_tokens is not None:
+            needs = {slot: approx_token_count(text) * self.slot_counts[slot] for slot, text in texts.items()}
+            minimums = {slot: tokens * self.slot_counts[slot] for slot, tokens in self.min_tokens.items()}
+            grants = allocate_token_budget(needs, max_tokens - self.static_tokens, self.priorities, minimums)
+            texts = {slot: fit_text_to_tokens(text, grants[slot] // self.slot_counts[slot])
+                     for slot, text in texts.items()}
+        return self._join(texts)
+
+    def render(self, max_tokens=None, **values):
+        missing = set(self.slot_counts) - set(values)
+        if missing:
+            raise KeyError(f"Missing prompt slots: {', '.join(sorted(missing))}")
+        items = tuple((slot, str(values[slot])) for slot in self.slot_counts)
+        if max_tokens is None and not any(slot in self.limits for slot in self.slot_counts):
+            return self._join(dict(items))
+        key = hashlib.sha256(json.dumps([max_tokens, items], ensure_ascii=False).encode('utf-8')).digest()
+        return self._memoised(key, lambda: self._render_budgeted(max_tokens, items))
+
+    def render_parts(self, max_tokens=None, **values):
+        """Render as chat content parts: the static prefix, then the rest"""
+        text = self.render(max_tokens, **values)
+        return [{"type": "text", "text": self.prefix}, {"type": "text", "text": text[len(self.prefix):]}]
+
+# Providers ignore cache breakpoints on shorter prefixes
+PROMPT_CACHE_MIN_TOKENS = 1024
+# Per-image prompt cost used when sizing a prefix (Gemini bills a fixed 258)
+PROMPT_CACHE_IMAGE_TOKENS = 258
+
+def content_token_estimate(parts):
+    """Approximate prompt tokens for a message content (string or parts list)"""
+    if isinstance(parts, str):
+        return approx_token_count(parts)
+    return sum(
+        approx_token_count(part.get('text', '')) if part.get('type') == 'text' else PROMPT_CACHE_IMAGE_TOKENS
+        for part in parts
+    )
+
+def with_cache_breakpoint(messages, static_count):
+    """Messages with a cache_control breakpoint after the first static_count parts of the last one
+
+    Earlier messages count towards the cached prefix. The breakpoint is only added
+    when that prefix meets PROMPT_CACHE_MIN_TOKENS; AIService strips it for models
+    outside PROMPT_CACHE_MODELS.
+    """
+    *earlier, last = messages
+    parts = list(last['content'])
+    prefix_tokens = sum(content_token_estimate(message['content']) for message in earlier)
+    prefix_tokens += content_token_estimate(parts[:static_count])
+    if prefix_tokens < PROMPT_CACHE_MIN_TOKENS:
+        return messages
+    parts[static_count - 1] = {**parts[static_count - 1], "cache_control": {"type": "ephemeral"}}
+    return earlier + [{**last, "content": parts}]
+
+def has_cache_breakpoint(payload):
+    return any(
+        isinstance(message.get('content'), list)
+        and any('cache_control' in part for part in message['content'])
+        for message in payload.get('messages', [])
+    )
+
+def prompt_token_usage(usage):
+    """Cached vs uncached prompt tokens from an OpenRouter usage block"""
+    usage = usage or {}
+    details = usage.get('prompt_tokens_details') or {}
+    prompt_tokens = usage.get('prompt_tokens') or 0
+    cached = details.get('cached_tokens') or 0
+    return {
+        "prompt_tokens": prompt_tokens,
+        "cached_prompt_tokens": cached,
+        "uncached_prompt_tokens": max(0, prompt_tokens - cached),
+        "cache_write_tokens": details.get('cache_write_tokens') or 0,
+        "completion_tokens": usage.get('completion_tokens') or 0
+    }
+
+BRAND_JSON = json.dumps(CALANCE_BRAND, indent=2)
+
+ANALYSIS_PROMPT = PromptTemplate("""You are extracting key information from project notes to create a ONE-PAGE INFOGRAPHIC case study.
 
 CRITICAL: Extract CONCISE bullet points, NOT paragraphs. This will be used for a visual infographic.
 
-Return a JSON object with this structure:
+Return a JSON object with this structure, writing the fields in exactly this order:
 
 {{
   "clientName": "Client name from notes",
   "industry": "Specific industry sector",
 
   "title": "Compelling headline with key result (8-12 words max)",
-  "subtitle": "One-line value proposition (under 15 words)",
+
+  "metrics": [
+    {{
+      "label": "Short metric name (3-4 words)",
+      "value": "The key number (e.g., '85%', '2.5x', '$2.3M')",
+      "context": "Brief context (e.g., 'faster', 'increase', 'saved')"
+    }}
+  ],
 
   "challengeBullets": [
     "Challenge point 1 - ONE sentence max",
@@ -167,13 +668,7 @@ Return a JSON object with this structure:
     "Result with specific number - ONE sentence max"
   ],
 
-  "metrics": [
-    {{
-      "label": "Short metric name (3-4 words)",
-      "value": "The key number (e.g., '85%', '2.5x', '$2.3M')",
-      "context": "Brief context (e.g., 'faster', 'increase', 'saved')"
-    }}
-  ],
+  "subtitle": "One-line value proposition (under 15 words)",
 
   "technologies": ["Tech 1", "Tech 2", "Tech 3"],
 
@@ -191,157 +686,1716 @@ RULES:
 
 GOOD bullet: "Reduced deal evaluation from 3-4 weeks to same-day"
 BAD bullet: "The platform significantly improved the efficiency of deal evaluation processes across all divisions, enabling teams to complete assessments much faster than before."
-"""
 
-        try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json={
-                        "model": app.config['MODEL_CASE_STUDY_ANALYSIS'],
-                        "messages": [
-                            {
-                                "role": "system",
-                                "content": "You are a professional business analyst and expert storyteller creating compelling case studies. Return ONLY valid JSON with rich narrative content based on the provided notes. Use specific facts from notes while creating engaging business narratives."
-                            },
-                            {
-                                "role": "user",
-                                "content": analysis_prompt
-                            }
-                        ],
-                        "temperature": 0.5,  # Balanced for accuracy + narrative creativity
-                        "max_tokens": 6000  # Increased for full narrative content
-                    },
-                    timeout=90.0  # Increased timeout for longer generation
+CLIENT NOTES:
+{raw_notes}
+
+METADATA:
+- Client Name: {client_name}
+- Industry: {industry}
+""")
+
+# OpenRouter function-call limit for the infographic request (~3000 characters)
+INFOGRAPHIC_PROMPT_MAX_TOKENS = 750
+
+INFOGRAPHIC_PROMPT = PromptTemplate("""Create a one-page case study infographic.
+
+BRANDING (use image_0 as logo reference):
+- Header: Navy (#1e3a5f) bar with Calance logo on left, "CASE STUDY" badge on right
+- Footer: Navy bar with "calance.com" left, "A GROUP COMPANY OF DTS CORPORATION, JAPAN" right
+- Colors: Navy primary, Blue (#2563eb) accent, Orange (#f97316) highlights, white background
+
+STYLE: Professional with data visualizations for metrics.
+
+CONTENT:
+Client: {client_name} | {industry}
+Headline: {title}
+
+Challenge: {challenge}
+Solution: {solution}
+Results: {results}
+
+Metrics: {metrics}""", priorities={
+    "client_name": 3, "title": 3, "industry": 2, "metrics": 2, "results": 2, "challenge": 1, "solution": 1
+}, min_tokens={
+    "client_name": 6, "industry": 4, "title": 12, "challenge": 10, "solution": 10, "results": 10, "metrics": 10
+})
+
+GENERATION_PROMPT = PromptTemplate("""You are creating a professional case study for Calance. I'm providing you with the Calance logo image and case study information.
+
+YOUR TASK: Create a professional 8.5x11 case study DOCUMENT IMAGE that communicates the value of this project, AND provide the detailed text content as JSON.
+
+==== PART 1: CREATE THE DOCUMENT IMAGE ====
+
+Create an 8.5x11 image that looks like a professional business case study document. This should be a complete, polished document layout (NOT separate individual images).
+
+BRAND GUIDELINES:
+{brand_json}
+
+DESIGN STYLE:
+- Clean, corporate, professional business document (NOT a flyer or poster)
+- Use data visualization elements for numbers
+- Color scheme: Navy (#1e3a5f), Blue (#2563eb), Orange (#f97316) accents
+- Professional typography with strong visual hierarchy
+- White space and clear section separation
+- Similar quality to a professional consulting firm case study
+
+==== PART 2: PROVIDE JSON CONTENT ====
+
+Also provide the complete case study content as a JSON object for text-based rendering.
+
+SYNTHESIS REQUIREMENTS:
+1. Create a compelling narrative arc (before/challenge → intervention/solution → transformation/results)
+2. Add industry context and business impact depth
+3. Emphasize business outcomes over technical details
+4. Include quantified results (synthesize realistic ranges if needed)
+5. Use professional, consultative tone
+
+OUTPUT FORMAT: Return a JSON object with this structure:
+{{
+  "title": "Compelling headline leading with transformation/result",
+  "subtitle": "Descriptive tagline about the business impact",
+  "executiveSummary": "2-3 sentence hook that tells the transformation story",
+  "challenge": "Enhanced narrative with industry context, business impact, and emotional resonance (3-4 rich paragraphs)",
+  "solution": "How Calance uniquely addressed the challenge - approach, methodology, and why it worked (3-4 paragraphs)",
+  "implementation": "Key milestones, timeline, and delivery approach (2-3 paragraphs)",
+  "results": "Quantified business outcomes and ongoing impact (2-3 paragraphs)",
+  "testimonial": "Client-perspective testimonial-ready quote",
+  "roi": "Powerful ROI statement with specific numbers",
+  "futureOutlook": "Ongoing partnership and strategic next phases (1-2 paragraphs)"
+}}
+
+==== CASE STUDY INFORMATION ====
+Client: {client_name}
+Industry: {industry}
+Challenge: {challenge}
+Solution: {solution}{details}
+
+LAYOUT REQUIREMENTS:
+- Header: Place the Calance logo (provided) at top-left + tagline "{tagline}" at top-right
+- Title section: Create a compelling case study title in large navy text (use colors from brand guidelines)
+- Three-column layout with visual hierarchy:
+  * THE CHALLENGE (left column)
+    - Key pain points in bullet format with icons
+    - Highlight: "{challenge_highlight}"
+  * OUR SOLUTION (middle column)
+    - Technical highlights in bullet format
+    - Solution summary: "{solution_highlight}"
+  * RESULTS & IMPACT (right column)
+    - Prominent financial metrics display
+    - ROI visualization
+- Highlight key metrics in large, eye-catching text
+- Footer: Contact info - {website} | {address}
+
+CONTENT TO VISUALIZE:
+- Title highlighting the transformation: "From [Challenge] to [Result]: How {client_name} Transformed {industry} Operations"
+- Challenge section with 3-5 bullet points
+- Solution section with 3-5 bullet points
+- Results with prominent metrics (use realistic improvement numbers if not provided)
+
+Remember: Create BOTH the 8.5x11 document image AND the JSON content.
+""", constants={
+    "brand_json": BRAND_JSON,
+    "tagline": CALANCE_BRAND['company_info']['tagline'],
+    "website": CALANCE_BRAND['company_info']['website'],
+    "address": CALANCE_BRAND['company_info']['address']
+}, limits={"challenge_highlight": 20, "solution_highlight": 20})
+
+REFINEMENT_PROMPT = PromptTemplate("""Refine the following case study based on the user feedback while maintaining the core information. Focus on:
+- Making the requested changes
+- Enhancing the compelling aspects
+- Maintaining professional tone
+- Ensuring consistency with Calance branding
+
+Current case study:
+Title: {title}
+Subtitle: {subtitle}
+Challenge: {challenge}
+Solution: {solution}
+
+User feedback: "{feedback}"
+""")
+
+PRESENTATION_PROMPT = PromptTemplate("""You are a professional presentation designer for Calance, a premier technology consulting firm.
+Create a visually impactful, professional presentation that will impress the target audience.
+
+Instructions:
+1. Generate a complete, professional presentation with the number of slides requested below
+2. Create visually striking images for key slides using the image generation capability
+3. Design a modern, business-appropriate layout with Calance's brand (navy blue, orange, white)
+4. Focus on clarity, impact, and professional polish
+5. Each slide should tell a story and build upon the previous one
+
+Required Slides:
+1. Title Slide: Powerful headline with a professional background image
+2. Agenda: Overview of the presentation structure
+3-8. Content Slides: Each covering key talking points with relevant visuals
+9. Solution/Calance Value Proposition: How Calance solves the problem
+10. Results/ROI: Quantifiable outcomes and benefits
+11. Next Steps/Call to Action: Clear next steps for the audience
+
+For each slide that needs a visual element, generate an appropriate image that enhances the message.
+Use professional business imagery, technology visuals, charts, and diagrams that support the content.
+
+OUTPUT FORMAT: Return ONLY a JSON object with this structure (no markdown, no explanations):
+{{
+  "slides": [
+    {{
+      "type": "title",
+      "title": "Powerful presentation title",
+      "subtitle": "Compelling subtitle"
+    }},
+    {{
+      "type": "content",
+      "title": "Slide title",
+      "content": ["Bullet point 1", "Bullet point 2", "Bullet point 3"]
+    }},
+    ...more slides...
+  ]
+}}
+
+Presentation Details:
+- Title: {title}
+- Objective: {objective}
+- Target Audience: {audience}
+- Duration: {duration} minutes
+- Key Talking Points:
+{key_points}
+
+Generate approximately {num_slides} slides total. Each content slide should have 3-5 concise bullet points.
+""")
+
+RECRUITING_PROMPT = PromptTemplate("""You are an expert recruiting professional working for Calance. Generate high-quality recruiting content based on the request below.
+
+Please generate professional, effective content that follows recruiting best practices. Be specific, actionable, and tailored to the recruiting context.
+
+Tool: {tool}
+Input: {input_text}
+Instructions: {instructions}
+""")
+
+# ============================================
+# Async Runtime
+# ============================================
+
+class AsyncLoopRunner:
+    """Persistent event loop per worker process, running on a background thread
+
+    Keeps long-lived async resources (the pooled OpenRouter client) bound to a
+    single loop instead of building and tearing one down per request.
+    """
+
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        """Start the loop thread lazily (and again after a fork)"""
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid() or not self._thread.is_alive():
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever,
+                    name="calance-async-loop",
+                    daemon=True
                 )
+                self._thread.start()
+                self._pid = os.getpid()
+                logger.info(f"Started persistent event loop for worker {self._pid}")
+            return self._loop
+
+    @property
+    def loop(self):
+        return self._ensure_loop()
+
+    def run(self, coro, timeout=None):
+        """Run a coroutine on the worker loop and block until it completes"""
+        future = asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+        return future.result(timeout)
+
+    def stop(self):
+        """Stop the loop thread (called on worker exit)"""
+        with self._lock:
+            if self._loop is None or self._pid != os.getpid():
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout=5)
+            self._loop = None
+
+async_runner = AsyncLoopRunner()
 
-            response_json = response.json()
-            logger.info(f"Claude analysis response status: {response.status_code}")
+# ============================================
+# Streaming JSON Parsing
+# ============================================
 
-            if response.status_code != 200:
-                logger.error(f"Claude API error: {response_json}")
-                raise Exception(f"Claude API returned status {response.status_code}")
+class IncrementalJSONParser:
+    """Incrementally parse a streamed JSON object, surfacing top-level fields as they close
 
-            content = response_json['choices'][0]['message']['content']
-            logger.info(f"Claude raw response: {content[:500]}...")
+    Text before the opening brace (e.g. a ```json fence) is skipped. Feed chunks as
+    they arrive; each call returns the (key, value) pairs completed by that chunk.
+    """
 
-            # Extract JSON from response (handle markdown code blocks)
-            json_match = re.search(r'```json\s*(\{.*?\})\s*```', content, re.DOTALL)
-            if json_match:
-                structured_data = json.loads(json_match.group(1))
-                logger.info("Extracted JSON from markdown code block")
+    def __init__(self):
+        self.buffer = ""
+        self.fields = {}
+        self.complete = False
+        self._pos = 0
+        self._depth = 0
+        self._started = False
+        self._in_string = False
+        self._escape = False
+        self._key = None
+        self._key_start = None
+        self._value_start = None
+
+    def feed(self, chunk):
+        self.buffer += chunk
+        completed = []
+        buf = self.buffer
+
+        while self._pos < len(buf) and not self.complete:
+            ch = buf[self._pos]
+
+            if not self._started:
+                if ch == '{':
+                    self._started = True
+                    self._depth = 1
+            elif self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == '\\':
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._key_start is not None:
+                        self._key = json.loads(buf[self._key_start:self._pos + 1])
+                        self._key_start = None
+            elif ch == '"':
+                self._in_string = True
+                if self._depth == 1 and self._key is None:
+                    self._key_start = self._pos
+            elif ch == ':' and self._depth == 1 and self._key is not None and self._value_start is None:
+                self._value_start = self._pos + 1
+            elif ch in '{[':
+                self._depth += 1
+            elif ch in '}]':
+                self._depth -= 1
+                if self._depth == 0:
+                    self._close_field(completed)
+                    self.complete = True
+            elif ch == ',' and self._depth == 1:
+                self._close_field(completed)
+
+            self._pos += 1
+
+        return completed
+
+    def _close_field(self, completed):
+        if self._key is not None and self._value_start is not None:
+            value_text = self.buffer[self._value_start:self._pos].strip()
+            try:
+                value = json.loads(value_text)
+                self.fields[self._key] = value
+                completed.append((self._key, value))
+            except json.JSONDecodeError:
+                logger.warning(f"Could not parse streamed field '{self._key}'")
+        self._key = None
+        self._value_start = None
+
+# ============================================
+# LLM Response Cache
+# ============================================
+
+# Per-request cache policy: "prefer" (read + write), "refresh" (write only) or unset (off)
+CACHE_POLICIES = ('prefer', 'refresh')
+llm_cache_policy = contextvars.ContextVar('llm_cache_policy', default=None)
+
+def set_cache_policy(policy):
+    """Set the cache policy for the current request/task; unknown values disable caching"""
+    return llm_cache_policy.set(policy if policy in CACHE_POLICIES else None)
+
+class ResponseCache:
+    """Content-addressed cache for OpenRouter chat completions
+
+    Keys are a hash of the request payload (model, messages, sampling params).
+    A memory LRU tier bounded by bytes sits in front of an optional SQLite tier
+    shared by all workers. Entries expire after the TTL of their endpoint scope.
+    """
+
+    def __init__(self, memory_max_bytes, ttls, disk_path=None, disk_max_bytes=0):
+        self.memory_max_bytes = memory_max_bytes
+        self.ttls = ttls
+        self.disk_path = disk_path
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        # Schema setup has its own lock so it never blocks memory-tier lookups
+        self._init_lock = threading.Lock()
+        self._disk_initialized = False
+        self._stats = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "writes": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(payload):
+        canonical = json.dumps(
+            {key: value for key, value in payload.items() if key != 'stream'},
+            sort_keys=True, separators=(',', ':')
+        )
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def _connect(self):
+        if not self._disk_initialized:
+            with self._init_lock:
+                if not self._disk_initialized:
+                    os.makedirs(os.path.dirname(self.disk_path), exist_ok=True)
+                    with sqlite3.connect(self.disk_path, timeout=30) as conn:
+                        conn.execute("PRAGMA journal_mode=WAL")
+                        conn.execute("""
+                            CREATE TABLE IF NOT EXISTS llm_cache (
+                                key TEXT PRIMARY KEY,
+                                scope TEXT NOT NULL,
+                                body BLOB NOT NULL,
+                                size INTEGER NOT NULL,
+                                expires_at REAL NOT NULL,
+                                accessed_at REAL NOT NULL
+                            )
+                        """)
+                    self._disk_initialized = True
+        return sqlite3.connect(self.disk_path, timeout=30)
+
+    def _memory_put(self, key, body, expires_at):
+        if len(body) > self.memory_max_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key)[1])
+        self._memory[key] = (expires_at, body)
+        self._memory_bytes += len(body)
+        while self._memory_bytes > self.memory_max_bytes:
+            _, (_, evicted) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self._stats["evictions"] += 1
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, body = entry
+                if expires_at > now:
+                    self._memory.move_to_end(key)
+                    self._stats["hits_memory"] += 1
+                    return json.loads(body)
+                self._memory_bytes -= len(self._memory.pop(key)[1])
+
+        if self.disk_path:
+            with self._connect() as conn:
+                row = conn.execute("SELECT body, expires_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row and row[1] > now:
+                    conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                    with self._lock:
+                        self._memory_put(key, bytes(row[0]), row[1])
+                        self._stats["hits_disk"] += 1
+                    return json.loads(row[0])
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
+
+    def set(self, key, value, scope):
+        now = time.time()
+        expires_at = now + self.ttls.get(scope, 3600)
+        body = json.dumps(value).encode('utf-8')
+        with self._lock:
+            self._memory_put(key, body, expires_at)
+            self._stats["writes"] += 1
+
+        if self.disk_path and len(body) <= self.disk_max_bytes:
+            with self._connect() as conn:
+                conn.execute("DELETE FROM llm_cache WHERE expires_at <= ?", (now,))
+                conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, scope, body, size, expires_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, scope, body, len(body), expires_at, now)
+                )
+                # Size-based eviction: drop least recently used rows until under budget
+                total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+                if total > self.disk_max_bytes:
+                    for old_key, size in conn.execute("SELECT key, size FROM llm_cache ORDER BY accessed_at").fetchall():
+                        if total <= self.disk_max_bytes:
+                            break
+                        conn.execute("DELETE FROM llm_cache WHERE key = ?", (old_key,))
+                        total -= size
+                        with self._lock:
+                            self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+        lookups = stats["hits_memory"] + stats["hits_disk"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits_memory"] + stats["hits_disk"]) / lookups, 3) if lookups else 0.0
+        stats["disk_enabled"] = bool(self.disk_path)
+        return stats
+
+response_cache = ResponseCache(
+    memory_max_bytes=app.config['LLM_CACHE_MEMORY_MAX_BYTES'],
+    ttls=app.config['LLM_CACHE_TTLS'],
+    disk_path=os.path.join(app.config['DATA_DIR'], 'llm_cache.sqlite3') if app.config['LLM_CACHE_DISK_ENABLED'] else None,
+    disk_max_bytes=app.config['LLM_CACHE_DISK_MAX_BYTES']
+)
+
+# Scopes whose image requests are useless without an image in the response
+IMAGE_REQUIRED_SCOPES = ('case_study', 'refinement')
+
+def is_cacheable_response(payload, response_json, scope):
+    """Only cache successful completions (with an image when the artifact is the image)"""
+    choices = response_json.get('choices') or []
+    if not choices or choices[0].get('error'):
+        return False
+    message = choices[0].get('message') or {}
+    if scope in IMAGE_REQUIRED_SCOPES and 'image' in payload.get('modalities', []) and not message.get('images'):
+        return False
+    return bool(message)
+
+# ============================================
+# Upstream Retry Policy
+# ============================================
+
+# Transient upstream conditions worth another attempt
+RETRYABLE_STATUS_CODES = {408, 425, 429, 500, 502, 503, 504, 520, 522, 524, 529}
+# Failures where the request never reached OpenRouter are always safe to retry; read
+# timeouts and dropped connections are too, since a chat completion has no side effects
+RETRYABLE_EXCEPTIONS = (httpx.TimeoutException, httpx.NetworkError, httpx.RemoteProtocolError)
+
+# Per-request log of upstream calls, reported back to the client as response metadata
+upstream_calls = contextvars.ContextVar('upstream_calls', default=None)
+
+def start_upstream_log():
+    """Start a fresh upstream call log for the current request/task"""
+    calls = []
+    upstream_calls.set(calls)
+    return calls
+
+def record_upstream_call(entry):
+    calls = upstream_calls.get()
+    if calls is not None:
+        calls.append(entry)
+
+def upstream_meta(calls):
+    """Summarize an upstream call log for the response `meta` field"""
+    calls = calls or []
+    return {
+        "upstream_calls": calls,
+        "retries": sum(call.get('retries', 0) for call in calls),
+        "prompt_tokens": sum(call.get('prompt_tokens', 0) for call in calls),
+        "cached_prompt_tokens": sum(call.get('cached_prompt_tokens', 0) for call in calls)
+    }
+
+async def read_response_json(response):
+    """Parsed JSON body, decoded off the event loop and kept on the response
+
+    Image responses carry multi-MB base64 payloads; parsing them on the shared
+    worker loop would stall every other in-flight request.
+    """
+    if "parsed_json" not in response.extensions:
+        response.extensions["parsed_json"] = await asyncio.to_thread(response.json)
+    return response.extensions["parsed_json"]
+
+def loggable_json(value, limit=1000, max_string=200):
+    """JSON for logs with long strings (base64 images) shortened, capped at limit chars"""
+    def shorten(item):
+        if isinstance(item, str) and len(item) > max_string:
+            return f"{item[:max_string]}... ({len(item)} chars)"
+        if isinstance(item, dict):
+            return {key: shorten(value) for key, value in item.items()}
+        if isinstance(item, list):
+            return [shorten(value) for value in item]
+        return item
+    return json.dumps(shorten(value), indent=2)[:limit]
+
+def parse_retry_after(response):
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP date)"""
+    value = response.headers.get('Retry-After') if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+class RetryPolicy:
+    """Attempt budget, total deadline and backoff for one upstream model"""
+
+    def __init__(self, max_attempts, deadline, base_delay, max_delay):
+        self.max_attempts = max_attempts
+        self.deadline = deadline
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    @classmethod
+    def for_model(cls, model):
+        overrides = app.config['RETRY_MODEL_POLICIES'].get(model, {})
+        return cls(
+            max_attempts=int(overrides.get('max_attempts', app.config['RETRY_MAX_ATTEMPTS'])),
+            deadline=float(overrides.get('deadline', app.config['RETRY_DEADLINE_SECONDS'])),
+            base_delay=float(overrides.get('base_delay', app.config['RETRY_BASE_DELAY'])),
+            max_delay=float(overrides.get('max_delay', app.config['RETRY_MAX_DELAY']))
+        )
+
+    def backoff(self, attempt, retry_after=None):
+        """Delay before the next attempt: Retry-After if given, else full-jitter exponential"""
+        if retry_after is not None:
+            return retry_after + random.uniform(0, 0.1 * retry_after)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+# ============================================
+# Model Rate & Concurrency Governor
+# ============================================
+
+def estimate_request_tokens(payload):
+    """Rough token cost of a chat request: prompt text (~4 chars/token) plus max_tokens"""
+    chars = 0
+    images = 0
+    for message in payload.get('messages', []):
+        content = message.get('content', '')
+        if isinstance(content, str):
+            chars += len(content)
+            continue
+        for part in content:
+            if part.get('type') == 'text':
+                chars += len(part.get('text', ''))
             else:
-                # Try to parse as raw JSON
-                structured_data = json.loads(content)
-                logger.info("Parsed response as raw JSON")
+                images += 1
+    # Image inputs are billed per image rather than by their base64 length
+    return chars // 4 + images * 1000 + int(payload.get('max_tokens', 0))
+
+class GovernorTimeout(Exception):
+    """Raised when a request waits longer than GOVERNOR_MAX_WAIT_SECONDS for admission"""
+
+class ModelGovernor:
+    """Token-bucket rate limiter and concurrency governor keyed by model id
+
+    Requests/min and tokens/min buckets and in-flight leases live in SQLite, so every
+    worker on the host draws from the same budget. Within a worker, waiters for a model
+    take turns polling the store and are woken early when a local lease is released.
+    Held leases are renewed every GOVERNOR_LEASE_SECONDS / 3, so a lease only expires
+    when the worker holding it is gone, however long the stream or hedge runs.
+    """
+
+    def __init__(self, path, enabled=True):
+        self.path = path
+        self.enabled = enabled
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self._queues = {}
+        self._queues_loop = None
+        self._stats = {}
+
+    def limits_for(self, model):
+        overrides = app.config['GOVERNOR_MODEL_LIMITS'].get(model, {})
+        return {
+            "rpm": int(overrides.get('rpm', app.config['GOVERNOR_DEFAULT_RPM'])),
+            "tpm": int(overrides.get('tpm', app.config['GOVERNOR_DEFAULT_TPM'])),
+            "max_in_flight": int(overrides.get('max_in_flight', app.config['GOVERNOR_DEFAULT_MAX_IN_FLIGHT']))
+        }
+
+    def _connect(self):
+        if not self._initialized:
+            with self._init_lock:
+                if not self._initialized:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    with sqlite3.connect(self.path, timeout=30) as conn:
+                        conn.execute("PRAGMA journal_mode=WAL")
+                        conn.execute("""
+                            CREATE TABLE IF NOT EXISTS governor_buckets (
+                                model TEXT PRIMARY KEY,
+                                request_tokens REAL NOT NULL,
+                                token_tokens REAL NOT NULL,
+                                updated_at REAL NOT NULL
+                            )
+                        """)
+                        conn.execute("""
+                            CREATE TABLE IF NOT EXISTS governor_leases (
+                                id TEXT PRIMARY KEY,
+                                model TEXT NOT NULL,
+                                tokens INTEGER NOT NULL,
+                                expires_at REAL NOT NULL
+                            )
+                        """)
+                    self._initialized = True
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    @staticmethod
+    def _load_buckets(conn, model, limits, now):
+        """(request_tokens, token_tokens) for a model, refilled up to now"""
+        rpm, tpm = limits['rpm'], limits['tpm']
+        row = conn.execute(
+            "SELECT request_tokens, token_tokens, updated_at FROM governor_buckets WHERE model = ?", (model,)
+        ).fetchone()
+        if row is None:
+            return float(rpm), float(tpm)
+        elapsed = max(0.0, now - row[2])
+        return min(rpm, row[0] + elapsed * rpm / 60.0), min(tpm, row[1] + elapsed * tpm / 60.0)
+
+    @staticmethod
+    def _save_buckets(conn, model, request_tokens, token_tokens, now):
+        conn.execute(
+            "INSERT OR REPLACE INTO governor_buckets (model, request_tokens, token_tokens, updated_at) VALUES (?, ?, ?, ?)",
+            (model, request_tokens, token_tokens, now)
+        )
+
+    def _try_acquire(self, model, tokens, limits):
+        """Take a lease if every limit allows it
+
+        Returns (lease_id, 0, False), or (None, seconds the buckets need to refill,
+        whether max_in_flight is reached). A full slot table has no known wait time.
+        """
+        now = time.time()
+        rpm, tpm, max_in_flight = limits['rpm'], limits['tpm'], limits['max_in_flight']
+        tokens = min(tokens, tpm) if tpm else tokens
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM governor_leases WHERE expires_at < ?", (now,))
+            request_tokens, token_tokens = self._load_buckets(conn, model, limits, now)
+            in_flight = conn.execute("SELECT COUNT(*) FROM governor_leases WHERE model = ?", (model,)).fetchone()[0]
+
+            at_capacity = bool(max_in_flight and in_flight >= max_in_flight)
+            wait = 0.0
+            if rpm and request_tokens < 1:
+                wait = max(wait, (1 - request_tokens) * 60.0 / rpm)
+            if tpm and token_tokens < tokens:
+                wait = max(wait, (tokens - token_tokens) * 60.0 / tpm)
+
+            lease_id = None
+            if not wait and not at_capacity:
+                request_tokens -= 1 if rpm else 0
+                token_tokens -= tokens if tpm else 0
+                lease_id = str(uuid.uuid4())
+                conn.execute(
+                    "INSERT INTO governor_leases (id, model, tokens, expires_at) VALUES (?, ?, ?, ?)",
+                    (lease_id, model, tokens, now + app.config['GOVERNOR_LEASE_SECONDS'])
+                )
+            self._save_buckets(conn, model, request_tokens, token_tokens, now)
+            conn.execute("COMMIT")
+            return lease_id, wait, at_capacity
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _try_take_request(self, model, limits):
+        """Draw one requests/min token without a new lease; return seconds to wait (0 when taken)"""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            request_tokens, token_tokens = self._load_buckets(conn, model, limits, now)
+            wait = (1 - request_tokens) * 60.0 / limits['rpm'] if request_tokens < 1 else 0.0
+            if not wait:
+                request_tokens -= 1
+            self._save_buckets(conn, model, request_tokens, token_tokens, now)
+            conn.execute("COMMIT")
+            return wait
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _release(self, lease_id, model, tokens, actual_tokens, limits):
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("DELETE FROM governor_leases WHERE id = ?", (lease_id,))
+            # Credit back the unused part of the estimate once real usage is known
+            if actual_tokens is not None and limits['tpm']:
+                conn.execute(
+                    "UPDATE governor_buckets SET token_tokens = MIN(?, token_tokens + ?) WHERE model = ?",
+                    (limits['tpm'], min(tokens, limits['tpm']) - actual_tokens, model)
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _renew(self, lease_id):
+        conn = self._connect()
+        try:
+            conn.execute(
+                "UPDATE governor_leases SET expires_at = ? WHERE id = ?",
+                (time.time() + app.config['GOVERNOR_LEASE_SECONDS'], lease_id)
+            )
+        finally:
+            conn.close()
+
+    async def _keep_lease(self, lease_id):
+        while True:
+            await asyncio.sleep(app.config['GOVERNOR_LEASE_SECONDS'] / 3)
+            try:
+                await asyncio.to_thread(self._renew, lease_id)
+            except sqlite3.Error as e:
+                logger.warning(f"Governor lease renewal failed: {e}")
+
+    def _queue_for(self, model):
+        """Per-model poll lock (FIFO) and the event set when a local lease is released"""
+        loop = asyncio.get_running_loop()
+        if self._queues_loop is not loop:
+            self._queues = {}
+            self._queues_loop = loop
+        return self._queues.setdefault(model, {"lock": asyncio.Lock(), "released": asyncio.Event()})
+
+    @contextlib.asynccontextmanager
+    async def acquire(self, model, tokens):
+        """Hold a governed slot for one upstream request
+
+        Yields a dict; set its "actual_tokens" once usage is known to refund the estimate.
+        """
+        usage = {"actual_tokens": None}
+        limits = self.limits_for(model)
+        if not self.enabled or not any(limits.values()):
+            yield usage
+            return
+
+        stats = self._model_stats(model)
+        started = time.monotonic()
+        waiters = self._queue_for(model)
+        full_polls = 0
+        while True:
+            released = waiters["released"]
+            # The lock covers a single poll, so waiters take turns at the store
+            # instead of queueing behind one poller for the whole wait
+            async with waiters["lock"]:
+                lease_id, wait, at_capacity = await asyncio.to_thread(self._try_acquire, model, tokens, limits)
+            if lease_id:
+                break
+            if time.monotonic() - started + wait > app.config['GOVERNOR_MAX_WAIT_SECONDS']:
+                stats["timeouts"] += 1
+                raise GovernorTimeout(f"Timed out waiting for {model} rate limit")
+            if at_capacity:
+                # Local releases wake us through the event; other workers' releases
+                # are only seen by polling, backing off while the slots stay full
+                wait = max(wait, min(0.05 * 2 ** full_polls, 1.0))
+                full_polls += 1
+            try:
+                await asyncio.wait_for(released.wait(), timeout=min(max(wait, 0.05), 2.0))
+            except asyncio.TimeoutError:
+                pass
+
+        waited = time.monotonic() - started
+        stats["admitted"] += 1
+        stats["wait_time_total"] += waited
+        if waited > 0.5:
+            stats["waited"] += 1
+            logger.info(f"Governor admitted {model} after {waited:.1f}s")
+
+        keeper = asyncio.create_task(self._keep_lease(lease_id))
+        try:
+            yield usage
+        finally:
+            keeper.cancel()
+            await asyncio.to_thread(self._release, lease_id, model, tokens, usage["actual_tokens"], limits)
+            released, waiters["released"] = waiters["released"], asyncio.Event()
+            released.set()
+
+    async def readmit(self, model):
+        """Draw another requests/min token for a retry sent under an existing lease
+
+        Retries after a 429 would otherwise bypass the limiter that exists to
+        prevent 429 storms.
+        """
+        limits = self.limits_for(model)
+        if not self.enabled or not limits['rpm']:
+            return
+
+        stats = self._model_stats(model)
+        started = time.monotonic()
+        while True:
+            wait = await asyncio.to_thread(self._try_take_request, model, limits)
+            if not wait:
+                stats["retries_admitted"] += 1
+                return
+            if time.monotonic() - started + wait > app.config['GOVERNOR_MAX_WAIT_SECONDS']:
+                stats["timeouts"] += 1
+                raise GovernorTimeout(f"Timed out waiting for {model} rate limit before retrying")
+            await asyncio.sleep(min(max(wait, 0.05), 2.0))
+
+    def _model_stats(self, model):
+        return self._stats.setdefault(model, {
+            "admitted": 0, "waited": 0, "wait_time_total": 0.0, "timeouts": 0, "retries_admitted": 0
+        })
+
+    def stats(self):
+        result = {"enabled": self.enabled, "models": {}}
+        for model, stats in self._stats.items():
+            admitted = stats["admitted"]
+            result["models"][model] = {
+                **self.limits_for(model),
+                "admitted": admitted,
+                "waited": stats["waited"],
+                "timeouts": stats["timeouts"],
+                "retries_admitted": stats["retries_admitted"],
+                "avg_wait_ms": round(stats["wait_time_total"] / admitted * 1000, 2) if admitted else 0.0
+            }
+        return result
+
+model_governor = ModelGovernor(
+    os.path.join(app.config['DATA_DIR'], 'governor.sqlite3'),
+    enabled=app.config['GOVERNOR_ENABLED']
+)
+
+# ============================================
+# Model Fallback Routing
+# ============================================
+
+# Upstream answers that justify trying the next candidate model
+FAILOVER_STATUS_CODES = RETRYABLE_STATUS_CODES | {404}
+
+class ModelRouter:
+    """Latency-aware candidate ordering per task
+
+    Tracks rolling latency and error rate per model over ROUTER_WINDOW_SECONDS.
+    Healthy candidates keep their configured preference order; candidates whose
+    p95 or error rate is over budget move to the back, fastest first. Samples age
+    out of the window, so a demoted model is retried once it goes quiet.
+    """
+
+    def __init__(self):
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, model, latency, ok):
+        with self._lock:
+            self._samples.setdefault(model, []).append((time.time(), latency, ok))
+
+    def _window(self, model):
+        cutoff = time.time() - app.config['ROUTER_WINDOW_SECONDS']
+        with self._lock:
+            samples = [sample for sample in self._samples.get(model, []) if sample[0] >= cutoff]
+            self._samples[model] = samples
+        return samples
+
+    @staticmethod
+    def _percentile(values, pct):
+        if not values:
+            return None
+        values = sorted(values)
+        return values[min(len(values) - 1, int(round(pct / 100.0 * (len(values) - 1))))]
+
+    def model_stats(self, model):
+        samples = self._window(model)
+        latencies = [latency for _, latency, ok in samples if ok]
+        errors = sum(1 for _, _, ok in samples if not ok)
+        return {
+            "samples": len(samples),
+            "p50": self._percentile(latencies, 50),
+            "p95": self._percentile(latencies, 95),
+            "error_rate": round(errors / len(samples), 3) if samples else 0.0
+        }
+
+    def _is_healthy(self, stats, threshold):
+        if stats["samples"] < app.config['ROUTER_MIN_SAMPLES']:
+            return True
+        if stats["error_rate"] > app.config['ROUTER_MAX_ERROR_RATE']:
+            return False
+        return stats["p95"] is None or stats["p95"] <= threshold
+
+    def candidates(self, task, primary):
+        """Ordered models to try for a task, starting from the configured primary"""
+        fallbacks = app.config['MODEL_FALLBACKS'].get(task, []) if task else []
+        models = [primary] + [model for model in fallbacks if model != primary]
+        if len(models) == 1:
+            return models
+
+        threshold = app.config['ROUTER_P95_THRESHOLDS'].get(task, app.config['ROUTER_DEFAULT_P95_THRESHOLD'])
+        stats = {model: self.model_stats(model) for model in models}
+        healthy = [model for model in models if self._is_healthy(stats[model], threshold)]
+        degraded = sorted(
+            (model for model in models if model not in healthy),
+            key=lambda model: (stats[model]["error_rate"], stats[model]["p95"] or 0)
+        )
+        if healthy and healthy[0] != primary:
+            logger.info(f"Router: {primary} degraded for {task}, preferring {healthy[0]}")
+        return healthy + degraded
+
+    def latency_percentile(self, model, pct):
+        """Observed latency percentile for successful calls, or None without enough samples"""
+        latencies = [latency for _, latency, ok in self._window(model) if ok]
+        if len(latencies) < app.config['ROUTER_MIN_SAMPLES']:
+            return None
+        return self._percentile(latencies, pct)
+
+    def stats(self):
+        with self._lock:
+            models = list(self._samples)
+        return {model: self.model_stats(model) for model in models}
+
+model_router = ModelRouter()
+
+class HedgeController:
+    """Decides when to fire a hedge request and caps hedges per minute"""
+
+    def __init__(self):
+        self._fired = []
+        self._lock = threading.Lock()
+        self._stats = {"hedges_fired": 0, "hedges_won": 0, "hedges_capped": 0}
+
+    def delay_for(self, model):
+        """Seconds to wait on the first request before hedging, or None when disabled"""
+        if not app.config['HEDGE_ENABLED']:
+            return None
+        observed = model_router.latency_percentile(model, app.config['HEDGE_PERCENTILE'])
+        delay = observed if observed is not None else app.config['HEDGE_DEFAULT_DELAY']
+        return max(app.config['HEDGE_MIN_DELAY'], delay)
+
+    def try_acquire(self):
+        now = time.time()
+        with self._lock:
+            self._fired = [fired for fired in self._fired if fired > now - 60]
+            if len(self._fired) >= app.config['HEDGE_MAX_PER_MINUTE']:
+                self._stats["hedges_capped"] += 1
+                return False
+            self._fired.append(now)
+            self._stats["hedges_fired"] += 1
+            return True
+
+    def record_win(self):
+        with self._lock:
+            self._stats["hedges_won"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {"enabled": app.config['HEDGE_ENABLED'], **self._stats}
+
+hedge_controller = HedgeController()
+
+# ============================================
+# Circuit Breakers
+# ============================================
+
+class CircuitOpenError(Exception):
+    """Raised when every candidate model for a request has an open breaker"""
+
+class CircuitBreaker:
+    """Per-model circuit breaker: closed -> open -> half-open -> closed
+
+    BREAKER_FAILURE_THRESHOLD consecutive failures (timeouts, transport errors,
+    5xx after retries) open the breaker and calls for that model fail fast. After
+    BREAKER_RESET_SECONDS up to BREAKER_HALF_OPEN_PROBES calls are let through as
+    probes; a successful probe closes the breaker, a failed one re-opens it.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self):
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _entry(self, model):
+        return self._models.setdefault(model, {
+            "state": self.CLOSED, "failures": 0, "opened_at": None,
+            "probes_in_flight": 0, "probe_started_at": None, "short_circuited": 0, "times_opened": 0
+        })
+
+    def allow(self, model):
+        """Whether a call to model may go upstream now"""
+        if not app.config['BREAKER_ENABLED']:
+            return True
+        with self._lock:
+            entry = self._entry(model)
+            if entry["state"] == self.OPEN:
+                if time.time() - entry["opened_at"] < app.config['BREAKER_RESET_SECONDS']:
+                    entry["short_circuited"] += 1
+                    return False
+                entry["state"] = self.HALF_OPEN
+                entry["probes_in_flight"] = 0
+            if entry["state"] == self.HALF_OPEN:
+                # A probe that never reported back (cancelled mid-call) frees its slot
+                # after the reset window
+                if entry["probe_started_at"] and time.time() - entry["probe_started_at"] >= app.config['BREAKER_RESET_SECONDS']:
+                    entry["probes_in_flight"] = 0
+                if entry["probes_in_flight"] >= app.config['BREAKER_HALF_OPEN_PROBES']:
+                    entry["short_circuited"] += 1
+                    return False
+                entry["probes_in_flight"] += 1
+                entry["probe_started_at"] = time.time()
+            return True
+
+    def record_success(self, model):
+        with self._lock:
+            entry = self._entry(model)
+            if entry["state"] != self.CLOSED:
+                logger.info(f"Circuit for {model} closed")
+            entry.update(state=self.CLOSED, failures=0, opened_at=None, probes_in_flight=0)
+
+    def record_failure(self, model):
+        with self._lock:
+            entry = self._entry(model)
+            entry["failures"] += 1
+            if entry["state"] == self.HALF_OPEN or (
+                entry["state"] == self.CLOSED
+                and entry["failures"] >= app.config['BREAKER_FAILURE_THRESHOLD']
+            ):
+                logger.warning(f"Circuit for {model} opened after {entry['failures']} consecutive failures")
+                entry.update(state=self.OPEN, opened_at=time.time(), probes_in_flight=0)
+                entry["times_opened"] += 1
+
+    def record_neutral(self, model):
+        """Record a call that says nothing about the model's health
+
+        Rate limiting (429, or our own governor timing out) neither counts as a
+        failure nor resets the failure count; a half-open probe slot is handed back.
+        """
+        with self._lock:
+            entry = self._entry(model)
+            if entry["state"] == self.HALF_OPEN:
+                entry["probes_in_flight"] = max(0, entry["probes_in_flight"] - 1)
+
+    def record_outcome(self, model, status_code):
+        """Record a completed call: 2xx is a success and 5xx a failure
+
+        Anything else (429, a 4xx caused by the request) says nothing about the
+        model's health and neither closes nor opens the breaker.
+        """
+        if 200 <= status_code < 300:
+            self.record_success(model)
+        elif status_code >= 500:
+            self.record_failure(model)
+        else:
+            self.record_neutral(model)
+
+    def is_closed(self, model):
+        """Whether model is fully closed (not probing), e.g. so a probe is never hedged"""
+        if not app.config['BREAKER_ENABLED']:
+            return True
+        with self._lock:
+            return self._entry(model)["state"] == self.CLOSED
+
+    def stats(self):
+        now = time.time()
+        with self._lock:
+            return {
+                "enabled": app.config['BREAKER_ENABLED'],
+                "models": {
+                    model: {
+                        "state": entry["state"],
+                        "consecutive_failures": entry["failures"],
+                        "open_for_seconds": round(now - entry["opened_at"], 1) if entry["opened_at"] else None,
+                        "short_circuited": entry["short_circuited"],
+                        "times_opened": entry["times_opened"]
+                    }
+                    for model, entry in self._models.items()
+                }
+            }
+
+circuit_breaker = CircuitBreaker()
+
+# ============================================
+# AI Service Integration
+# ============================================
+
+class AIService:
+    """Service for interacting with OpenRouter API"""
+
+    def __init__(self):
+        self.api_key = app.config.get('OPENROUTER_API_KEY')
+        self.base_url = app.config.get('OPENROUTER_BASE_URL')
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json",
+            "HTTP-Referer": app.config.get('CORS_ORIGINS', ['http://localhost:5174'])[0],  # First CORS origin
+            "X-Title": "Calance Edge"
+        }
+
+        # Pooled HTTP/2 client, created lazily on the worker event loop
+        self._client = None
+        self._client_loop = None
+        self._pool_metrics = {
+            "requests_total": 0,
+            "in_flight": 0,
+            "wait_time_total": 0.0,
+            "wait_time_max": 0.0
+        }
+        self._prompt_cache_stats = {
+            "calls": 0,
+            "prompt_tokens": 0,
+            "cached_prompt_tokens": 0,
+            "cache_write_tokens": 0
+        }
+
+    def _get_client(self):
+        """Return the long-lived pooled client for the current event loop"""
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                http2=app.config['OPENROUTER_HTTP2'],
+                headers=self.headers,
+                limits=httpx.Limits(
+                    max_connections=app.config['OPENROUTER_MAX_CONNECTIONS'],
+                    max_keepalive_connections=app.config['OPENROUTER_MAX_KEEPALIVE_CONNECTIONS'],
+                    keepalive_expiry=app.config['OPENROUTER_KEEPALIVE_EXPIRY']
+                ),
+                timeout=httpx.Timeout(
+                    90.0,
+                    connect=app.config['OPENROUTER_CONNECT_TIMEOUT'],
+                    pool=app.config['OPENROUTER_POOL_TIMEOUT']
+                )
+            )
+            self._client_loop = loop
+            logger.info(f"Created pooled OpenRouter client (http2={app.config['OPENROUTER_HTTP2']})")
+        return self._client
+
+    @contextlib.asynccontextmanager
+    async def _track_pool_request(self):
+        """Track in-flight count and pool wait time for one upstream request
+
+        Yields an httpcore trace hook to pass in the request extensions.
+        """
+        metrics = self._pool_metrics
+        started = time.monotonic()
+        waited = []
+
+        async def trace(event_name, info):
+            # First connect or send event marks the end of the wait for a pooled connection
+            if not waited and event_name.endswith('.started') and (
+                    'connect_tcp' in event_name or 'send_request_headers' in event_name):
+                waited.append(time.monotonic() - started)
+
+        metrics["requests_total"] += 1
+        metrics["in_flight"] += 1
+        try:
+            yield trace
+        finally:
+            metrics["in_flight"] -= 1
+            if waited:
+                metrics["wait_time_total"] += waited[0]
+                metrics["wait_time_max"] = max(metrics["wait_time_max"], waited[0])
+
+    def _cache_key_for(self, payload, cache_scope):
+        """Cache key when the current request opted into caching, else None
+
+        The key covers the requested model, so only that model's own answers are
+        stored under it (never a fallback's after failover).
+        """
+        if cache_scope and llm_cache_policy.get():
+            return ResponseCache.make_key(payload)
+        return None
+
+    async def _cache_lookup(self, cache_key):
+        if cache_key and llm_cache_policy.get() == 'prefer':
+            cached = await asyncio.to_thread(response_cache.get, cache_key)
+            if cached is not None:
+                logger.info(f"LLM cache hit: {cache_key[:12]}")
+            return cached
+        return None
+
+    def _prepare_payload(self, payload, model):
+        """Payload as sent to one routed model
+
+        Keeps cache_control breakpoints only for models whose provider honors
+        them, and asks OpenRouter for usage accounting (cached prompt tokens)
+        when a breakpoint is sent.
+        """
+        routed = {**payload, "model": model}
+        if app.config['PROMPT_CACHE_ENABLED'] and model.startswith(app.config['PROMPT_CACHE_MODELS']):
+            if has_cache_breakpoint(payload):
+                routed["usage"] = {"include": True}
+            return routed
+
+        messages = []
+        for message in payload.get('messages', []):
+            content = message.get('content')
+            if isinstance(content, list):
+                content = [{k: v for k, v in part.items() if k != 'cache_control'} for part in content]
+                message = {**message, "content": content}
+            messages.append(message)
+        routed["messages"] = messages
+        return routed
+
+    def _record_prompt_usage(self, call, usage):
+        """Add cached/uncached prompt tokens to an upstream call entry and the totals"""
+        if not usage:
+            return
+        tokens = prompt_token_usage(usage)
+        call.update(tokens)
+        stats = self._prompt_cache_stats
+        stats["calls"] += 1
+        stats["prompt_tokens"] += tokens["prompt_tokens"]
+        stats["cached_prompt_tokens"] += tokens["cached_prompt_tokens"]
+        stats["cache_write_tokens"] += tokens["cache_write_tokens"]
+
+    def prompt_cache_stats(self):
+        """Provider prompt-cache hit totals for the health endpoint"""
+        stats = dict(self._prompt_cache_stats)
+        stats["cached_ratio"] = round(stats["cached_prompt_tokens"] / stats["prompt_tokens"], 3) \
+            if stats["prompt_tokens"] else 0.0
+        return {"enabled": app.config['PROMPT_CACHE_ENABLED'], **stats}
+
+    async def _post_chat(self, payload, timeout=90.0, headers=None, cache_scope=None, task=None, hedge=False):
+        """POST a chat completion through the shared connection pool
+
+        cache_scope names the endpoint TTL used when the request opted into the cache.
+        task selects the fallback candidates the router may fail over to.
+        hedge allows a duplicate request when the first one runs into the latency tail.
+        """
+        url = f"{self.base_url}/chat/completions"
+        cache_key = self._cache_key_for(payload, cache_scope)
+        cached = await self._cache_lookup(cache_key)
+        if cached is not None:
+            record_upstream_call({"model": payload.get('model'), "cached": True, "attempts": 0, "retries": 0})
+            return httpx.Response(200, json=cached, request=httpx.Request("POST", url),
+                                  extensions={"parsed_json": cached})
+
+        candidates = model_router.candidates(task, payload.get('model'))
+        model = error = response = response_json = None
+        for index, candidate in enumerate(candidates):
+            # Asked just before dispatch, so a half-open model only spends its probe
+            # slot when it is actually called
+            if not circuit_breaker.allow(candidate):
+                continue
+            model = candidate
+            routed_payload = self._prepare_payload(payload, model)
+            is_last = index == len(candidates) - 1
+            error = response = response_json = None
+            # Latency samples are taken per upstream attempt in _send_with_retry, so
+            # governor waits and retry backoff never count against the model
+            try:
+                # A half-open probe is one request, never a hedged pair
+                if hedge and circuit_breaker.is_closed(model):
+                    response, response_json = await self._call_model_hedged(url, routed_payload, timeout, headers)
+                else:
+                    response, response_json = await self._call_model(url, routed_payload, timeout, headers)
+            except (*RETRYABLE_EXCEPTIONS, GovernorTimeout) as e:
+                if isinstance(e, GovernorTimeout):
+                    # Never reached upstream: an error sample without a latency
+                    model_router.record(model, 0.0, ok=False)
+                    circuit_breaker.record_neutral(model)
+                else:
+                    circuit_breaker.record_failure(model)
+                if is_last:
+                    raise
+                logger.warning(f"Failing over from {model} after {type(e).__name__}")
+                error = e
+                continue
+
+            ok = response.status_code == 200
+            circuit_breaker.record_outcome(model, response.status_code)
+            if not ok and response.status_code in FAILOVER_STATUS_CODES and not is_last:
+                logger.warning(f"Failing over from {model} after status {response.status_code}")
+                continue
+            break
 
-            logger.info(f"Claude extracted structured data: {json.dumps(structured_data, indent=2)}")
-            return structured_data
+        if model is None:
+            record_upstream_call({"model": payload.get('model'), "circuit_open": True, "attempts": 0, "retries": 0})
+            raise CircuitOpenError(f"Circuit open for every candidate of {payload.get('model')}")
+        if error is not None:
+            # Failed over, but every remaining candidate was short-circuited
+            raise error
 
-        except json.JSONDecodeError as e:
-            logger.error(f"Failed to parse Claude response as JSON: {e}")
-            logger.error(f"Content was: {content}")
-            raise
-        except Exception as e:
-            logger.error(f"Claude analysis failed: {e}")
-            raise
+        if cache_key and response_json is not None and model == payload.get('model'):
+            try:
+                if is_cacheable_response(payload, response_json, cache_scope):
+                    await asyncio.to_thread(response_cache.set, cache_key, response_json, cache_scope)
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to cache LLM response: {e}")
+        return response
 
-    def _condense_infographic_prompt(self, prompt, max_length=3000):
-        """Condense infographic prompt to fit within OpenRouter function call limits"""
+    async def _call_model(self, url, payload, timeout, headers):
+        """Send one routed request under the governor and retry policy
 
-        if len(prompt) <= max_length:
-            return prompt
+        Returns the response and, for a 200, its parsed JSON.
+        """
+        client = self._get_client()
+
+        async def send(attempt_timeout):
+            async with self._track_pool_request() as trace:
+                return await client.post(
+                    url,
+                    headers=headers,
+                    json=payload,
+                    timeout=attempt_timeout,
+                    extensions={"trace": trace}
+                )
 
-        logger.warning(f"Prompt too long ({len(prompt)} chars), condensing to {max_length}")
+        model = payload.get('model')
+        call = {}
+        async with model_governor.acquire(model, estimate_request_tokens(payload)) as usage:
+            response = await self._send_with_retry(model, send, timeout, call)
 
-        # Priority elements to preserve (in order)
-        priority_patterns = [
-            'Client:', 'Headline:', 'Challenge:', 'Solution:', 'Results:', 'Metrics:',
-            'Navy (#1e3a5f)', 'Blue (#2563eb)', 'Orange (#f97316)', 'CASE STUDY'
-        ]
+            response_json = None
+            if response.status_code == 200:
+                try:
+                    response_json = await read_response_json(response)
+                    usage["actual_tokens"] = (response_json.get('usage') or {}).get('total_tokens')
+                    self._record_prompt_usage(call, response_json.get('usage'))
+                except ValueError:
+                    pass
+        return response, response_json
+
+    async def _call_model_hedged(self, url, payload, timeout, headers):
+        """Like _call_model, but races a second identical request against a slow first one
+
+        The hedge fires once the first request outlives the model's observed latency
+        percentile (HEDGE_PERCENTILE) of upstream attempts, subject to
+        HEDGE_MAX_PER_MINUTE. The first successful response wins and the other
+        request is cancelled.
+        """
+        model = payload.get('model')
+        delay = hedge_controller.delay_for(model)
+        if delay is None:
+            return await self._call_model(url, payload, timeout, headers)
+
+        primary = asyncio.create_task(self._call_model(url, payload, timeout, headers))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done or not hedge_controller.try_acquire():
+            return await primary
+
+        logger.info(f"Hedging {model}: first request still pending after {delay:.1f}s")
+        hedge = asyncio.create_task(self._call_model(url, payload, timeout, headers))
+        pending = {primary, hedge}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if not task.exception() and task.result()[0].status_code == 200:
+                        if task is hedge:
+                            hedge_controller.record_win()
+                        record_upstream_call({"model": model, "hedged": True,
+                                              "winner": "hedge" if task is hedge else "primary"})
+                        return task.result()
+            # Neither request succeeded: surface the first request's outcome
+            return primary.result()
+        finally:
+            losers = [task for task in (primary, hedge) if not task.done()]
+            for task in losers:
+                task.cancel()
+            # Wait for the cancelled request to unwind so its governor lease and pooled
+            # connection are released before the winner is handed back
+            await asyncio.gather(*losers, return_exceptions=True)
+
+    async def _send_with_retry(self, model, send, timeout, call=None, record_final=True):
+        """Call send(attempt_timeout) under the model's retry policy
+
+        Retries transient statuses and transport errors with backoff, honoring
+        Retry-After, until the attempt budget or total deadline runs out. The last
+        response is returned (or the last transport error raised) when retries stop.
+        call is the upstream log entry; the caller may add token usage to it afterwards.
+
+        Every attempt is a separate router latency sample, timed around send() only.
+        With record_final=False the returned response's sample is left to the caller
+        (a stream is only known to be good once it ends); its latency is call["latency"].
+        """
+        policy = RetryPolicy.for_model(model)
+        started = time.monotonic()
+        attempt = 0
+        retry_log = []
+
+        while True:
+            attempt += 1
+            if attempt > 1:
+                # Each retry is another request against the model's requests/min budget
+                await model_governor.readmit(model)
+            remaining = policy.deadline - (time.monotonic() - started)
+            response = error = None
+            attempt_started = time.monotonic()
+            try:
+                response = await send(max(1.0, min(timeout, remaining)))
+                retryable = response.status_code in RETRYABLE_STATUS_CODES
+                reason = f"status {response.status_code}"
+            except RETRYABLE_EXCEPTIONS as e:
+                error = e
+                retryable = True
+                reason = type(e).__name__
+            latency = time.monotonic() - attempt_started
+
+            if retryable and attempt < policy.max_attempts:
+                delay = policy.backoff(attempt, parse_retry_after(response))
+                if time.monotonic() - started + delay < policy.deadline:
+                    model_router.record(model, latency, ok=False)
+                    logger.warning(f"Retrying {model} after {reason} (attempt {attempt}/{policy.max_attempts}, "
+                                   f"waiting {delay:.1f}s)")
+                    retry_log.append({"attempt": attempt, "reason": reason, "delay": round(delay, 2)})
+                    if response is not None:
+                        await response.aclose()
+                    await asyncio.sleep(delay)
+                    continue
+
+            call = call if call is not None else {}
+            call.update({
+                "model": model,
+                "attempts": attempt,
+                "retries": len(retry_log),
+                "retry_reasons": retry_log,
+                "status": response.status_code if response is not None else reason,
+                "duration": round(time.monotonic() - started, 2),
+                "latency": round(latency, 3)
+            })
+            record_upstream_call(call)
+            if error is not None:
+                model_router.record(model, latency, ok=False)
+                raise error
+            if record_final:
+                model_router.record(model, latency, ok=response.status_code == 200)
+            return response
+
+    async def _stream_chat(self, payload, timeout=90.0, headers=None, cache_scope=None, task=None):
+        """Stream a chat completion, yielding content deltas as they arrive
+
+        Cached completions are replayed as a single delta.
+        """
+        cache_key = self._cache_key_for(payload, cache_scope)
+        cached = await self._cache_lookup(cache_key)
+        if cached is not None:
+            record_upstream_call({"model": payload.get('model'), "cached": True, "attempts": 0, "retries": 0})
+            yield cached['choices'][0]['message'].get('content', '')
+            return
+
+        content = ''
+        client = self._get_client()
+        candidates = model_router.candidates(task, payload.get('model'))
+        error = None
+        for index, model in enumerate(candidates):
+            # Asked just before dispatch (see _post_chat)
+            if not circuit_breaker.allow(model):
+                continue
+            is_last = index == len(candidates) - 1
+            async with contextlib.AsyncExitStack() as stack:
+                call = {}
+
+                async def send(attempt_timeout):
+                    request = client.build_request(
+                        "POST",
+                        f"{self.base_url}/chat/completions",
+                        headers=headers,
+                        json={**self._prepare_payload(payload, model), "stream": True},
+                        timeout=attempt_timeout,
+                        extensions={"trace": trace}
+                    )
+                    return await client.send(request, stream=True)
+
+                # Retries and failover only cover admission and the request itself; once
+                # tokens flow the stream is not replayed
+                try:
+                    usage = await stack.enter_async_context(
+                        model_governor.acquire(model, estimate_request_tokens(payload))
+                    )
+                    trace = await stack.enter_async_context(self._track_pool_request())
+                    # The stream's router sample is its time to response headers, taken
+                    # by _send_with_retry and recorded here once the outcome is known
+                    response = await self._send_with_retry(model, send, timeout, call, record_final=False)
+                except (*RETRYABLE_EXCEPTIONS, GovernorTimeout) as e:
+                    if isinstance(e, GovernorTimeout):
+                        model_router.record(model, 0.0, ok=False)
+                        circuit_breaker.record_neutral(model)
+                    else:
+                        circuit_breaker.record_failure(model)
+                    if is_last:
+                        raise
+                    logger.warning(f"Failing over from {model} after {type(e).__name__}")
+                    error = e
+                    continue
 
-        # Split into sections
-        sections = prompt.split('\n\n')
-        condensed_sections = []
-        current_length = 0
-
-        # Always include branding section first (most critical)
-        branding_section = ""
-        for section in sections:
-            if 'BRANDING' in section or 'branding' in section.lower():
-                branding_section = self._minimize_section(section, target_length=800)
-                condensed_sections.append(branding_section)
-                current_length += len(branding_section)
-                break
+                try:
+                    if response.status_code != 200:
+                        body = await response.aread()
+                        logger.error(f"Streaming API error: {body[:500]}")
+                        model_router.record(model, call["latency"], ok=False)
+                        circuit_breaker.record_outcome(model, response.status_code)
+                        error = Exception(f"OpenRouter streaming returned status {response.status_code}")
+                        if response.status_code in FAILOVER_STATUS_CODES and not is_last:
+                            logger.warning(f"Failing over from {model} after status {response.status_code}")
+                            continue
+                        raise error
 
-        # Add other sections by priority
-        remaining_sections = [s for s in sections if 'BRANDING' not in s and 'branding' not in s.lower()]
+                    try:
+                        async for line in response.aiter_lines():
+                            # SSE payload lines only; skip ": OPENROUTER PROCESSING" comments
+                            if not line.startswith('data:'):
+                                continue
+                            data = line[5:].strip()
+                            if data == '[DONE]':
+                                break
 
-        for section in remaining_sections:
-            if current_length >= max_length - 200:  # Leave buffer
-                break
+                            chunk = json.loads(data)
+                            if chunk.get('error'):
+                                raise Exception(f"OpenRouter stream error: {chunk['error']}")
+                            if chunk.get('usage'):
+                                # Final usage chunk: refund the unused part of the max_tokens estimate
+                                usage["actual_tokens"] = chunk['usage'].get('total_tokens')
+                                self._record_prompt_usage(call, chunk['usage'])
+
+                            delta = (chunk.get('choices') or [{}])[0].get('delta', {}).get('content')
+                            if delta:
+                                content += delta
+                                yield delta
+                    except Exception:
+                        # Failed mid-stream (bad chunk, stream error, read timeout): too late
+                        # to fail over, but the model still gets demoted and counted
+                        model_router.record(model, call["latency"], ok=False)
+                        circuit_breaker.record_failure(model)
+                        raise
+                finally:
+                    await response.aclose()
+
+            model_router.record(model, call["latency"], ok=True)
+            circuit_breaker.record_success(model)
+            break
+        else:
+            if error is None:
+                record_upstream_call({"model": payload.get('model'), "circuit_open": True, "attempts": 0, "retries": 0})
+                raise CircuitOpenError(f"Circuit open for every candidate of {payload.get('model')}")
+            # Failed over, but every remaining candidate was short-circuited
+            raise error
 
-            # Check if section contains priority content
-            section_priority = sum(1 for pattern in priority_patterns if pattern in section)
+        if cache_key and content and model == payload.get('model'):
+            try:
+                await asyncio.to_thread(
+                    response_cache.set, cache_key,
+                    {"choices": [{"message": {"role": "assistant", "content": content}}]},
+                    cache_scope
+                )
+            except sqlite3.Error as e:
+                logger.warning(f"Failed to cache streamed LLM response: {e}")
+
+    async def _connection_counts(self):
+        """(in use, idle) connections; runs on the client's loop, which owns the pool"""
+        in_use = idle = 0
+        pool = getattr(getattr(self._client, '_transport', None), '_pool', None)
+        for connection in list(getattr(pool, 'connections', [])):
+            if connection.is_idle():
+                idle += 1
+            else:
+                in_use += 1
+        return in_use, idle
+
+    def pool_stats(self):
+        """Connection pool statistics for the health endpoint"""
+        metrics = self._pool_metrics
+        in_use = idle = None
+        loop = self._client_loop
+        if self._client is not None and loop is not None and loop.is_running():
+            # The pool is only consistent from its own loop, so count there
+            try:
+                in_use, idle = asyncio.run_coroutine_threadsafe(self._connection_counts(), loop).result(timeout=1)
+            except Exception as e:
+                logger.warning(f"Could not read connection pool state: {e}")
 
-            if section_priority > 0:
-                # Allocate space based on priority
-                available_space = max_length - current_length - 100
-                section_space = min(available_space, 300 + (section_priority * 100))
+        requests_total = metrics["requests_total"]
+        return {
+            "http2": app.config['OPENROUTER_HTTP2'],
+            "max_connections": app.config['OPENROUTER_MAX_CONNECTIONS'],
+            "max_keepalive_connections": app.config['OPENROUTER_MAX_KEEPALIVE_CONNECTIONS'],
+            "keepalive_expiry": app.config['OPENROUTER_KEEPALIVE_EXPIRY'],
+            "connections_in_use": in_use,
+            "connections_idle": idle,
+            "requests_in_flight": metrics["in_flight"],
+            "requests_total": requests_total,
+            "avg_wait_ms": round(metrics["wait_time_total"] / requests_total * 1000, 2) if requests_total else 0.0,
+            "max_wait_ms": round(metrics["wait_time_max"] * 1000, 2)
+        }
 
-                condensed_section = self._minimize_section(section, target_length=section_space)
-                condensed_sections.append(condensed_section)
-                current_length += len(condensed_section)
+    async def aclose(self):
+        """Close the pooled client and release its connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._client_loop = None
+            logger.info("Closed pooled OpenRouter client")
+
+    @staticmethod
+    def _parse_analysis_content(content):
+        """Structured data from Claude's analysis answer (blocking; run off the event loop)"""
+        # Extract JSON from response (handle markdown code blocks)
+        json_match = re.search(r'```json\s*(\{.*?\})\s*```', content, re.DOTALL)
+        if json_match:
+            structured_data = json.loads(json_match.group(1))
+            logger.info("Extracted JSON from markdown code block")
+        else:
+            # Try to parse as raw JSON
+            structured_data = json.loads(content)
+            logger.info("Parsed response as raw JSON")
 
-        # Join and final trim if still too long
-        condensed_prompt = '\n\n'.join(condensed_sections)
+        logger.info(f"Claude extracted structured data: {json.dumps(structured_data, indent=2)}")
+        return structured_data
 
-        if len(condensed_prompt) > max_length:
-            # Final emergency truncation
-            condensed_prompt = condensed_prompt[:max_length-50] + "... [truncated]"
+    async def _analyze_freeform_content(self, raw_notes, client_name='', industry='', on_field=None):
+        """Step 1: Use Claude to extract CONCISE BULLET POINTS for infographic generation
 
-        logger.info(f"Condensed prompt from {len(prompt)} to {len(condensed_prompt)} characters")
-        return condensed_prompt
+        When streaming is enabled, on_field(key, value, fields_so_far) is awaited as each
+        top-level JSON field completes.
+        """
 
-    def _minimize_section(self, section, target_length):
-        """Minimize a section while preserving key information"""
+        # Static instructions and schema first (cacheable), notes last
+        analysis_prompt = ANALYSIS_PROMPT.render_parts(
+            raw_notes=raw_notes,
+            client_name=client_name or 'Not provided',
+            industry=industry or 'Not provided'
+        )
 
-        if len(section) <= target_length:
-            return section
+        payload = {
+            "model": app.config['MODEL_CASE_STUDY_ANALYSIS'],
+            "messages": with_cache_breakpoint([
+                {
+                    "role": "system",
+                    "content": "You are a professional business analyst and expert storyteller creating compelling case studies. Return ONLY valid JSON with rich narrative content based on the provided notes. Use specific facts from notes while creating engaging business narratives."
+                },
+                {
+                    "role": "user",
+                    "content": analysis_prompt
+                }
+            ], 1),
+            "temperature": 0.5,  # Balanced for accuracy + narrative creativity
+            "max_tokens": 6000  # Increased for full narrative content
+        }
+        content = ''
 
-        # Remove redundant words and use abbreviations
-        minimized = section
+        try:
+            if app.config['ANALYSIS_STREAMING']:
+                # Stream tokens and surface each top-level field as soon as it closes
+                parser = IncrementalJSONParser()
+                async for delta in self._stream_chat(payload, timeout=90.0, cache_scope='case_study',
+                                                    task='case_study_analysis'):
+                    content += delta
+                    for key, value in parser.feed(delta):
+                        if on_field:
+                            await on_field(key, value, dict(parser.fields))
+                logger.info(f"Claude analysis streamed {len(parser.fields)} fields")
+            else:
+                response = await self._post_chat(
+                    payload,
+                    timeout=90.0,  # Increased timeout for longer generation
+                    cache_scope='case_study',
+                    task='case_study_analysis'
+                )
 
-        # Common replacements
-        replacements = {
-            'Create a one-page': 'Create 1-page',
-            'infographic': 'info',
-            'professional': 'pro',
-            'background': 'bg',
-            'corporation': 'corp',
-            'japan': 'JP',
-            'left': 'L', 'right': 'R'
-        }
+                response_json = await read_response_json(response)
+                logger.info(f"Claude analysis response status: {response.status_code}")
 
-        for old, new in replacements.items():
-            minimized = minimized.replace(old, new)
+                if response.status_code != 200:
+                    logger.error(f"Claude API error: {response_json}")
+                    raise Exception(f"Claude API returned status {response.status_code}")
 
-        # Remove excessive whitespace and empty lines
-        lines = [line.strip() for line in minimized.split('\n') if line.strip()]
-        minimized = ' '.join(lines)
+                content = response_json['choices'][0]['message']['content']
 
-        # If still too long, truncate intelligently
-        if len(minimized) > target_length:
-            # Try to keep first and last parts
-            if target_length > 100:
-                keep_start = target_length // 2 - 20
-                keep_end = target_length // 2 - 20
-                minimized = minimized[:keep_start] + "..." + minimized[-keep_end:]
-            else:
-                minimized = minimized[:target_length-3] + "..."
+            logger.info(f"Claude raw response: {content[:500]}...")
+            return await asyncio.to_thread(self._parse_analysis_content, content)
 
-        return minimized
+        except json.JSONDecodeError as e:
+            logger.error(f"Failed to parse Claude response as JSON: {e}")
+            logger.error(f"Content was: {content}")
+            raise
+        except Exception as e:
+            logger.error(f"Claude analysis failed: {e}")
+            raise
 
     async def _generate_complete_case_study(self, structured_data):
         """Step 2: Generate a SINGLE 8.5x11 infographic image using Gemini
@@ -380,61 +2434,43 @@ BAD bullet: "The platform significantly improved the efficiency of deal evaluati
             if label and value:
                 metrics_display.append(f"{value} {label}")
 
-        # Build the infographic prompt - balanced: includes branding but avoids over-detail
-        # Format metrics concisely
-        metrics_summary = ", ".join([f"{m.get('value','')} {m.get('label','')}" for m in metrics[:4]])
-
-        infographic_prompt = f"""Create a one-page case study infographic.
-
-BRANDING (use image_0 as logo reference):
-- Header: Navy (#1e3a5f) bar with Calance logo on left, "CASE STUDY" badge on right
-- Footer: Navy bar with "calance.com" left, "A GROUP COMPANY OF DTS CORPORATION, JAPAN" right
-- Colors: Navy primary, Blue (#2563eb) accent, Orange (#f97316) highlights, white background
-
-CONTENT:
-Client: {client_name} | {industry}
-Headline: {title}
-
-Challenge: {challenge_bullets[0] if challenge_bullets else 'Manual processes'}
-Solution: {solution_bullets[0] if solution_bullets else 'AI automation'}
-Results: {results_bullets[0] if results_bullets else 'Significant improvement'}
-
-Metrics: {metrics_summary}
-
-STYLE: Professional with data visualizations for metrics."""
-
-        # Apply smart prompt condensation to prevent OpenRouter function call errors
-        original_length = len(infographic_prompt)
-        infographic_prompt = self._condense_infographic_prompt(infographic_prompt, max_length=3000)
-        condensed_length = len(infographic_prompt)
-
-        if original_length != condensed_length:
-            logger.info(f"Prompt condensed: {original_length} → {condensed_length} characters")
+        # Build the infographic prompt - instructions are fixed, content slots share the length budget
+        infographic_prompt = INFOGRAPHIC_PROMPT.render_parts(
+            max_tokens=INFOGRAPHIC_PROMPT_MAX_TOKENS,
+            client_name=client_name,
+            industry=industry,
+            title=title,
+            challenge=challenge_bullets[0] if challenge_bullets else 'Manual processes',
+            solution=solution_bullets[0] if solution_bullets else 'AI automation',
+            results=results_bullets[0] if results_bullets else 'Significant improvement',
+            metrics=", ".join([f"{m.get('value','')} {m.get('label','')}" for m in metrics[:4]])
+        )
 
         try:
             # Load logo for multimodal request
-            logo_base64 = load_logo_as_base64()
+            # The first call per logo version re-encodes it, so keep it off the loop
+            logo_base64 = await asyncio.to_thread(load_logo_as_base64)
             if not logo_base64:
                 logger.warning("Logo not available for image generation")
                 return []
 
             logger.info("Generating single 8.5x11 infographic image...")
 
+            # Static branding instructions and logo lead; case study content comes last
+            static_prompt, content_prompt = infographic_prompt
             request_payload = {
                 "model": app.config['MODEL_CASE_STUDY_IMAGE'],
-                "messages": [{
+                "messages": with_cache_breakpoint([{
                     "role": "user",
                     "content": [
+                        static_prompt,
                         {
                             "type": "image_url",
                             "image_url": {"url": logo_base64}
                         },
-                        {
-                            "type": "text",
-                            "text": infographic_prompt
-                        }
+                        content_prompt
                     ]
-                }],
+                }], 2),
                 "temperature": 0.7,
                 "max_tokens": 1000,
                 "modalities": ["image", "text"],
@@ -447,52 +2483,49 @@ STYLE: Professional with data visualizations for metrics."""
             logger.info(f"Request model: {request_payload.get('model')}")
             logger.info(f"Request includes logo: {logo_base64[:50] if logo_base64 else 'NO LOGO'}")
 
-            async with httpx.AsyncClient(timeout=90.0) as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json=request_payload
-                )
+            response = await self._post_chat(
+                request_payload, timeout=90.0, cache_scope='case_study', task='case_study_image', hedge=True
+            )
 
-                response_json = response.json()
+            response_json = await read_response_json(response)
 
-                if response.status_code != 200:
-                    logger.error(f"Gemini infographic generation failed: {response_json}")
-                    return []
-
-                # Log full response structure for debugging
-                logger.info(f"Full response keys: {response_json.keys()}")
-
-                # Extract image from response
-                choice = response_json.get('choices', [{}])[0]
-                logger.info(f"Choice keys: {choice.keys()}")
-
-                # CHECK FOR ERROR FIRST!
-                if 'error' in choice and choice['error']:
-                    logger.error(f"OpenRouter returned error in choice: {choice['error']}")
-                    logger.error(f"Full error details: {choice}")
-                    return []
-
-                message = choice.get('message', {})
-                logger.info(f"Infographic response - message keys: {message.keys()}")
-
-                ai_images = message.get('images', [])
-
-                if ai_images:
-                    logger.info(f"Gemini returned {len(ai_images)} infographic image(s)")
-                    return [{
-                        "id": "infographic_0",
-                        "url": ai_images[0]["image_url"]["url"],
-                        "type": "image/png",
-                        "placement": "infographic",
-                        "alt": f"Case study infographic for {client_name}"
-                    }]
-                else:
-                    logger.warning("No infographic image returned from Gemini")
-                    content = message.get('content', '')
-                    if isinstance(content, str):
-                        logger.info(f"Gemini text response (no image): {content[:300]}")
-                    return []
+            if response.status_code != 200:
+                logger.error(f"Gemini infographic generation failed: {response_json}")
+                return []
+
+            # Log full response structure for debugging
+            logger.info(f"Full response keys: {response_json.keys()}")
+
+            # Extract image from response
+            choice = response_json.get('choices', [{}])[0]
+            logger.info(f"Choice keys: {choice.keys()}")
+
+            # CHECK FOR ERROR FIRST!
+            if 'error' in choice and choice['error']:
+                logger.error(f"OpenRouter returned error in choice: {choice['error']}")
+                logger.error(f"Full error details: {choice}")
+                return []
+
+            message = choice.get('message', {})
+            logger.info(f"Infographic response - message keys: {message.keys()}")
+
+            ai_images = message.get('images', [])
+
+            if ai_images:
+                logger.info(f"Gemini returned {len(ai_images)} infographic image(s)")
+                return [{
+                    "id": "infographic_0",
+                    "url": ai_images[0]["image_url"]["url"],
+                    "type": "image/png",
+                    "placement": "infographic",
+                    "alt": f"Case study infographic for {client_name}"
+                }]
+            else:
+                logger.warning("No infographic image returned from Gemini")
+                content = message.get('content', '')
+                if isinstance(content, str):
+                    logger.info(f"Gemini text response (no image): {content[:300]}")
+                return []
 
         except Exception as e:
             logger.error(f"Infographic generation failed: {e}")
@@ -521,65 +2554,64 @@ STYLE: Professional with data visualizations for metrics."""
             else:
                 prompt = self._build_generation_prompt(client_data)
 
-            # Call OpenRouter API using httpx
-            async with httpx.AsyncClient() as client:
-                # Build messages - multimodal for image generation, text-only for refinement
-                if "gemini" in model.lower() and not is_refinement:
-                    # Multimodal message with logo for image generation
-                    logo_base64 = load_logo_as_base64()
+            # Build messages - multimodal for image generation, text-only for refinement
+            if "gemini" in model.lower() and not is_refinement:
+                # Multimodal message with logo for image generation
+                logo_base64 = await asyncio.to_thread(load_logo_as_base64)
 
-                    messages = [{
-                        "role": "user",
-                        "content": [
-                            {
-                                "type": "image_url",
-                                "image_url": {"url": logo_base64}
-                            },
-                            {
-                                "type": "text",
-                                "text": prompt
-                            }
-                        ]
-                    }]
-                    logger.info(f"Using multimodal message with logo for image generation")
-                else:
-                    # Text-only message for refinement
-                    messages = [
+                # The logo is constant too, so the cached prefix ends after it
+                static_prompt, request_prompt = prompt
+                messages = with_cache_breakpoint([{
+                    "role": "user",
+                    "content": [
+                        static_prompt,
                         {
-                            "role": "system",
-                            "content": "You are an expert case study writer for Calance. Return detailed case study content as a JSON object."
+                            "type": "image_url",
+                            "image_url": {"url": logo_base64}
                         },
-                        {
-                            "role": "user",
-                            "content": prompt
-                        }
+                        request_prompt
                     ]
+                }], 2)
+                logger.info(f"Using multimodal message with logo for image generation")
+            else:
+                # Text-only message for refinement
+                messages = with_cache_breakpoint([
+                    {
+                        "role": "system",
+                        "content": "You are an expert case study writer for Calance. Return detailed case study content as a JSON object."
+                    },
+                    {
+                        "role": "user",
+                        "content": prompt
+                    }
+                ], 1)
 
-                api_params = {
-                    "model": model,
-                    "messages": messages,
-                    "temperature": 0.7,
-                    "max_tokens": 4000,  # Increased for richer content + image generation
-                }
+            api_params = {
+                "model": model,
+                "messages": messages,
+                "temperature": 0.7,
+                "max_tokens": 4000,  # Increased for richer content + image generation
+            }
 
-                # Add image generation parameters ONLY for Gemini image models
-                if "gemini" in model.lower() and not is_refinement:
-                    api_params["modalities"] = ["image", "text"]
-                    logger.info(f"Using model with image generation: {model}")
-                    logger.info(f"Request params: {json.dumps({k: v for k, v in api_params.items() if k != 'messages'}, indent=2)}")
-
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json=api_params,
-                    timeout=90.0  # Increased timeout for image generation
-                )
+            # Add image generation parameters ONLY for Gemini image models
+            if "gemini" in model.lower() and not is_refinement:
+                api_params["modalities"] = ["image", "text"]
+                logger.info(f"Using model with image generation: {model}")
+                logger.info(f"Request params: {json.dumps({k: v for k, v in api_params.items() if k != 'messages'}, indent=2)}")
+
+            # Call OpenRouter API through the shared connection pool
+            response = await self._post_chat(
+                api_params,
+                timeout=90.0,  # Increased timeout for image generation
+                cache_scope='refinement' if is_refinement else 'case_study',
+                task='case_study_refinement' if is_refinement else 'case_study_image'
+            )
 
-            ai_response = response.json()
+            ai_response = await read_response_json(response)
             logger.info(f"API Response keys: {list(ai_response.keys())}")
 
             # Log full response for debugging image generation
-            logger.info(f"Full API response (first 1000 chars): {json.dumps(ai_response, indent=2)[:1000]}")
+            logger.info(f"Full API response (first 1000 chars): {loggable_json(ai_response)}")
 
             ai_message = ai_response["choices"][0]["message"]
             ai_content = ai_message.get("content", "")
@@ -608,10 +2640,11 @@ STYLE: Professional with data visualizations for metrics."""
             if not ai_images:
                 logger.warning("No images found in response")
                 logger.info(f"Message structure: {list(ai_message.keys())}")
-                logger.info(f"Full message content: {json.dumps(ai_message, indent=2)[:500]}")  # First 500 chars
+                logger.info(f"Full message content: {loggable_json(ai_message, limit=500)}")  # First 500 chars
 
             # Parse AI response into structured format
-            return self._parse_ai_response(ai_content, client_data, is_refinement, ai_images)
+            # Regex extraction and JSON parsing of long answers stay off the event loop
+            return await asyncio.to_thread(self._parse_ai_response, ai_content, client_data, is_refinement, ai_images)
 
         except Exception as e:
             logger.error(f"Error in AI generation: {str(e)}")
@@ -619,125 +2652,43 @@ STYLE: Professional with data visualizations for metrics."""
             return self._generate_mock_case_study(client_data)
 
     def _build_generation_prompt(self, client_data):
-        """Build prompt requesting BOTH a case study document image AND JSON content"""
+        """Build prompt parts requesting BOTH a case study document image AND JSON content"""
         # Extract key information for visualization
         client_name = client_data.get('clientName', 'Client Name')
         industry = client_data.get('industry', 'Technology')
         challenge = client_data.get('challenge', 'Business challenge')
         solution = client_data.get('solution', 'Solution delivered')
 
-        # Build brand guidelines JSON for the prompt
-        brand_json = json.dumps(CALANCE_BRAND, indent=2)
-
-        # Create hybrid prompt requesting image + JSON
-        prompt = f"""You are creating a professional case study for Calance. I'm providing you with the Calance logo image and case study information.
-
-YOUR TASK: Create a professional 8.5x11 case study DOCUMENT IMAGE that communicates the value of this project, AND provide the detailed text content as JSON.
-
-==== CASE STUDY INFORMATION ====
-Client: {client_name}
-Industry: {industry}
-Challenge: {challenge}
-Solution: {solution}"""
-
-        # Add optional fields
+        # Optional fields
+        details = ""
         if client_data.get('roi'):
-            prompt += f"\nROI/Impact: {client_data['roi']}"
+            details += f"\nROI/Impact: {client_data['roi']}"
         if client_data.get('metrics'):
-            prompt += "\nKey Metrics:"
+            details += "\nKey Metrics:"
             for metric in client_data.get('metrics', []):
                 if metric.get('label'):
-                    prompt += f"\n• {metric['label']}: {metric.get('before', '')} → {metric.get('after', '')} ({metric.get('improvement', 'Improved')})"
-
-        prompt += f"""
-
-==== PART 1: CREATE THE DOCUMENT IMAGE ====
-
-Create an 8.5x11 image that looks like a professional business case study document. This should be a complete, polished document layout (NOT separate individual images).
-
-BRAND GUIDELINES:
-{brand_json}
-
-LAYOUT REQUIREMENTS:
-- Header: Place the Calance logo (provided) at top-left + tagline "{CALANCE_BRAND['company_info']['tagline']}" at top-right
-- Title section: Create a compelling case study title in large navy text (use colors from brand guidelines)
-- Three-column layout with visual hierarchy:
-  * THE CHALLENGE (left column)
-    - Key pain points in bullet format with icons
-    - Highlight: "{challenge[:100]}..."
-  * OUR SOLUTION (middle column)
-    - Technical highlights in bullet format
-    - Solution summary: "{solution[:100]}..."
-  * RESULTS & IMPACT (right column)
-    - Prominent financial metrics display
-    - ROI visualization
-- Highlight key metrics in large, eye-catching text
-- Footer: Contact info - {CALANCE_BRAND['company_info']['website']} | {CALANCE_BRAND['company_info']['address']}
-
-DESIGN STYLE:
-- Clean, corporate, professional business document (NOT a flyer or poster)
-- Use data visualization elements for numbers
-- Color scheme: Navy (#1e3a5f), Blue (#2563eb), Orange (#f97316) accents
-- Professional typography with strong visual hierarchy
-- White space and clear section separation
-- Similar quality to a professional consulting firm case study
-
-CONTENT TO VISUALIZE:
-- Title highlighting the transformation: "From [Challenge] to [Result]: How {client_name} Transformed {industry} Operations"
-- Challenge section with 3-5 bullet points
-- Solution section with 3-5 bullet points
-- Results with prominent metrics (use realistic improvement numbers if not provided)
-
-==== PART 2: PROVIDE JSON CONTENT ====
-
-Also provide the complete case study content as a JSON object for text-based rendering.
-
-SYNTHESIS REQUIREMENTS:
-1. Create a compelling narrative arc (before/challenge → intervention/solution → transformation/results)
-2. Add industry context and business impact depth
-3. Emphasize business outcomes over technical details
-4. Include quantified results (synthesize realistic ranges if needed)
-5. Use professional, consultative tone
-
-OUTPUT FORMAT: Return a JSON object with this structure:
-{{
-  "title": "Compelling headline leading with transformation/result",
-  "subtitle": "Descriptive tagline about the business impact",
-  "executiveSummary": "2-3 sentence hook that tells the transformation story",
-  "challenge": "Enhanced narrative with industry context, business impact, and emotional resonance (3-4 rich paragraphs)",
-  "solution": "How Calance uniquely addressed the challenge - approach, methodology, and why it worked (3-4 paragraphs)",
-  "implementation": "Key milestones, timeline, and delivery approach (2-3 paragraphs)",
-  "results": "Quantified business outcomes and ongoing impact (2-3 paragraphs)",
-  "testimonial": "Client-perspective testimonial-ready quote",
-  "roi": "Powerful ROI statement with specific numbers",
-  "futureOutlook": "Ongoing partnership and strategic next phases (1-2 paragraphs)"
-}}
-
-Remember: Create BOTH the 8.5x11 document image AND the JSON content.
-        """
-
-        return prompt
+                    details += f"\n• {metric['label']}: {metric.get('before', '')} → {metric.get('after', '')} ({metric.get('improvement', 'Improved')})"
+
+        # Hybrid prompt requesting image + JSON
+        return GENERATION_PROMPT.render_parts(
+            client_name=client_name,
+            industry=industry,
+            challenge=challenge,
+            solution=solution,
+            details=details,
+            challenge_highlight=challenge,
+            solution_highlight=solution
+        )
 
     def _build_refinement_prompt(self, client_data, feedback):
-        """Build prompt for refining existing case study"""
-        prompt = f"""
-Refine the following case study based on the user feedback:
-
-Current case study:
-Title: {client_data.get('title', '')}
-Subtitle: {client_data.get('subtitle', '')}
-Challenge: {client_data.get('challenge', '')}
-Solution: {client_data.get('solution', '')}
-
-User feedback: "{feedback}"
-
-Please refine the case study to address the feedback while maintaining the core information. Focus on:
-- Making the requested changes
-- Enhancing the compelling aspects
-- Maintaining professional tone
-- Ensuring consistency with Calance branding
-        """
-        return prompt
+        """Build prompt parts for refining existing case study"""
+        return REFINEMENT_PROMPT.render_parts(
+            title=client_data.get('title', ''),
+            subtitle=client_data.get('subtitle', ''),
+            challenge=client_data.get('challenge', ''),
+            solution=client_data.get('solution', ''),
+            feedback=feedback
+        )
 
     def _parse_ai_response(self, ai_response, client_data, is_refinement, ai_images=None):
         """Parse AI response into structured case study format - handles hybrid text+JSON responses"""
@@ -881,102 +2832,60 @@ Please refine the case study to address the feedback while maintaining the core
             # Build prompt for presentation generation
             prompt = self._build_presentation_prompt(presentation_data)
 
-            # Call OpenRouter API using httpx
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json={
-                        "model": model,
-                        "messages": [
-                            {
-                                "role": "system",
-                                "content": "You are an expert presentation designer for Calance. Create compelling, professional presentations that effectively communicate business ideas. Generate slides that are visually balanced, with clear titles and concise bullet points. Generate relevant images for slides that need visual impact."
-                            },
-                            {
-                                "role": "user",
-                                "content": prompt
-                            }
-                        ],
-                        "modalities": ["text", "image"],
-                        "temperature": 0.7,
-                        "max_tokens": 2000,
-                        "image_config": {
-                            "aspect_ratio": "16:9"
+            # Call OpenRouter API through the shared connection pool
+            response = await self._post_chat(
+                {
+                    "model": model,
+                    "messages": with_cache_breakpoint([
+                        {
+                            "role": "system",
+                            "content": "You are an expert presentation designer for Calance. Create compelling, professional presentations that effectively communicate business ideas. Generate slides that are visually balanced, with clear titles and concise bullet points. Generate relevant images for slides that need visual impact."
+                        },
+                        {
+                            "role": "user",
+                            "content": prompt
                         }
-                    },
-                    timeout=60.0
-                )
+                    ], 1),
+                    "modalities": ["text", "image"],
+                    "temperature": 0.7,
+                    "max_tokens": 2000,
+                    "image_config": {
+                        "aspect_ratio": "16:9"
+                    }
+                },
+                timeout=60.0,
+                cache_scope='presentation',
+                task='presentation_generation'
+            )
 
-            ai_response = response.json()
+            ai_response = await read_response_json(response)
             ai_message = ai_response["choices"][0]["message"]
             ai_content = ai_message.get("content", "")
             ai_images = ai_message.get("images", [])
 
             # Parse AI response into structured presentation format
-            return self._parse_presentation_response(ai_content, presentation_data, ai_images)
+            return await asyncio.to_thread(self._parse_presentation_response, ai_content, presentation_data, ai_images)
 
         except Exception as e:
             logger.error(f"Error in presentation generation: {str(e)}")
             return self._generate_mock_presentation(presentation_data)
 
-    def _build_presentation_prompt(self, presentation_data):
-        """Build prompt for presentation generation with image support"""
-        duration = int(presentation_data.get('duration', '30'))
-        key_points = [kp.get('text', '') for kp in presentation_data.get('keyPoints', []) if kp.get('text')]
-
-        # Calculate number of slides based on duration
-        num_slides = max(5, min(12, duration // 3))  # 1 slide per 3 minutes, min 5, max 12
-
-        prompt = f"""You are a professional presentation designer for Calance, a premier technology consulting firm.
-Create a visually impactful, professional presentation that will impress the target audience.
-
-Presentation Details:
-- Title: {presentation_data.get('title', 'Untitled Presentation')}
-- Objective: {presentation_data.get('objective', '')}
-- Target Audience: {presentation_data.get('audience', '')}
-- Duration: {duration} minutes
-- Key Talking Points:
-{chr(10).join(f"- {point}" for point in key_points)}
-
-Instructions:
-1. Generate a complete, professional presentation with approximately {num_slides} slides
-2. Create visually striking images for key slides using the image generation capability
-3. Design a modern, business-appropriate layout with Calance's brand (navy blue, orange, white)
-4. Focus on clarity, impact, and professional polish
-5. Each slide should tell a story and build upon the previous one
-
-Required Slides:
-1. Title Slide: Powerful headline with a professional background image
-2. Agenda: Overview of the presentation structure
-3-8. Content Slides: Each covering key talking points with relevant visuals
-9. Solution/Calance Value Proposition: How Calance solves the problem
-10. Results/ROI: Quantifiable outcomes and benefits
-11. Next Steps/Call to Action: Clear next steps for the audience
-
-For each slide that needs a visual element, generate an appropriate image that enhances the message.
-Use professional business imagery, technology visuals, charts, and diagrams that support the content.
-
-OUTPUT FORMAT: Return ONLY a JSON object with this structure (no markdown, no explanations):
-{{
-  "slides": [
-    {{
-      "type": "title",
-      "title": "Powerful presentation title",
-      "subtitle": "Compelling subtitle"
-    }},
-    {{
-      "type": "content",
-      "title": "Slide title",
-      "content": ["Bullet point 1", "Bullet point 2", "Bullet point 3"]
-    }},
-    ...more slides...
-  ]
-}}
-
-Generate approximately {num_slides} slides total. Each content slide should have 3-5 concise bullet points.
-        """
-        return prompt
+    def _build_presentation_prompt(self, presentation_data):
+        """Build prompt parts for presentation generation with image support"""
+        duration = int(presentation_data.get('duration', '30'))
+        key_points = [kp.get('text', '') for kp in presentation_data.get('keyPoints', []) if kp.get('text')]
+
+        # Calculate number of slides based on duration
+        num_slides = max(5, min(12, duration // 3))  # 1 slide per 3 minutes, min 5, max 12
+
+        return PRESENTATION_PROMPT.render_parts(
+            title=presentation_data.get('title', 'Untitled Presentation'),
+            objective=presentation_data.get('objective', ''),
+            audience=presentation_data.get('audience', ''),
+            duration=duration,
+            key_points="\n".join(f"- {point}" for point in key_points),
+            num_slides=num_slides
+        )
 
     def _parse_presentation_response(self, ai_content, presentation_data, ai_images=None):
         """Parse AI response into structured presentation format with images"""
@@ -1146,43 +3055,34 @@ Generate approximately {num_slides} slides total. Each content slide should have
                 return {"content": "Please provide input text to generate content."}
 
             # Build the full prompt
-            full_prompt = f"""
-You are an expert recruiting professional working for Calance. Generate high-quality recruiting content based on the following:
-
-Tool: {tool}
-Input: {input_text}
-Instructions: {prompt}
-
-Please generate professional, effective content that follows recruiting best practices. Be specific, actionable, and tailored to the recruiting context.
-            """
+            full_prompt = RECRUITING_PROMPT.render_parts(tool=tool, input_text=input_text, instructions=prompt)
 
             # Use configured model for recruiting tools
             model = app.config['MODEL_RECRUITING_GENERATION']
 
-            # Call OpenRouter API using httpx
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/chat/completions",
-                    headers=self.headers,
-                    json={
-                        "model": model,
-                        "messages": [
-                            {
-                                "role": "system",
-                                "content": "You are an expert recruiting specialist with deep knowledge of talent acquisition, candidate engagement, and recruitment best practices."
-                            },
-                            {
-                                "role": "user",
-                                "content": full_prompt
-                            }
-                        ],
-                        "temperature": 0.7,
-                        "max_tokens": 1500,
-                    },
-                    timeout=60.0
-                )
+            # Call OpenRouter API through the shared connection pool
+            response = await self._post_chat(
+                {
+                    "model": model,
+                    "messages": with_cache_breakpoint([
+                        {
+                            "role": "system",
+                            "content": "You are an expert recruiting specialist with deep knowledge of talent acquisition, candidate engagement, and recruitment best practices."
+                        },
+                        {
+                            "role": "user",
+                            "content": full_prompt
+                        }
+                    ], 1),
+                    "temperature": 0.7,
+                    "max_tokens": 1500,
+                },
+                timeout=60.0,
+                cache_scope='recruiting',
+                task='recruiting_generation'
+            )
 
-            ai_response = response.json()
+            ai_response = await read_response_json(response)
             content = ai_response["choices"][0]["message"]["content"]
 
             return {
@@ -1406,65 +3306,617 @@ Proceed with [recommended next steps in process].
 # Initialize AI service
 ai_service = AIService()
 
-# In-memory storage for version history (in production, use Redis or database)
-version_history = {}
+def shutdown_async_runtime():
+    """Close the pooled OpenRouter client and stop the worker loop on exit"""
+    if async_runner._loop is None or async_runner._pid != os.getpid():
+        return
+    try:
+        async_runner.run(ai_service.aclose(), timeout=5)
+    except Exception as e:
+        logger.warning(f"Error closing OpenRouter client: {e}")
+    async_runner.stop()
+
+atexit.register(shutdown_async_runtime)
 
 # ============================================
-# Image Processing Utilities
+# Version History
 # ============================================
 
-def base64_to_image_buffer(data_url):
-    """Convert base64 data URL to image buffer for ReportLab"""
-    try:
-        # Extract base64 data from data URL
-        if ',' in data_url:
-            header, base64_data = data_url.split(",", 1)
+class VersionStore:
+    """SQLite-backed case study version history shared by every worker process
+
+    Versions are kept per generation id (newest VERSION_MAX_PER_GENERATION) and
+    expire after VERSION_TTL_SECONDS. Embedded image data URLs are moved into
+    image_blobs and referenced from the version JSON by image id, so a refinement
+    that keeps the same infographic does not store it again. Storing a version
+    touches its images, which then live for IMAGE_BLOB_TTL_SECONDS.
+    """
+
+    # Data URLs at least this long are moved to the image blob store
+    BLOB_MIN_LENGTH = 1024
+    PURGE_INTERVAL_SECONDS = 300
+
+    def __init__(self, path, max_versions, ttl_seconds):
+        self.path = path
+        self.max_versions = max_versions
+        self.ttl_seconds = ttl_seconds
+        self._initialized = False
+        self._last_purge = 0.0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    with sqlite3.connect(self.path, timeout=30) as conn:
+                        conn.execute("PRAGMA journal_mode=WAL")
+                        conn.executescript("""
+                            CREATE TABLE IF NOT EXISTS versions (
+                                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                                generation_id TEXT NOT NULL,
+                                data TEXT NOT NULL,
+                                created_at REAL NOT NULL
+                            );
+                            CREATE INDEX IF NOT EXISTS versions_generation ON versions (generation_id, id);
+                        """)
+                    self._initialized = True
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _extract_images(self, value):
+        """Replace large image data URLs with {"$image": id, "mime": type} references"""
+        if isinstance(value, dict):
+            return {key: self._extract_images(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._extract_images(item) for item in value]
+        if isinstance(value, str) and len(value) >= self.BLOB_MIN_LENGTH and value.startswith('data:image/'):
+            mime_type = value[len('data:'):value.index(';')] if ';' in value else 'image/png'
+            return {"$image": image_blobs.put(resolve_image_bytes(value)), "mime": mime_type}
+        return value
+
+    def _restore_images(self, value):
+        if isinstance(value, dict):
+            if set(value) == {"$image", "mime"}:
+                raw = image_blobs.get(value["$image"])
+                if raw is None:
+                    return None
+                return f"data:{value['mime']};base64,{base64.b64encode(raw).decode('utf-8')}"
+            return {key: self._restore_images(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._restore_images(item) for item in value]
+        return value
+
+    def append(self, generation_id, data):
+        """Store a new version, keeping only the newest max_versions for the generation"""
+        document = json.dumps(self._extract_images(data))
+        with self._connect() as conn:
+            version_id = conn.execute(
+                "INSERT INTO versions (generation_id, data, created_at) VALUES (?, ?, ?)",
+                (generation_id, document, time.time())
+            ).lastrowid
+            conn.execute("""
+                DELETE FROM versions WHERE generation_id = ? AND id NOT IN (
+                    SELECT id FROM versions WHERE generation_id = ? ORDER BY id DESC LIMIT ?
+                )
+            """, (generation_id, generation_id, self.max_versions))
+
+        if time.monotonic() - self._last_purge > self.PURGE_INTERVAL_SECONDS:
+            self._last_purge = time.monotonic()
+            self.purge_expired()
+        return version_id
+
+    def previous(self, generation_id):
+        """Data of the version before the newest one, or None"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT data FROM versions WHERE generation_id = ? ORDER BY id DESC LIMIT 1 OFFSET 1",
+                (generation_id,)
+            ).fetchone()
+        return self._restore_images(json.loads(row["data"])) if row else None
+
+    def list(self, generation_id):
+        """Version metadata for a generation, newest first
+
+        version numbers count the kept versions from 1 (oldest); version_id is stable.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT id, created_at FROM versions WHERE generation_id = ? ORDER BY id DESC",
+                (generation_id,)
+            ).fetchall()
+        return [
+            {"version": len(rows) - index,
+             "version_id": row["id"],
+             "timestamp": datetime.fromtimestamp(row["created_at"], timezone.utc).isoformat()}
+            for index, row in enumerate(rows)
+        ]
+
+    def purge_expired(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM versions WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+
+version_store = VersionStore(
+    os.path.join(app.config['DATA_DIR'], 'versions.sqlite3'),
+    max_versions=app.config['VERSION_MAX_PER_GENERATION'],
+    ttl_seconds=app.config['VERSION_TTL_SECONDS']
+)
+
+# ============================================
+# Image Blob Store
+# ============================================
+
+class ImageBlobStore:
+    """Content-addressed image files shared by every worker process on the host
+
+    Images are written once under their SHA-256 and referenced by that id in JSON
+    (served from /api/images/<hash>) instead of travelling as base64 data URLs.
+    Files untouched for IMAGE_BLOB_TTL_SECONDS are purged.
+    """
+
+    PURGE_INTERVAL_SECONDS = 300
+    HASH_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+    def __init__(self, directory, ttl_seconds):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self._last_purge = 0.0
+
+    def path(self, image_hash, must_exist=True):
+        if not self.HASH_PATTERN.match(image_hash or ''):
+            return None
+        path = os.path.join(self.directory, image_hash[:2], image_hash)
+        return path if not must_exist or os.path.exists(path) else None
+
+    def put(self, data):
+        """Store image bytes (idempotent) and return their hash"""
+        image_hash = hashlib.sha256(data).hexdigest()
+        path = self.path(image_hash, must_exist=False)
+        if os.path.exists(path):
+            os.utime(path)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        if time.monotonic() - self._last_purge > self.PURGE_INTERVAL_SECONDS:
+            self._last_purge = time.monotonic()
+            self.purge_expired()
+        return image_hash
+
+    def get(self, image_hash):
+        path = self.path(image_hash)
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            return f.read()
+
+    @staticmethod
+    def sniff_mime_type(head):
+        if head.startswith(b'\x89PNG'):
+            return 'image/png'
+        if head.startswith(b'\xff\xd8\xff'):
+            return 'image/jpeg'
+        if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            return 'image/webp'
+        if head.startswith(b'GIF8'):
+            return 'image/gif'
+        return 'application/octet-stream'
+
+    def mime_type(self, image_hash):
+        with open(self.path(image_hash, must_exist=False), 'rb') as f:
+            return self.sniff_mime_type(f.read(12))
+
+    def purge_expired(self):
+        cutoff = time.time() - self.ttl_seconds
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                path = os.path.join(root, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                except OSError:
+                    pass
+
+image_blobs = ImageBlobStore(
+    os.path.join(app.config['DATA_DIR'], 'images'),
+    ttl_seconds=app.config['IMAGE_BLOB_TTL_SECONDS']
+)
+
+# Bare image id or an /api/images/<id> link (relative or absolute)
+IMAGE_REF_PATTERN = re.compile(r'(?:^|/api/images/)([0-9a-f]{64})(?:[?#].*)?$')
+
+def image_ref_id(ref):
+    """Blob id referenced by an image dict, id or /api/images link, or None"""
+    if isinstance(ref, dict):
+        ref = ref.get('image_id') or ref.get('url') or (ref.get('image_url') or {}).get('url', '')
+    if not isinstance(ref, str) or ref.startswith('data:'):
+        return None
+    match = IMAGE_REF_PATTERN.search(ref)
+    return match.group(1) if match else None
+
+def resolve_image_bytes(ref):
+    """Raw image bytes for a blob reference, data URL, bare base64 string or image dict"""
+    image_id = image_ref_id(ref)
+    if image_id:
+        return image_blobs.get(image_id)
+    if isinstance(ref, dict):
+        ref = ref.get('url') or (ref.get('image_url') or {}).get('url', '')
+    if not ref:
+        return None
+    # Extract base64 data from data URL
+    base64_data = ref.split(",", 1)[1] if ',' in ref else ref
+    return base64.b64decode(base64_data)
+
+def image_data_url(ref):
+    """Data URL for any image reference (upstream models cannot fetch our /api/images links)"""
+    if isinstance(ref, str) and ref.startswith('data:'):
+        return ref
+    handle = image_handles.get(ref)
+    if handle is None:
+        return None
+    return f"data:{handle.mime_type};base64,{base64.b64encode(handle.buffer).decode('utf-8')}"
+
+class ImageHandle:
+    """One image, decoded at most once and shared by the crop, PDF and refinement paths
+
+    Keeps the raw encoded bytes (exposed as a zero-copy memoryview) and lazily the
+    decoded PIL image plus a PDF-ready encoding. Treat both as read-only.
+    """
+
+    # Encodings ReportLab embeds as-is when the pixels are already RGB/grayscale
+    PDF_PASSTHROUGH_FORMATS = ('PNG', 'JPEG')
+
+    def __init__(self, image_id, raw):
+        self.image_id = image_id
+        self.raw = raw
+        self.mime_type = ImageBlobStore.sniff_mime_type(raw[:12])
+        # Data URLs ImageHandleCache resolved to this image
+        self.data_urls = set()
+        self._image = None
+        self._pdf_bytes = None
+        self._lock = threading.Lock()
+
+    @property
+    def buffer(self):
+        return memoryview(self.raw)
+
+    @property
+    def decoded_size(self):
+        if self._image is None:
+            return 0
+        return self._image.width * self._image.height * len(self._image.getbands())
+
+    def image(self):
+        """Decoded PIL image (loaded on first use)"""
+        with self._lock:
+            if self._image is None:
+                image = PILImage.open(io.BytesIO(self.raw))
+                image.load()
+                self._image = image
+            return self._image
+
+    def pdf_stream(self):
+        """File object for ReportLab, re-encoding only when the source needs it
+
+        RGB or grayscale PNG/JPEG is handed over as the original bytes; anything
+        else (alpha, palette, other formats) is converted to RGB PNG once and kept.
+        """
+        image = self.image()
+        with self._lock:
+            if self._pdf_bytes is None:
+                if image.format in self.PDF_PASSTHROUGH_FORMATS and image.mode in ('RGB', 'L'):
+                    self._pdf_bytes = self.raw
+                else:
+                    # Convert to RGB (removes alpha channel for PDF compatibility)
+                    # convert() always returns a new image, so the shared one is never saved
+                    converted = image.convert('RGB')
+                    buffer = io.BytesIO()
+                    converted.save(buffer, format='PNG')
+                    self._pdf_bytes = buffer.getvalue()
+        # BytesIO over bytes shares the buffer until written to
+        return io.BytesIO(self._pdf_bytes)
+
+    @property
+    def nbytes(self):
+        extra = len(self._pdf_bytes) if self._pdf_bytes is not None and self._pdf_bytes is not self.raw else 0
+        return len(self.raw) + self.decoded_size + extra + sum(len(data_url) for data_url in self.data_urls)
+
+class ImageHandleCache:
+    """Bounded LRU of ImageHandles keyed by content hash (SHA-256 of the encoded bytes)
+
+    Data URLs already seen map straight to their handle's id, so repeat lookups of
+    the same string (a refinement passes one around several times) skip the base64
+    decode and hash. Those strings count against max_bytes and leave with the handle.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._handles = OrderedDict()
+        self._data_urls = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    @staticmethod
+    def _data_url(ref):
+        if isinstance(ref, dict):
+            ref = ref.get('url') or (ref.get('image_url') or {}).get('url', '')
+        return ref if isinstance(ref, str) and ref.startswith('data:') else None
+
+    def get(self, ref):
+        """Handle for a blob id/link, data URL or image dict; None if it cannot be resolved"""
+        data_url = self._data_url(ref)
+        image_id = self._data_urls.get(data_url) if data_url else image_ref_id(ref)
+        if image_id:
+            with self._lock:
+                handle = self._handles.get(image_id)
+                if handle is not None:
+                    self._handles.move_to_end(image_id)
+                    self._stats["hits"] += 1
+                    return handle
+            raw = image_blobs.get(image_id) if not data_url else resolve_image_bytes(data_url)
         else:
-            base64_data = data_url
+            raw = resolve_image_bytes(ref)
+            image_id = hashlib.sha256(raw).hexdigest() if raw else None
+        if not raw:
+            return None
 
-        # Decode base64
-        img_bytes = base64.b64decode(base64_data)
+        with self._lock:
+            handle = self._handles.get(image_id)
+            if handle is not None:
+                self._handles.move_to_end(image_id)
+                self._stats["hits"] += 1
+            else:
+                handle = ImageHandle(image_id, raw)
+                self._handles[image_id] = handle
+                self._stats["misses"] += 1
+            if data_url and data_url not in handle.data_urls:
+                handle.data_urls.add(data_url)
+                self._data_urls[data_url] = image_id
+            self._evict()
+        return handle
+
+    def _evict(self):
+        # Decoded sizes grow after insertion, so the budget is re-checked on every lookup
+        total = sum(handle.nbytes for handle in self._handles.values())
+        while total > self.max_bytes and len(self._handles) > 1:
+            _, evicted = self._handles.popitem(last=False)
+            total -= evicted.nbytes
+            for data_url in evicted.data_urls:
+                self._data_urls.pop(data_url, None)
+            self._stats["evictions"] += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "entries": len(self._handles),
+                "bytes": sum(handle.nbytes for handle in self._handles.values())
+            }
+
+image_handles = ImageHandleCache(app.config['IMAGE_HANDLE_CACHE_MAX_BYTES'])
+
+def image_base_url(data):
+    """Prefix for /api/images links, or None to keep inline data URLs
+
+    Links are opt-in ("image_links": true, default IMAGE_LINKS_DEFAULT). Without
+    PUBLIC_API_URL they are relative: behind a proxy the request host is not public.
+    """
+    if not data.get('image_links', app.config['IMAGE_LINKS_DEFAULT']):
+        return None
+    return app.config['PUBLIC_API_URL']
 
-        # Convert to PIL Image
-        pil_img = PILImage.open(io.BytesIO(img_bytes))
+def externalize_images(value, base_url):
+    """Move image data URLs in a result into the blob store, in place
 
-        # Convert to RGB if necessary (removes alpha channel for PDF compatibility)
-        if pil_img.mode in ('RGBA', 'LA', 'P'):
-            pil_img = pil_img.convert('RGB')
+    Every dict whose `url` is an image data URL gets an `image_id` and its `url`
+    becomes the /api/images link. base_url=None leaves inline data URLs alone.
+    """
+    if base_url is None:
+        return value
+    if isinstance(value, list):
+        for item in value:
+            externalize_images(item, base_url)
+    elif isinstance(value, dict):
+        url = value.get('url')
+        if isinstance(url, str) and url.startswith('data:image/'):
+            image_id = image_blobs.put(resolve_image_bytes(url))
+            value['image_id'] = image_id
+            value['url'] = f"{base_url}/api/images/{image_id}"
+        for item in value.values():
+            if isinstance(item, (dict, list)):
+                externalize_images(item, base_url)
+    return value
 
-        # Save to buffer
-        img_buffer = io.BytesIO()
-        pil_img.save(img_buffer, format='PNG')
-        img_buffer.seek(0)
+# ============================================
+# Image Processing Utilities
+# ============================================
 
-        return img_buffer
+def base64_to_image_buffer(data_url):
+    """Image buffer for ReportLab from an image reference (data URL or blob id/link)"""
+    try:
+        handle = image_handles.get(data_url)
+        return handle.pdf_stream() if handle else None
     except Exception as e:
         logger.error(f"Error converting base64 to image: {str(e)}")
         return None
 
+class UploadImageOptimizer:
+    """Reference images downscaled and recompressed per use before going upstream
+
+    Each profile sets a longest side, the formats to try and a byte budget. The
+    largest quality tier that fits the budget wins; if none fits the image is
+    shrunk and retried, and the smallest encoding is used as a last resort. An
+    original already within the profile is sent untouched. Results are cached by
+    (content hash, profile) in a bounded LRU, so each variant is encoded once.
+    """
+
+    QUALITY_TIERS = (85, 75, 60)
+    SHRINK_STEP = 0.75
+    MAX_SHRINKS = 2
+    MIME_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg", "PNG": "image/png"}
+
+    def __init__(self, profiles, cache_max_bytes, enabled=True):
+        self.profiles = profiles
+        self.cache_max_bytes = cache_max_bytes
+        self.enabled = enabled
+        self._variants = OrderedDict()
+        self._cache_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "passthrough": 0, "over_budget": 0, "bytes_in": 0, "bytes_out": 0}
+
+    @staticmethod
+    def _flatten(image):
+        """RGB copy for formats without alpha, composited onto white"""
+        if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+            rgba = image.convert('RGBA')
+            background = PILImage.new('RGB', rgba.size, (255, 255, 255))
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            return background
+        return image.convert('RGB') if image.mode != 'RGB' else image
+
+    def _encode(self, image, fmt, quality):
+        if fmt == 'JPEG':
+            image = self._flatten(image)
+        elif image.mode not in ('RGB', 'RGBA', 'L', 'LA'):
+            image = image.convert('RGBA')
+        buffer = io.BytesIO()
+        options = {"quality": quality, "method": 4} if fmt == 'WEBP' else {"quality": quality, "optimize": True}
+        try:
+            image.save(buffer, format=fmt, **options)
+        except (KeyError, OSError):
+            # Encoder not built into this Pillow
+            return None
+        return buffer.getvalue()
+
+    def _optimize(self, handle, profile):
+        image = handle.image()
+        max_side = profile['max_side']
+        mime = self.MIME_TYPES.get(image.format)
+        if (max(image.size) <= max_side and len(handle.raw) <= profile['max_bytes']
+                and image.format in profile['formats']):
+            with self._lock:
+                self._stats["passthrough"] += 1
+            return handle.raw, mime
+
+        # save() writes encoder state onto the image, and the decoded image is shared
+        # with the crop and refinement threads, so encode a private copy
+        image = image.copy()
+        best = None
+        for _ in range(self.MAX_SHRINKS + 1):
+            if max(image.size) > max_side:
+                image.thumbnail((max_side, max_side), PILImage.LANCZOS)
+            for quality in self.QUALITY_TIERS:
+                for fmt in profile['formats']:
+                    data = self._encode(image, fmt, quality)
+                    if data is None:
+                        continue
+                    if best is None or len(data) < len(best[0]):
+                        best = (data, self.MIME_TYPES[fmt])
+                    if len(data) <= profile['max_bytes']:
+                        return data, self.MIME_TYPES[fmt]
+            max_side = int(max(image.size) * self.SHRINK_STEP)
+
+        with self._lock:
+            self._stats["over_budget"] += 1
+        return best if best else (handle.raw, mime)
+
+    def data_url(self, ref, profile_name):
+        """Optimized data URL for an image reference; the plain data URL when disabled"""
+        if not self.enabled:
+            return image_data_url(ref)
+        handle = image_handles.get(ref)
+        if handle is None:
+            return None
+
+        key = (handle.image_id, profile_name)
+        with self._lock:
+            cached = self._variants.get(key)
+            if cached is not None:
+                self._variants.move_to_end(key)
+                self._stats["hits"] += 1
+                return cached
+
+        try:
+            data, mime = self._optimize(handle, self.profiles[profile_name])
+        except Exception as e:
+            logger.error(f"Image payload optimization failed ({profile_name}): {e}")
+            return image_data_url(ref)
+        url = f"data:{mime};base64,{base64.b64encode(data).decode('utf-8')}"
+
+        with self._lock:
+            self._stats["misses"] += 1
+            self._stats["bytes_in"] += len(handle.raw)
+            self._stats["bytes_out"] += len(data)
+            if key not in self._variants:
+                self._variants[key] = url
+                self._cache_bytes += len(url)
+            while self._cache_bytes > self.cache_max_bytes and len(self._variants) > 1:
+                _, evicted = self._variants.popitem(last=False)
+                self._cache_bytes -= len(evicted)
+        logger.info(f"Optimized {profile_name} image {handle.image_id[:12]}: "
+                   f"{len(handle.raw)} -> {len(data)} bytes ({mime})")
+        return url
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "enabled": self.enabled,
+                "entries": len(self._variants),
+                "cache_bytes": self._cache_bytes
+            }
+
+UPLOAD_IMAGE_PROFILES = MappingProxyType({
+    # Full infographic sent as refinement context
+    "reference": {
+        "max_side": app.config['UPLOAD_REFERENCE_MAX_SIDE'],
+        "formats": ("WEBP", "JPEG"),
+        "max_bytes": app.config['UPLOAD_REFERENCE_MAX_BYTES']
+    },
+    # Region crops showing exact styling
+    "crop": {
+        "max_side": app.config['UPLOAD_CROP_MAX_SIDE'],
+        "formats": ("WEBP", "JPEG"),
+        "max_bytes": app.config['UPLOAD_CROP_MAX_BYTES']
+    },
+    # Reduced crops, used when full-size ones would not all fit the refinement budget
+    "crop_thumb": {
+        "max_side": app.config['UPLOAD_CROP_THUMB_MAX_SIDE'],
+        "formats": ("WEBP", "JPEG"),
+        "max_bytes": app.config['UPLOAD_CROP_THUMB_MAX_BYTES']
+    },
+    # Logo reference; WebP keeps the transparency
+    "logo": {
+        "max_side": app.config['LOGO_PROMPT_MAX_SIZE'],
+        "formats": ("WEBP", "PNG"),
+        "max_bytes": app.config['UPLOAD_LOGO_MAX_BYTES']
+    }
+})
+
+upload_images = UploadImageOptimizer(
+    UPLOAD_IMAGE_PROFILES,
+    app.config['UPLOAD_VARIANT_CACHE_MAX_BYTES'],
+    enabled=app.config['UPLOAD_IMAGE_OPTIMIZE']
+)
+
 def get_generation_id():
     """Generate unique generation ID"""
     return str(uuid.uuid4())
 
 def save_version(generation_id, case_study_data):
-    """Save case study version for undo functionality"""
-    if generation_id not in version_history:
-        version_history[generation_id] = []
-
-    # Keep only last 3 versions as specified in requirements
-    version_history[generation_id].append({
-        'data': case_study_data,
-        'timestamp': datetime.now(timezone.utc).isoformat()
-    })
-
-    if len(version_history[generation_id]) > 3:
-        version_history[generation_id].pop(0)  # Remove oldest
+    """Save case study version for undo functionality (blocking; run off the event loop)"""
+    try:
+        version_store.append(generation_id, case_study_data)
+    except sqlite3.Error as e:
+        logger.warning(f"Failed to save version for {generation_id}: {e}")
 
 def get_previous_version(generation_id):
     """Get previous version for undo functionality"""
-    if generation_id in version_history and len(version_history[generation_id]) >= 2:
-        return version_history[generation_id][-2]['data']
-    return None
+    return version_store.previous(generation_id)
 
 # ============================================
 # Image Processing & Refinement Utilities
@@ -1493,6 +3945,163 @@ INFOGRAPHIC_REGIONS = {
     }
 }
 
+class InfographicLayoutAnalyzer:
+    """Finds the header bar, title, columns and metric tiles of a generated infographic
+
+    CPU-only projection-profile segmentation with NumPy on a downscaled copy:
+    navy rows mark the header and footer bars, blank rows split the content into
+    horizontal blocks and blank columns split a block into columns or tiles.
+    Regions it cannot find keep their INFOGRAPHIC_REGIONS coordinates. Results are
+    cached per image hash; without NumPy the fixed regions are returned.
+    """
+
+    ANALYSIS_SIDE = 400
+    NAVY = (0x1e, 0x3a, 0x5f)
+    NAVY_TOLERANCE = 60      # RGB distance still counted as brand navy
+    INK_THRESHOLD = 40       # RGB distance from the background counted as content
+    BAR_FILL = 0.6           # share of navy pixels for a row to belong to a bar
+    BLANK_FILL = 0.01        # share of content pixels below which a row/column is blank
+    MIN_GAP = 0.015          # blank runs shorter than this (fraction of the side) are line spacing
+    MIN_BLOCK = 0.03         # smallest block height kept (fraction of the height)
+    MIN_COLUMN = 0.12        # smallest column/tile width kept (fraction of the width)
+    PADDING = 0.01
+    MEMORY_ENTRIES = 512
+
+    def __init__(self, defaults, enabled=True):
+        self.defaults = defaults
+        self.enabled = enabled and np is not None
+        self._regions = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "analyzed": 0, "errors": 0, "regions_detected": 0, "regions_defaulted": 0}
+
+    @staticmethod
+    def _runs(mask, min_gap, min_length):
+        """(start, end) runs of True, bridging gaps shorter than min_gap"""
+        edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.astype(np.int8), [0]))))
+        runs = []
+        for start, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+            if runs and start - runs[-1][1] < min_gap:
+                runs[-1] = (runs[-1][0], end)
+            else:
+                runs.append((start, end))
+        return [(start, end) for start, end in runs if end - start >= min_length]
+
+    def _columns(self, ink, top, bottom):
+        width = ink.shape[1]
+        filled = ink[top:bottom].mean(axis=0) >= self.BLANK_FILL
+        return self._runs(filled, max(2, int(width * self.MIN_GAP)), max(1, int(width * self.MIN_COLUMN)))
+
+    def _detect(self, image):
+        small = image.copy()
+        small.thumbnail((self.ANALYSIS_SIDE, self.ANALYSIS_SIDE), PILImage.BILINEAR)
+        rgb = np.asarray(small.convert('RGB'), dtype=np.int16)
+        height, width, _ = rgb.shape
+
+        # Background is the dominant colour (coarsely quantized), normally white
+        codes = ((rgb // 32) * np.array([64, 8, 1])).sum(axis=2).ravel()
+        background = rgb.reshape(-1, 3)[codes == np.bincount(codes, minlength=512).argmax()].mean(axis=0)
+        ink = np.sqrt(((rgb - background) ** 2).sum(axis=2)) > self.INK_THRESHOLD
+        navy = np.sqrt(((rgb - np.array(self.NAVY)) ** 2).sum(axis=2)) < self.NAVY_TOLERANCE
+
+        def coords(left, top, right, bottom):
+            return (
+                round(max(left / width - self.PADDING, 0.0), 4),
+                round(max(top / height - self.PADDING, 0.0), 4),
+                round(min(right / width + self.PADDING, 1.0), 4),
+                round(min(bottom / height + self.PADDING, 1.0), 4)
+            )
+
+        detected = {}
+        bars = self._runs(navy.mean(axis=1) > self.BAR_FILL, 2, max(2, int(height * 0.02)))
+        header = next((bar for bar in bars if bar[0] < height * 0.25), None)
+        footer = next((bar for bar in reversed(bars) if bar[1] > height * 0.75 and bar != header), None)
+        if header:
+            # Logo end of the header bar carries the brand colours and type
+            detected['style_sample'] = coords(0, header[0], width * 0.5, header[1])
+
+        top = header[1] if header else 0
+        bottom = footer[0] if footer else height
+        filled_rows = ink[top:bottom].mean(axis=1) >= self.BLANK_FILL
+        blocks = [
+            (start + top, end + top)
+            for start, end in self._runs(filled_rows, max(2, int(height * self.MIN_GAP)), max(2, int(height * self.MIN_BLOCK)))
+        ]
+        if not blocks:
+            return detected
+
+        # Title: the first full-width block under the header
+        title_top, title_bottom = blocks[0]
+        title_columns = self._columns(ink, title_top, title_bottom)
+        if len(title_columns) == 1 and title_bottom - title_top < height * 0.3:
+            detected['title'] = coords(title_columns[0][0], title_top, title_columns[0][1], title_bottom)
+            blocks = blocks[1:]
+
+        # Challenge/solution: the first block split into two or three columns
+        column_index = None
+        for index, (block_top, block_bottom) in enumerate(blocks):
+            columns = self._columns(ink, block_top, block_bottom)
+            if 2 <= len(columns) <= 3:
+                detected['challenge'] = coords(columns[0][0], block_top, columns[0][1], block_bottom)
+                detected['solution'] = coords(columns[1][0], block_top, columns[1][1], block_bottom)
+                column_index = index
+                break
+
+        # Metrics: a later row of three or more tiles, else the next block down
+        if column_index is not None:
+            later = blocks[column_index + 1:]
+            tiles = next((block for block in later if len(self._columns(ink, *block)) >= 3), None)
+            block = tiles or (later[0] if later else None)
+            if block:
+                columns = self._columns(ink, *block)
+                if columns:
+                    detected['metrics'] = coords(columns[0][0], block[0], columns[-1][1], block[1])
+        return detected
+
+    def regions(self, handle):
+        """INFOGRAPHIC_REGIONS-shaped dict for an ImageHandle, detected coords where found"""
+        if not self.enabled or handle is None:
+            return self.defaults
+
+        with self._lock:
+            cached = self._regions.get(handle.image_id)
+            if cached is not None:
+                self._regions.move_to_end(handle.image_id)
+                self._stats["hits"] += 1
+                return cached
+
+        try:
+            detected = self._detect(handle.image())
+        except Exception as e:
+            logger.error(f"Layout analysis failed for {handle.image_id[:12]}: {e}")
+            detected = None
+
+        regions = {
+            name: {**region, 'coords': (detected or {}).get(name, region['coords'])}
+            for name, region in self.defaults.items()
+        }
+        with self._lock:
+            if detected is None:
+                self._stats["errors"] += 1
+            else:
+                self._stats["analyzed"] += 1
+                self._stats["regions_detected"] += len(detected)
+                self._stats["regions_defaulted"] += len(self.defaults) - len(detected)
+            self._regions[handle.image_id] = regions
+            while len(self._regions) > self.MEMORY_ENTRIES:
+                self._regions.popitem(last=False)
+        logger.info(f"Layout analysis for {handle.image_id[:12]}: detected {sorted(detected or {})}")
+        return regions
+
+    def stats(self):
+        with self._lock:
+            return {**self._stats, "enabled": self.enabled, "entries": len(self._regions)}
+
+infographic_layout = InfographicLayoutAnalyzer(INFOGRAPHIC_REGIONS, enabled=app.config['LAYOUT_ANALYSIS_ENABLED'])
+
+def infographic_regions(ref):
+    """Crop regions for an infographic reference (detected per image, fixed as fallback)"""
+    return infographic_layout.regions(image_handles.get(ref))
+
 VISUAL_CONTINUITY_PROMPT = """
 CRITICAL VISUAL CONTINUITY INSTRUCTIONS:
 
@@ -1520,53 +4129,185 @@ VIOLATION EXAMPLES (DO NOT DO):
 THINK: Preserve everything, change only what was explicitly requested.
 """
 
+REFINEMENT_REQUEST_MAX_TOKENS = 200
+
+REFINEMENT_REQUEST_PROMPT = PromptTemplate("""
+REFINEMENT REQUEST: "{feedback}"
+
+Apply this change while keeping ALL other visual elements identical.
+Preserve exact styling shown in the close-up images.
+Generate a new infographic with only the requested changes.
+
+Generate a new infographic image with the requested changes while preserving the exact visual style and layout shown in the reference images.
+""", min_tokens={"feedback": 20})
+
+def crop_region_png(pil_img, region_coords):
+    """PNG bytes for a normalized (x1, y1, x2, y2) region of a decoded image"""
+    # Convert normalized coordinates to pixel coordinates
+    width, height = pil_img.size
+    x1, y1, x2, y2 = region_coords
+    left = int(x1 * width)
+    top = int(y1 * height)
+    right = int(x2 * width)
+    bottom = int(y2 * height)
+
+    # crop() returns a new image, so the shared decoded image is left untouched
+    cropped_img = pil_img.crop((left, top, right, bottom))
+    buffer = io.BytesIO()
+    cropped_img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
 def crop_infographic_region(infographic_data_url, region_coords):
-    """Crop a specific region from infographic image"""
+    """Crop a specific region from infographic image (data URL, blob id/link or image dict)"""
     try:
         # Validate input
         if not infographic_data_url:
             logger.error("No infographic data URL provided for cropping")
             return None
 
-        if isinstance(infographic_data_url, dict):
-            logger.error(f"Received dict instead of URL string: {infographic_data_url}")
-            infographic_data_url = infographic_data_url.get('url', '')
-            if not infographic_data_url:
-                return None
+        handle = image_handles.get(infographic_data_url)
+        if handle is None:
+            logger.error("Infographic image not found for cropping")
+            return None
 
-        logger.info(f"Cropping image from URL: {infographic_data_url[:50]}...")
+        cropped_base64 = base64.b64encode(crop_region_png(handle.image(), region_coords)).decode()
+        return f"data:image/png;base64,{cropped_base64}"
 
-        # Convert data URL to PIL Image
-        if ',' in infographic_data_url:
-            header, base64_data = infographic_data_url.split(",", 1)
-        else:
-            base64_data = infographic_data_url
+    except Exception as e:
+        logger.error(f"Error cropping infographic region: {str(e)}")
+        return None
 
-        img_bytes = base64.b64decode(base64_data)
-        pil_img = PILImage.open(io.BytesIO(img_bytes))
+class CropPyramid:
+    """Region crops of each infographic, built once and reused by every refinement
 
-        # Convert normalized coordinates to pixel coordinates
-        width, height = pil_img.size
-        x1, y1, x2, y2 = region_coords
-        left = int(x1 * width)
-        top = int(y1 * height)
-        right = int(x2 * width)
-        bottom = int(y2 * height)
+    Right after an infographic is produced, a background thread crops every
+    region found by the layout analyzer, stores the PNGs in the image blob store and
+    writes a small manifest next to the source image, so refinements on any worker
+    pick the crops up instead of decoding and cropping again.
+    """
 
-        # Crop the region
-        cropped_img = pil_img.crop((left, top, right, bottom))
+    MEMORY_ENTRIES = 256
+    # Bumped when the way regions are chosen changes, orphaning older manifests
+    MANIFEST_VERSION = 2
+
+    def __init__(self, blob_store, layout, enabled=True):
+        self.blob_store = blob_store
+        self.layout = layout
+        self.enabled = enabled
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='crop-pyramid')
+        self._manifests = OrderedDict()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._stats = {"built": 0, "hits": 0, "waits": 0, "misses": 0, "errors": 0}
+
+    def _manifest_path(self, image_id):
+        return os.path.join(self.blob_store.directory, image_id[:2], f"{image_id}.crops.v{self.MANIFEST_VERSION}.json")
+
+    def _remember(self, image_id, manifest):
+        with self._lock:
+            self._manifests[image_id] = manifest
+            self._manifests.move_to_end(image_id)
+            while len(self._manifests) > self.MEMORY_ENTRIES:
+                self._manifests.popitem(last=False)
+
+    def _load(self, image_id):
+        """Manifest written by any worker, if all of its crops are still stored"""
+        try:
+            with open(self._manifest_path(image_id), 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if any(self.blob_store.path(crop_id) is None for crop_id in manifest.values()):
+            return None
+        return manifest
 
-        # Convert back to data URL
-        buffer = io.BytesIO()
-        cropped_img.save(buffer, format='PNG')
-        buffer.seek(0)
-        cropped_base64 = base64.b64encode(buffer.getvalue()).decode()
+    def _build(self, handle):
+        image = handle.image()
+        manifest = {
+            name: self.blob_store.put(crop_region_png(image, region['coords']))
+            for name, region in self.layout.regions(handle).items()
+        }
 
-        return f"data:image/png;base64,{cropped_base64}"
+        path = self._manifest_path(handle.image_id)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
 
-    except Exception as e:
-        logger.error(f"Error cropping infographic region: {str(e)}")
-        return None
+        self._remember(handle.image_id, manifest)
+        with self._lock:
+            self._stats["built"] += 1
+        logger.info(f"Crop pyramid built for {handle.image_id[:12]}: {len(manifest)} regions")
+        return manifest
+
+    def _run(self, handle):
+        try:
+            return self._build(handle)
+        except Exception as e:
+            with self._lock:
+                self._stats["errors"] += 1
+            logger.error(f"Crop pyramid build failed for {handle.image_id[:12]}: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._pending.pop(handle.image_id, None)
+
+    def schedule(self, ref):
+        """Queue the crops for an infographic on the background thread (no-op if known)"""
+        if not self.enabled or not ref:
+            return
+        handle = image_handles.get(ref)
+        if handle is None:
+            return
+        with self._lock:
+            if handle.image_id in self._manifests or handle.image_id in self._pending:
+                return
+            self._pending[handle.image_id] = self._executor.submit(self._run, handle)
+
+    def crops(self, ref):
+        """{region: crop image id} for an infographic, building synchronously if needed"""
+        if not self.enabled:
+            return None
+        handle = image_handles.get(ref)
+        if handle is None:
+            return None
+
+        with self._lock:
+            manifest = self._manifests.get(handle.image_id)
+            if manifest is not None:
+                self._manifests.move_to_end(handle.image_id)
+                self._stats["hits"] += 1
+                return manifest
+            future = self._pending.get(handle.image_id)
+
+        if future is not None:
+            # Already being built in the background; wait for it rather than redo it
+            with self._lock:
+                self._stats["waits"] += 1
+            return future.result()
+
+        manifest = self._load(handle.image_id)
+        if manifest is not None:
+            self._remember(handle.image_id, manifest)
+            with self._lock:
+                self._stats["hits"] += 1
+            return manifest
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return self._run(handle)
+
+    def stats(self):
+        with self._lock:
+            return {
+                **self._stats,
+                "enabled": self.enabled,
+                "entries": len(self._manifests),
+                "pending": len(self._pending)
+            }
+
+crop_pyramid = CropPyramid(image_blobs, infographic_layout, enabled=app.config['CROP_PYRAMID_ENABLED'])
 
 def determine_relevant_crops(feedback):
     """Analyze feedback text to determine which infographic sections to crop"""
@@ -1590,158 +4331,873 @@ def determine_relevant_crops(feedback):
     if any(keyword in feedback_lower for keyword in ['solution', 'approach', 'implementation']):
         crops.append('solution')
 
-    # Results feedback
-    if any(keyword in feedback_lower for keyword in ['result', 'outcome', 'achievement']):
-        crops.append('results')
+    # Results feedback (results live in the metrics region)
+    if any(keyword in feedback_lower for keyword in ['result', 'outcome', 'achievement']) and 'metrics' not in crops:
+        crops.append('metrics')
+
+    # Color/style feedback
+    if any(keyword in feedback_lower for keyword in ['color', 'accent', 'style', 'design', 'purple', 'pink', 'blue']):
+        crops.append('style_sample')
+
+    return crops
+
+def estimate_image_seconds(data_url):
+    """Rough upstream cost of one image in a request (REFINEMENT_IMAGE_SECONDS_*)"""
+    return (app.config['REFINEMENT_IMAGE_SECONDS_EACH']
+            + len(data_url) / (1024 * 1024) * app.config['REFINEMENT_IMAGE_SECONDS_PER_MB'])
+
+def select_crops_within_budget(candidates, max_bytes, max_seconds):
+    """Pick crop variants for as many ranked crops as fit the budget
+
+    candidates is a ranked list of (crop_type, full_url, thumb_url). The longest
+    prefix that fits as thumbnails is kept, then crops are upgraded to full size in
+    rank order while the budget allows. Returns [(crop_type, url, is_thumb)].
+    """
+    def fits(urls):
+        return (sum(len(url) for url in urls) <= max_bytes
+                and sum(estimate_image_seconds(url) for url in urls) <= max_seconds)
+
+    # Thumbnails are the cheapest form of every crop; the full crop stands in when larger
+    cheapest = [min((url for url in (full, thumb) if url), key=len) for _, full, thumb in candidates]
+    count = 0
+    while count < len(candidates) and fits(cheapest[:count + 1]):
+        count += 1
+
+    chosen = cheapest[:count]
+    for index in range(count):
+        full = candidates[index][1]
+        if full and full != chosen[index] and fits(chosen[:index] + [full] + chosen[index + 1:]):
+            chosen[index] = full
+    return [(candidates[index][0], chosen[index], chosen[index] != candidates[index][1]) for index in range(count)]
+
+def generate_context_images(infographic_data_url, feedback):
+    """Generate relevant context images based on feedback analysis"""
+
+    # Always include full infographic
+    reference_url = upload_images.data_url(infographic_data_url, "reference")
+    context_images = [{
+        'type': 'text',
+        'text': 'Complete infographic for context:'
+    }, {
+        'type': 'image_url',
+        'image_url': {"url": reference_url}
+    }]
+
+    # Determine which sections to crop
+    needed_crops = determine_relevant_crops(feedback)
+    logger.info(f"Feedback analysis identified crops needed: {needed_crops}")
+
+    # Rank crops: title > metrics > others
+    crop_priority = ['title', 'metrics', 'solution', 'challenge', 'style_sample']
+    ranked_crops = [crop_type for crop_type in crop_priority if crop_type in needed_crops]
+    if not ranked_crops:
+        return context_images
+
+    # Crops precomputed when the infographic was produced (built now if missing)
+    precomputed = crop_pyramid.crops(infographic_data_url) or {}
+
+    candidates = []
+    for crop_type in ranked_crops:
+        crop_ref = precomputed.get(crop_type) or crop_infographic_region(
+            infographic_data_url,
+            infographic_regions(infographic_data_url)[crop_type]['coords']
+        )
+        if not crop_ref:
+            continue
+        full_url = upload_images.data_url(crop_ref, "crop")
+        thumb_url = upload_images.data_url(crop_ref, "crop_thumb")
+        if full_url or thumb_url:
+            candidates.append((crop_type, full_url, thumb_url))
+
+    # SMART CROP STRATEGY: as many crops as fit next to the full infographic without risking the timeout
+    reference_size = len(reference_url or '')
+    selected = select_crops_within_budget(
+        candidates,
+        app.config['REFINEMENT_IMAGE_MAX_BYTES'] - reference_size,
+        app.config['REFINEMENT_IMAGE_MAX_SECONDS'] - (estimate_image_seconds(reference_url) if reference_url else 0)
+    )
+
+    # Generate specific crops with descriptions
+    for crop_type, cropped_image, is_thumb in selected:
+        region_info = INFOGRAPHIC_REGIONS[crop_type]
+        context_images.append({
+            'type': 'text',
+            'text': f"{region_info['description']} (note exact styling):"
+        })
+        context_images.append({
+            'type': 'image_url',
+            'image_url': {"url": cropped_image}
+        })
+        logger.info(f"Generated {'thumbnail ' if is_thumb else ''}crop for {crop_type}: {region_info['description']}")
+
+    logger.info(f"Smart crop selection: {len(selected)} of {len(ranked_crops)} crops fit the budget "
+               f"({sum(len(url) for _, url, _ in selected) + reference_size} bytes with the full infographic)")
+    return context_images
+
+async def refine_case_study_with_images(infographic_data_url, feedback, client_data):
+    """Refine case study using multi-image context with visual continuity"""
+
+    try:
+        # Generate context images based on feedback analysis
+        # Image work stays off the event loop
+        context_images = await asyncio.to_thread(generate_context_images, infographic_data_url, feedback)
+
+        # Refinement request text, budgeted to stay under the function call limit
+        refinement_request = REFINEMENT_REQUEST_PROMPT.render(
+            max_tokens=REFINEMENT_REQUEST_MAX_TOKENS, feedback=feedback
+        )
+
+        # Build multi-image prompt for Gemini image generation: the static continuity
+        # instructions lead as a cacheable prefix, then the images and the request
+        messages = with_cache_breakpoint([{
+            "role": "user",
+            "content": [{'type': 'text', 'text': VISUAL_CONTINUITY_PROMPT}] + context_images + [{
+                'type': 'text',
+                'text': refinement_request
+            }]
+        }], 1)
+
+        # Use Gemini 3 Pro for refinement too (image generation capability)
+        model = app.config['MODEL_CASE_STUDY_IMAGE']  # Gemini generates images
+
+        # API call parameters for refinement
+        request_params = {
+            "model": model,
+            "temperature": 0.1,  # Very conservative for visual continuity
+            "max_tokens": 1000,  # Minimal text, focus on image
+            "modalities": ["image", "text"],
+            "messages": messages
+        }
+
+        # Call OpenRouter API through the shared connection pool
+        response = await ai_service._post_chat(
+            request_params,
+            timeout=60.0,
+            cache_scope='refinement',
+            task='case_study_image',
+            headers={
+                "HTTP-Referer": "https://calance-edge.com",
+                "X-Title": "Calance Edge - Case Study Refinement"
+            }
+        )
+        response.raise_for_status()
+
+        ai_response = await read_response_json(response)
+
+        # Extract refined images
+        if 'choices' in ai_response and len(ai_response['choices']) > 0:
+            choice = ai_response['choices'][0]
+            if 'message' in choice and 'images' in choice['message']:
+                refined_images = choice['message']['images']
+                logger.info(f"Refinement successful: {len(refined_images)} images generated")
+                return refined_images
+            else:
+                logger.warning("No images in refinement response")
+                return []
+        else:
+            logger.error("Invalid refinement response format")
+            return []
+
+    except Exception as e:
+        logger.error(f"Error in refinement: {str(e)}")
+        raise
+
+# ============================================
+# Case Study Pipeline
+# ============================================
+
+def build_two_step_result(structured_data, images):
+    """Build the case study payload from Claude's structured data and Gemini's infographic"""
+    # Return bullet points + infographic image
+    return {
+        "client_name": structured_data.get('clientName', ''),
+        "industry": structured_data.get('industry', ''),
+        "title": structured_data.get('title', ''),
+        "subtitle": structured_data.get('subtitle', ''),
+        # Bullet points for display
+        "challengeBullets": structured_data.get('challengeBullets', []),
+        "solutionBullets": structured_data.get('solutionBullets', []),
+        "resultsBullets": structured_data.get('resultsBullets', []),
+        "metrics": structured_data.get('metrics', []),
+        "technologies": structured_data.get('technologies', []),
+        "testimonial": structured_data.get('testimonialShort', ''),
+        "roi": structured_data.get('roiStatement', ''),
+        # The infographic image - this is the main artifact
+        "images": images,
+        "infographic": images[0] if images else None
+    }
+
+# Fields _generate_complete_case_study needs; Step 2 can start once these have streamed in.
+# ANALYSIS_PROMPT asks for them first, ahead of subtitle/technologies/testimonial/ROI
+INFOGRAPHIC_REQUIRED_FIELDS = ('clientName', 'industry', 'title', 'metrics',
+                               'challengeBullets', 'solutionBullets', 'resultsBullets')
+
+async def run_two_step_case_study(data, on_progress=None, image_base_url=None):
+    """Run the two-step Claude -> Gemini pipeline for freeform notes
+
+    With streaming analysis, Step 2 starts as soon as the fields the infographic prompt
+    needs have arrived, while Claude is still writing the remaining fields.
+    on_progress, if given, is awaited as on_progress(stage, partial_result) after each step.
+    With image_base_url the infographic is moved to the blob store and linked by id.
+    """
+    infographic_task = None
+
+    async def on_field(key, value, fields):
+        nonlocal infographic_task
+        if infographic_task is None and all(field in fields for field in INFOGRAPHIC_REQUIRED_FIELDS):
+            logger.info(f"STEP 2: Starting Gemini early - required fields streamed in after '{key}'")
+            infographic_task = asyncio.create_task(ai_service._generate_complete_case_study(fields))
+
+    # STEP 1: Claude Sonnet 4.5 analyzes and structures content
+    logger.info("STEP 1: Starting Claude analysis...")
+    try:
+        structured_data = await ai_service._analyze_freeform_content(
+            raw_notes=data.get('rawNotes', ''),
+            client_name=data.get('clientName', ''),
+            industry=data.get('industry', ''),
+            on_field=on_field
+        )
+    except Exception:
+        if infographic_task:
+            infographic_task.cancel()
+        raise
+    logger.info(f"STEP 1 Complete: Extracted client={structured_data.get('clientName')}, "
+               f"metrics={len(structured_data.get('metrics', []))}")
+
+    if on_progress:
+        await on_progress('analysis', build_two_step_result(structured_data, []))
+
+    # STEP 2: Generate complete multi-page case study with Gemini
+    if infographic_task is None:
+        logger.info("STEP 2: Calling Gemini to generate complete case study document...")
+        images = await ai_service._generate_complete_case_study(structured_data)
+    else:
+        images = await infographic_task
+
+    await asyncio.to_thread(externalize_images, images, image_base_url)
+    if images:
+        # Region crops for later refinements are prepared in the background
+        await asyncio.to_thread(crop_pyramid.schedule, images[0])
+    result = build_two_step_result(structured_data, images)
+
+    logger.info(f"STEP 2 Complete: Generated infographic image (success={len(images) > 0})")
+
+    if on_progress:
+        await on_progress('infographic', result)
+
+    return result
+
+def make_case_study_job(data, image_base_url=None):
+    """Create the job function for a queued freeform case study generation"""
+    async def job(report):
+        # Job workers are long-lived tasks, so reset the policy once this job is done
+        token = set_cache_policy(data.get('cache'))
+        calls = []
+        log_token = upstream_calls.set(calls)
+        try:
+            result = await run_two_step_case_study(data, on_progress=report, image_base_url=image_base_url)
+        finally:
+            llm_cache_policy.reset(token)
+            upstream_calls.reset(log_token)
+
+        # Generate or use existing generation_id for tracking
+        generation_id = data.get('generation_id', get_generation_id())
+        await asyncio.to_thread(save_version, generation_id, result)
+        result['generation_id'] = generation_id
+        result['meta'] = upstream_meta(calls)
+        return result
+    return job
 
-    # Color/style feedback
-    if any(keyword in feedback_lower for keyword in ['color', 'accent', 'style', 'design', 'purple', 'pink', 'blue']):
-        crops.append('style_sample')
+# ============================================
+# Background Jobs
+# ============================================
 
-    return crops
+class JobStore:
+    """SQLite-backed job state shared by every worker process on the host
 
-def generate_context_images(infographic_data_url, feedback):
-    """Generate relevant context images based on feedback analysis"""
+    A job only runs in the worker that accepted it, which keeps its heartbeat
+    fresh. If that worker goes away (recycled, timed out, killed) the heartbeat
+    goes stale and the job is reported as failed once lease_seconds pass.
+    """
 
-    # Always include full infographic
-    context_images = [{
-        'type': 'text',
-        'text': 'Complete infographic for context:'
-    }, {
-        'type': 'image_url',
-        'image_url': {"url": infographic_data_url}
-    }]
+    LOST_JOB_ERROR = "Job was lost: the worker running it stopped before finishing"
+
+    def __init__(self, path, ttl_seconds, lease_seconds):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.lease_seconds = lease_seconds
+        self._initialized = False
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if not self._initialized:
+            with self._lock:
+                if not self._initialized:
+                    os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                    with sqlite3.connect(self.path, timeout=30) as conn:
+                        conn.execute("PRAGMA journal_mode=WAL")
+                        conn.execute("""
+                            CREATE TABLE IF NOT EXISTS jobs (
+                                id TEXT PRIMARY KEY,
+                                kind TEXT NOT NULL,
+                                status TEXT NOT NULL,
+                                stage TEXT,
+                                partial TEXT,
+                                result TEXT,
+                                error TEXT,
+                                created_at REAL NOT NULL,
+                                updated_at REAL NOT NULL,
+                                heartbeat_at REAL
+                            )
+                        """)
+                        columns = {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}
+                        if 'heartbeat_at' not in columns:
+                            try:
+                                conn.execute("ALTER TABLE jobs ADD COLUMN heartbeat_at REAL")
+                            except sqlite3.OperationalError:
+                                # Another worker added it first
+                                pass
+                    self._initialized = True
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, kind):
+        now = time.time()
+        job_id = str(uuid.uuid4())
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, stage, created_at, updated_at, heartbeat_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, 'queued', 'queued', now, now, now)
+            )
+        return self.get(job_id)
+
+    def update(self, job_id, **fields):
+        for key in ('partial', 'result'):
+            if key in fields and fields[key] is not None:
+                fields[key] = json.dumps(fields[key])
+        fields['updated_at'] = time.time()
+        columns = ", ".join(f"{key} = ?" for key in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+    def heartbeat(self, job_ids):
+        """Mark jobs as still owned by a live worker"""
+        if not job_ids:
+            return
+        with self._connect() as conn:
+            conn.executemany(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ?",
+                [(time.time(), job_id) for job_id in job_ids]
+            )
 
-    # Determine which sections to crop
-    needed_crops = determine_relevant_crops(feedback)
-    logger.info(f"Feedback analysis identified crops needed: {needed_crops}")
+    def get(self, job_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if (row is not None and row['status'] in ('queued', 'running')
+                    and (row['heartbeat_at'] or row['updated_at']) < time.time() - self.lease_seconds):
+                logger.warning(f"Job {job_id} lost its worker; marking it failed")
+                conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE id = ? AND status = ?",
+                    (self.LOST_JOB_ERROR, time.time(), job_id, row['status'])
+                )
+                row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job.pop('heartbeat_at', None)
+        for key in ('partial', 'result'):
+            job[key] = json.loads(job[key]) if job[key] else None
+        for key in ('created_at', 'updated_at'):
+            job[key] = datetime.fromtimestamp(job[key], timezone.utc).isoformat()
+        return job
+
+    def purge_expired(self):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM jobs WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+
+class JobRunner:
+    """Bounded pool of async workers that run queued jobs on the worker event loop"""
+
+    def __init__(self, store, concurrency, heartbeat_seconds):
+        self.store = store
+        self.concurrency = concurrency
+        self.heartbeat_seconds = heartbeat_seconds
+        self._queue = None
+        self._loop = None
+        self._workers = []
+        # Queued and running jobs owned by this worker process
+        self._owned = set()
+
+    def _ensure_workers(self):
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._queue = asyncio.Queue()
+            self._loop = loop
+            self._workers = [loop.create_task(self._worker(i)) for i in range(self.concurrency)]
+            self._workers.append(loop.create_task(self._heartbeat()))
+            logger.info(f"Started {self.concurrency} background job workers")
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(self.heartbeat_seconds)
+            try:
+                await asyncio.to_thread(self.store.heartbeat, list(self._owned))
+            except sqlite3.Error as e:
+                logger.warning(f"Job heartbeat failed: {e}")
+
+    async def submit(self, kind, job_fn):
+        """Queue job_fn(report) and return the new job record immediately"""
+        await asyncio.to_thread(self.store.purge_expired)
+        job = await asyncio.to_thread(self.store.create, kind)
+        self._ensure_workers()
+        self._owned.add(job['id'])
+        await self._queue.put((job['id'], job_fn))
+        logger.info(f"Queued {kind} job {job['id']}")
+        return job
+
+    async def _worker(self, index):
+        while True:
+            job_id, job_fn = await self._queue.get()
+            try:
+                await asyncio.to_thread(self.store.update, job_id, status='running', stage='started')
 
-    # SMART CROP STRATEGY: Limit crops to prevent timeout
-    max_crops = 1  # Only send 1 crop to stay within limits
-    selected_crops = []
+                async def report(stage, partial=None):
+                    await asyncio.to_thread(self.store.update, job_id, stage=stage, partial=partial)
 
-    # Prioritize crops: title > metrics > others
-    crop_priority = ['title', 'metrics', 'solution', 'challenge', 'style_sample']
+                result = await job_fn(report)
+                await asyncio.to_thread(self.store.update, job_id, status='completed', stage='complete', result=result)
+                logger.info(f"Job {job_id} completed on job worker {index}")
+            except Exception as e:
+                logger.error(f"Job {job_id} failed: {e}")
+                await asyncio.to_thread(self.store.update, job_id, status='failed', error=str(e))
+            finally:
+                self._owned.discard(job_id)
+                self._queue.task_done()
+
+job_runner = JobRunner(
+    JobStore(
+        os.path.join(app.config['DATA_DIR'], 'jobs.sqlite3'),
+        app.config['JOB_TTL_SECONDS'],
+        app.config['JOB_LEASE_SECONDS']
+    ),
+    app.config['JOB_WORKERS'],
+    app.config['JOB_HEARTBEAT_SECONDS']
+)
 
-    for crop_type in crop_priority:
-        if crop_type in needed_crops and len(selected_crops) < max_crops:
-            selected_crops.append(crop_type)
-            break
+# ============================================
+# Brand Rendering
+# ============================================
 
-    # Generate specific crops with descriptions
-    for crop_type in selected_crops:
-        if crop_type in INFOGRAPHIC_REGIONS:
-            region_info = INFOGRAPHIC_REGIONS[crop_type]
-            cropped_image = crop_infographic_region(
-                infographic_data_url,
-                region_info['coords']
-            )
+# ReportLab colors for the brand palette, plus the body text gray used by the draft preview
+BRAND_PDF_COLORS = MappingProxyType({
+    **{name: colors.HexColor(value) for name, value in CALANCE_BRAND['colors'].items()},
+    "body_text": colors.HexColor('#374151')
+})
+
+def _build_pdf_styles():
+    """Paragraph styles matching the draft preview, derived from CALANCE_BRAND"""
+    sample = getSampleStyleSheet()
+    navy = BRAND_PDF_COLORS['primary_navy']
+    gray = BRAND_PDF_COLORS['neutral_gray']
+
+    body = ParagraphStyle(
+        'BodyStyle',
+        parent=sample['Normal'],
+        fontSize=10,
+        textColor=BRAND_PDF_COLORS['body_text'],
+        leading=14,
+        spaceAfter=12
+    )
+    return MappingProxyType({
+        "title": ParagraphStyle(
+            'TitleStyle',
+            parent=sample['Heading1'],
+            fontSize=22,
+            textColor=navy,
+            spaceAfter=8,
+            fontName='Helvetica-Bold',
+            leading=26
+        ),
+        "subtitle": ParagraphStyle(
+            'SubtitleStyle',
+            parent=sample['Normal'],
+            fontSize=12,
+            textColor=gray,
+            spaceAfter=20,
+            leading=16
+        ),
+        "heading": ParagraphStyle(
+            'HeadingStyle',
+            parent=sample['Heading2'],
+            fontSize=14,
+            textColor=navy,
+            spaceAfter=10,
+            spaceBefore=16,
+            fontName='Helvetica-Bold'
+        ),
+        "body": body,
+        "testimonial": ParagraphStyle(
+            'TestimonialStyle',
+            parent=body,
+            leftIndent=20,
+            rightIndent=20,
+            fontName='Helvetica-Oblique',
+            textColor=navy
+        )
+    })
 
-            if cropped_image:
-                context_images.append({
-                    'type': 'text',
-                    'text': f"{region_info['description']} (note exact styling):"
-                })
-                context_images.append({
-                    'type': 'image_url',
-                    'image_url': {"url": cropped_image}
-                })
-                logger.info(f"Generated crop for {crop_type}: {region_info['description']}")
+# Shared, read-only: Paragraph never mutates its style, so one set serves every export
+PDF_STYLES = _build_pdf_styles()
+
+BRAND_HEADER_TABLE_STYLE = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), BRAND_PDF_COLORS['primary_navy']),
+    ('TEXTCOLOR', (0, 0), (-1, 0), BRAND_PDF_COLORS['white']),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+    ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+    ('VALIGN', (0, 0), (-1, 0), 'MIDDLE'),
+    ('LEFTPADDING', (0, 0), (-1, 0), 12),
+    ('RIGHTPADDING', (0, 0), (-1, 0), 12),
+    ('TOPPADDING', (0, 0), (-1, 0), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
+])
+
+# Flowables carry layout state from the document they are drawn in, so headers are
+# built per export from the shared styles rather than shared themselves
+def brand_header(left='CALANCE', right='CASE STUDY', col_widths=(3*inch, 3.5*inch)):
+    """Navy header bar flowable"""
+    table = Table([[left, right]], colWidths=list(col_widths))
+    table.setStyle(BRAND_HEADER_TABLE_STYLE)
+    return table
 
-    logger.info(f"Smart crop selection: generated {len(selected_crops)} crops to prevent timeout")
-    return context_images
+# ============================================
+# Export Rendering
+# ============================================
 
-async def refine_case_study_with_images(infographic_data_url, feedback, client_data):
-    """Refine case study using multi-image context with visual continuity"""
+class RenderCache:
+    """Rendered exports keyed by a canonical hash of their input plus export mode
 
-    try:
-        # Generate context images based on feedback analysis
-        context_images = generate_context_images(infographic_data_url, feedback)
+    A memory LRU bounded by bytes holds recent renders; entries it evicts spill to
+    files under the disk directory (shared by all workers, itself bounded by bytes,
+    oldest first) and are promoted back to memory on the next hit. The key is a
+    content hash, so it doubles as a strong ETag.
+    """
 
-        # Build refinement request text
-        refinement_request = f"""
-REFINEMENT REQUEST: "{feedback}"
+    KEY_PATTERN = re.compile(r'^[0-9a-f]{64}$')
+
+    def __init__(self, memory_max_bytes, disk_dir=None, disk_max_bytes=0):
+        self.memory_max_bytes = memory_max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {"hits_memory": 0, "hits_disk": 0, "misses": 0, "writes": 0, "spills": 0, "evictions": 0}
+
+    @staticmethod
+    def make_key(mode, payload):
+        canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        return hashlib.sha256(f"{mode}:{canonical}".encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, key)
+
+    def _spill(self, evicted):
+        """Write entries evicted from memory to disk, then trim the disk tier"""
+        os.makedirs(self.disk_dir, exist_ok=True)
+        for key, body in evicted:
+            if len(body) > self.disk_max_bytes:
+                continue
+            fd, tmp_path = tempfile.mkstemp(dir=self.disk_dir, prefix='.spill-')
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+            os.replace(tmp_path, self._disk_path(key))
+            with self._lock:
+                self._stats["spills"] += 1
+
+        entries = [entry for entry in os.scandir(self.disk_dir) if entry.is_file() and not entry.name.startswith('.')]
+        total = sum(entry.stat().st_size for entry in entries)
+        for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+            if total <= self.disk_max_bytes:
+                break
+            try:
+                total -= entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            with self._lock:
+                self._stats["evictions"] += 1
+
+    def _memory_put(self, key, body):
+        """Insert into the memory LRU; returns the (key, body) pairs it evicted"""
+        evicted = []
+        if len(body) > self.memory_max_bytes:
+            return [(key, body)]
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key))
+        self._memory[key] = body
+        self._memory_bytes += len(body)
+        while self._memory_bytes > self.memory_max_bytes:
+            evicted.append(self._memory.popitem(last=False))
+            self._memory_bytes -= len(evicted[-1][1])
+        return evicted
+
+    def get(self, key):
+        with self._lock:
+            body = self._memory.get(key)
+            if body is not None:
+                self._memory.move_to_end(key)
+                self._stats["hits_memory"] += 1
+                return body
+
+        if self.disk_dir:
+            try:
+                with open(self._disk_path(key), 'rb') as f:
+                    body = f.read()
+                os.utime(self._disk_path(key))
+            except FileNotFoundError:
+                body = None
+            if body is not None:
+                with self._lock:
+                    self._stats["hits_disk"] += 1
+                    evicted = self._memory_put(key, body)
+                if evicted:
+                    self._spill(evicted)
+                return body
+
+        with self._lock:
+            self._stats["misses"] += 1
+        return None
 
-Apply this change while keeping ALL other visual elements identical.
-Preserve exact styling shown in the close-up images.
-Generate a new infographic with only the requested changes.
-"""
+    def set(self, key, body):
+        with self._lock:
+            evicted = self._memory_put(key, body)
+            self._stats["writes"] += 1
+        if evicted and self.disk_dir:
+            self._spill(evicted)
+
+    def stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+        lookups = stats["hits_memory"] + stats["hits_disk"] + stats["misses"]
+        stats["hit_rate"] = round((stats["hits_memory"] + stats["hits_disk"]) / lookups, 3) if lookups else 0.0
+        stats["disk_enabled"] = bool(self.disk_dir)
+        return stats
+
+render_cache = RenderCache(
+    memory_max_bytes=app.config['RENDER_CACHE_MEMORY_MAX_BYTES'],
+    disk_dir=os.path.join(app.config['DATA_DIR'], 'renders') if app.config['RENDER_CACHE_DISK_ENABLED'] else None,
+    disk_max_bytes=app.config['RENDER_CACHE_DISK_MAX_BYTES']
+)
 
-        # Apply prompt condensation to prevent function call errors
-        ai_service_instance = AIService()
+def build_case_study_pdf(case_study_data, output):
+    """Render a case study PDF into output (a path or writable file object)
 
-        # Condense system prompt
-        condensed_system_prompt = ai_service_instance._condense_infographic_prompt(
-            VISUAL_CONTINUITY_PROMPT, max_length=2000
-        )
+    Two modes:
+    1. INFOGRAPHIC MODE: If hero image is an infographic (from unified approach), show ONLY the infographic
+       - Clean, single-page output that's easy to scan
+       - No walls of text, just the visual document
+    2. LEGACY MODE: If no infographic or multiple separate images, fall back to text-based layout
+    """
+    images = case_study_data.get('images', [])
 
-        # Condense user request
-        condensed_request = ai_service_instance._condense_infographic_prompt(
-            refinement_request, max_length=800
-        )
+    # Check if we have an infographic image (from unified approach)
+    # Infographic mode: single hero image that IS the complete document
+    hero_img = next((img for img in images if img.get('placement') == 'hero'), None)
+    has_infographic = hero_img and hero_img.get('url') and len(images) == 1
 
-        logger.info(f"Refinement prompts condensed for safety")
+    # Also check for infographic ID pattern (from new unified approach)
+    if hero_img and hero_img.get('id', '').startswith('infographic_'):
+        has_infographic = True
 
-        # Build multi-image prompt for Gemini image generation
-        messages = [{
-            "role": "user",
-            "content": context_images + [{
-                'type': 'text',
-                'text': f"""
-{condensed_system_prompt}
+    if has_infographic:
+        # INFOGRAPHIC MODE: Output just the infographic image with minimal margins
+        logger.info("PDF Export: Using INFOGRAPHIC mode (single visual document)")
 
-{condensed_request}
+        doc = SimpleDocTemplate(
+            output,
+            pagesize=letter,
+            rightMargin=0.25*inch,
+            leftMargin=0.25*inch,
+            topMargin=0.25*inch,
+            bottomMargin=0.25*inch
+        )
 
-Generate a new infographic image with the requested changes while preserving the exact visual style and layout shown in the reference images.
-"""
-            }]
-        }]
+        story = []
 
-        # Use Gemini 3 Pro for refinement too (image generation capability)
-        model = app.config['MODEL_CASE_STUDY_IMAGE']  # Gemini generates images
+        # Add the infographic image at full page size
+        img_buffer = base64_to_image_buffer(hero_img['url'])
+        if img_buffer:
+            try:
+                # Calculate dimensions to fit 8.5x11 with minimal margins (8x10.5 usable)
+                rl_img = RLImage(img_buffer, width=8*inch, height=10.5*inch)
+                story.append(rl_img)
+                logger.info("Added full-page infographic to PDF")
+            except Exception as e:
+                logger.error(f"Error adding infographic to PDF: {str(e)}")
+                # Fall back to legacy mode
+                has_infographic = False
+
+        if has_infographic and story:
+            doc.build(story)
+            return
+
+    # LEGACY MODE: Full text-based layout with embedded images
+    logger.info("PDF Export: Using LEGACY mode (text + images)")
+
+    doc = SimpleDocTemplate(
+        output,
+        pagesize=letter,
+        rightMargin=0.75*inch,
+        leftMargin=0.75*inch,
+        topMargin=0.75*inch,
+        bottomMargin=0.75*inch
+    )
+
+    # Shared brand styles, built once per process
+    title_style = PDF_STYLES['title']
+    subtitle_style = PDF_STYLES['subtitle']
+    heading_style = PDF_STYLES['heading']
+    body_style = PDF_STYLES['body']
+
+    story = []
+
+    # Page Header - Calance Branding
+    story.append(brand_header())
+    story.append(Spacer(1, 0.3*inch))
+
+    # Hero Image (full width) - only if not infographic mode
+    if hero_img and hero_img.get('url'):
+        img_buffer = base64_to_image_buffer(hero_img['url'])
+        if img_buffer:
+            try:
+                rl_img = RLImage(img_buffer, width=6.5*inch, height=3.66*inch)
+                story.append(rl_img)
+                story.append(Spacer(1, 0.25*inch))
+                logger.info("Added hero image to PDF")
+            except Exception as e:
+                logger.error(f"Error adding hero image to PDF: {str(e)}")
+
+    # Title and Subtitle
+    if case_study_data.get('title'):
+        story.append(Paragraph(case_study_data['title'], title_style))
+
+    if case_study_data.get('subtitle'):
+        story.append(Paragraph(case_study_data['subtitle'], subtitle_style))
+
+    # Executive Summary (if available)
+    if case_study_data.get('executiveSummary'):
+        story.append(Paragraph("Executive Summary", heading_style))
+        story.append(Paragraph(case_study_data['executiveSummary'], body_style))
+
+    # Challenge Section
+    if case_study_data.get('challenge'):
+        story.append(Paragraph("The Challenge", heading_style))
+        story.append(Paragraph(case_study_data['challenge'], body_style))
+
+    # Solution Section
+    if case_study_data.get('solution'):
+        story.append(Paragraph("Our Solution", heading_style))
+        story.append(Paragraph(case_study_data['solution'], body_style))
+
+    # Implementation (if available)
+    if case_study_data.get('implementation'):
+        story.append(Paragraph("Implementation", heading_style))
+
+        # Timeline Image (if available)
+        timeline_img = next((img for img in images if img.get('placement') == 'timeline'), None)
+        if timeline_img and timeline_img.get('url'):
+            img_buffer = base64_to_image_buffer(timeline_img['url'])
+            if img_buffer:
+                try:
+                    rl_img = RLImage(img_buffer, width=6.5*inch, height=2.44*inch)
+                    story.append(rl_img)
+                    story.append(Spacer(1, 0.15*inch))
+                    logger.info("Added timeline image to PDF")
+                except Exception as e:
+                    logger.error(f"Error adding timeline image to PDF: {str(e)}")
 
-        # API call parameters for refinement
-        request_params = {
-            "model": model,
-            "temperature": 0.1,  # Very conservative for visual continuity
-            "max_tokens": 1000,  # Minimal text, focus on image
-            "modalities": ["image", "text"],
-            "messages": messages
-        }
+        story.append(Paragraph(case_study_data['implementation'], body_style))
 
-        # Call OpenRouter API with extended timeout for refinement
-        async with httpx.AsyncClient(timeout=60.0) as client:
-            response = await client.post(
-                f"{app.config['OPENROUTER_BASE_URL']}/chat/completions",
-                headers={
-                    "Authorization": f"Bearer {app.config['OPENROUTER_API_KEY']}",
-                    "Content-Type": "application/json",
-                    "HTTP-Referer": "https://calance-edge.com",
-                    "X-Title": "Calance Edge - Case Study Refinement"
-                },
-                json=request_params
-            )
-            response.raise_for_status()
+    # Results & Impact
+    if case_study_data.get('results'):
+        story.append(Paragraph("Results & Impact", heading_style))
+        story.append(Paragraph(case_study_data['results'], body_style))
 
-            ai_response = response.json()
+    # Metrics Dashboard Image (visual representation)
+    metrics_img = next((img for img in images if img.get('placement') == 'metrics'), None)
+    if metrics_img and metrics_img.get('url'):
+        story.append(Paragraph("Key Metrics", heading_style))
+        img_buffer = base64_to_image_buffer(metrics_img['url'])
+        if img_buffer:
+            try:
+                rl_img = RLImage(img_buffer, width=6.5*inch, height=3.66*inch)
+                story.append(rl_img)
+                story.append(Spacer(1, 0.15*inch))
+                logger.info("Added metrics dashboard image to PDF")
+            except Exception as e:
+                logger.error(f"Error adding metrics image to PDF: {str(e)}")
+
+    # ROI Statement
+    if case_study_data.get('roi'):
+        story.append(Paragraph("ROI", heading_style))
+        story.append(Paragraph(case_study_data['roi'], body_style))
+
+    # Testimonial (if available)
+    if case_study_data.get('testimonial'):
+        story.append(Paragraph("Client Testimonial", heading_style))
+        story.append(Paragraph(f'"{case_study_data["testimonial"]}"', PDF_STYLES['testimonial']))
+
+    # Future Outlook (if available)
+    if case_study_data.get('futureOutlook'):
+        story.append(Paragraph("What's Next", heading_style))
+        story.append(Paragraph(case_study_data['futureOutlook'], body_style))
+
+    # Build PDF
+    doc.build(story)
+
+def pdf_filename(case_study_data):
+    client_name = case_study_data.get('client_name', case_study_data.get('clientName', 'export'))
+    return f"case-study-{client_name.lower().replace(' ', '-')}.pdf"
+
+def render_case_study_pdf(case_study_data, key):
+    """PDF bytes for a case study, from the render cache or freshly built"""
+    pdf_bytes = render_cache.get(key)
+    if pdf_bytes is None:
+        # Create PDF in memory (Letter size, 8.5x11)
+        buffer = io.BytesIO()
+        build_case_study_pdf(case_study_data, buffer)
+        pdf_bytes = buffer.getvalue()
+        buffer.close()
+        render_cache.set(key, pdf_bytes)
+    return pdf_bytes
 
-            # Extract refined images
-            if 'choices' in ai_response and len(ai_response['choices']) > 0:
-                choice = ai_response['choices'][0]
-                if 'message' in choice and 'images' in choice['message']:
-                    refined_images = choice['message']['images']
-                    logger.info(f"Refinement successful: {len(refined_images)} images generated")
-                    return refined_images
-                else:
-                    logger.warning("No images in refinement response")
-                    return []
-            else:
-                logger.error("Invalid refinement response format")
-                return []
+def iter_file_chunks(file, chunk_size=64 * 1024, on_complete=None):
+    """Yield a file's contents in chunks and close it afterwards
 
-    except Exception as e:
-        logger.error(f"Error in refinement: {str(e)}")
-        raise
+    on_complete(body) receives the whole contents, assembled from the chunks
+    already read for streaming, before the last chunk is yielded.
+    """
+    chunks = []
+    try:
+        file.seek(0)
+        chunk = file.read(chunk_size)
+        while chunk:
+            following = file.read(chunk_size)
+            if on_complete is not None:
+                chunks.append(chunk)
+                if not following:
+                    on_complete(b''.join(chunks))
+                    chunks = []
+            yield chunk
+            chunk = following
+    finally:
+        file.close()
 
 # ============================================
 # API Routes
@@ -1753,14 +5209,31 @@ def health_check():
     return jsonify({
         "status": "healthy",
         "timestamp": datetime.now(timezone.utc).isoformat(),
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "http_pool": ai_service.pool_stats(),
+        "llm_cache": response_cache.stats(),
+        "governor": model_governor.stats(),
+        "router": model_router.stats(),
+        "hedging": hedge_controller.stats(),
+        "circuit_breakers": circuit_breaker.stats(),
+        "static_assets": static_assets.stats(),
+        "prompt_cache": ai_service.prompt_cache_stats(),
+        "render_cache": render_cache.stats(),
+        "image_handles": image_handles.stats(),
+        "crop_pyramid": crop_pyramid.stats(),
+        "upload_images": upload_images.stats(),
+        "layout_analysis": infographic_layout.stats()
     })
 
 @app.route('/api/generate/case-study', methods=['POST'])
-def generate_case_study():
+async def generate_case_study():
     """Generate or refine case study based on input data - uses two-step AI process for freeform input"""
     try:
         data = request.get_json()
+        set_cache_policy(data.get('cache'))
+        calls = start_upstream_log()
+        # Images stay inline data URLs unless the client opts into /api/images links
+        base_url = image_base_url(data)
 
         # CHECK IF THIS IS A REFINEMENT REQUEST
         if 'feedback' in data and 'images' in data:
@@ -1770,7 +5243,7 @@ def generate_case_study():
 
             # Validate required fields for refinement
             if not data.get('images'):
-                return jsonify({"error": "No infographic image provided for refinement"}), 400
+                return {"error": "No infographic image provided for refinement"}, 400
 
             feedback = data.get('feedback', '')
 
@@ -1784,17 +5257,20 @@ def generate_case_study():
                 logger.info(f"Using infographic URL as string: {infographic_data_url[:50]}...")
 
             if not infographic_data_url:
-                return jsonify({"error": "Invalid infographic image format"}), 400
+                return {"error": "Invalid infographic image format"}, 400
 
             try:
                 # Use new multi-image refinement system
-                refined_images = asyncio.run(refine_case_study_with_images(
+                refined_images = await refine_case_study_with_images(
                     infographic_data_url=infographic_data_url,
                     feedback=feedback,
                     client_data=data
-                ))
+                )
 
                 if refined_images:
+                    await asyncio.to_thread(externalize_images, refined_images, base_url)
+                    await asyncio.to_thread(crop_pyramid.schedule, refined_images[0])
+
                     # Create result structure matching frontend expectations
                     result = {
                         "client_name": data.get('clientName', ''),
@@ -1818,78 +5294,54 @@ def generate_case_study():
                     generation_id = data.get('generation_id', get_generation_id())
 
                     # Save version for undo functionality
-                    save_version(generation_id, result)
+                    await asyncio.to_thread(save_version, generation_id, result)
 
                     # Add generation_id to response
                     result['generation_id'] = generation_id
 
                     logger.info(f"Refinement completed successfully: {len(refined_images)} refined images")
 
-                    return jsonify({
+                    return {
                         "success": True,
                         "data": result,
                         "generation_id": generation_id,
-                        "refined": True
-                    })
+                        "refined": True,
+                        "meta": upstream_meta(calls)
+                    }
                 else:
                     logger.error("Refinement failed: No images returned from AI")
-                    return jsonify({"error": "Refinement failed - no images generated"}), 500
+                    return {"error": "Refinement failed - no images generated"}, 500
 
             except Exception as e:
                 logger.error(f"Refinement process failed: {str(e)}")
                 import traceback
                 logger.error(f"Refinement traceback: {traceback.format_exc()}")
-                return jsonify({"error": f"Refinement failed: {str(e)}"}), 500
+                return {"error": f"Refinement failed: {str(e)}"}, 500
 
         # TWO-STEP ARCHITECTURE for freeform input
         if 'rawNotes' in data and data.get('inputMode') == 'freeform':
             logger.info("Processing FreeForm case study with TWO-STEP AI architecture")
             logger.info(f"Raw notes length: {len(data.get('rawNotes', ''))} characters")
 
-            try:
-                # STEP 1: Claude Sonnet 4.5 analyzes and structures content
-                logger.info("STEP 1: Starting Claude analysis...")
-                structured_data = asyncio.run(ai_service._analyze_freeform_content(
-                    raw_notes=data.get('rawNotes', ''),
-                    client_name=data.get('clientName', ''),
-                    industry=data.get('industry', '')
-                ))
-                logger.info(f"STEP 1 Complete: Extracted client={structured_data.get('clientName')}, "
-                           f"metrics={len(structured_data.get('metrics', []))}")
-
-                # STEP 2: Generate complete multi-page case study with Gemini
-                logger.info("STEP 2: Calling Gemini to generate complete case study document...")
-
-                # Generate complete multi-page case study using Gemini
-                images = asyncio.run(ai_service._generate_complete_case_study(structured_data))
-
-                # Return bullet points + infographic image
-                result = {
-                    "client_name": structured_data.get('clientName', ''),
-                    "industry": structured_data.get('industry', ''),
-                    "title": structured_data.get('title', ''),
-                    "subtitle": structured_data.get('subtitle', ''),
-                    # Bullet points for display
-                    "challengeBullets": structured_data.get('challengeBullets', []),
-                    "solutionBullets": structured_data.get('solutionBullets', []),
-                    "resultsBullets": structured_data.get('resultsBullets', []),
-                    "metrics": structured_data.get('metrics', []),
-                    "technologies": structured_data.get('technologies', []),
-                    "testimonial": structured_data.get('testimonialShort', ''),
-                    "roi": structured_data.get('roiStatement', ''),
-                    # The infographic image - this is the main artifact
-                    "images": images,
-                    "infographic": images[0] if images else None
-                }
-
-                logger.info(f"STEP 2 Complete: Generated infographic image (success={len(images) > 0})")
+            # Long-running generation can be queued as a background job instead
+            if data.get('async'):
+                job = await job_runner.submit('case_study', make_case_study_job(data, base_url))
+                return {
+                    "success": True,
+                    "job_id": job['id'],
+                    "status": job['status'],
+                    "status_url": f"/api/jobs/{job['id']}",
+                    "stream_url": f"/api/jobs/{job['id']}/stream"
+                }, 202
 
+            try:
+                result = await run_two_step_case_study(data, image_base_url=base_url)
             except Exception as e:
                 logger.error(f"Two-step generation failed: {e}")
                 logger.error(f"Error details: {str(e)}")
                 import traceback
                 logger.error(f"Traceback: {traceback.format_exc()}")
-                return jsonify({"error": f"Two-step generation failed: {str(e)}"}), 500
+                return {"error": f"Two-step generation failed: {str(e)}"}, 500
 
         else:
             # Structured mode - validate required fields and use single-step process
@@ -1897,53 +5349,206 @@ def generate_case_study():
             required_fields = ['clientName', 'industry', 'challenge', 'solution']
             for field in required_fields:
                 if field not in data:
-                    return jsonify({"error": f"Missing required field: {field}"}), 400
+                    return {"error": f"Missing required field: {field}"}, 400
 
             # Generate case study using AI service (async call)
-            result = asyncio.run(ai_service.generate_case_study(data))
+            result = await ai_service.generate_case_study(data)
+            await asyncio.to_thread(externalize_images, result.get('images'), base_url)
 
         # Generate or use existing generation_id for tracking
         generation_id = data.get('generation_id', get_generation_id())
 
         # Save version for undo functionality
-        save_version(generation_id, result)
+        await asyncio.to_thread(save_version, generation_id, result)
 
         # Add generation_id to response
         result['generation_id'] = generation_id
 
-        return jsonify({
+        return {
             "success": True,
             "data": result,
-            "generation_id": generation_id
-        })
+            "generation_id": generation_id,
+            "meta": upstream_meta(calls)
+        }
 
     except Exception as e:
         logger.error(f"Error generating case study: {str(e)}")
-        return jsonify({"error": "Failed to generate case study"}), 500
+        return {"error": "Failed to generate case study"}, 500
+
+def format_sse(event, data):
+    """Format a Server-Sent Events message"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/generate/case-study/stream', methods=['POST'])
+def generate_case_study_stream():
+    """Stream two-step case study progress as Server-Sent Events
+
+    Emits `analysis` with the structured bullets as soon as Claude finishes, then
+    `infographic` once Gemini returns the image, then `complete` (or `error`).
+    """
+    data = request.get_json() or {}
+
+    if 'rawNotes' not in data or data.get('inputMode') != 'freeform':
+        return jsonify({"error": "Streaming is only available for freeform input (rawNotes)"}), 400
+
+    logger.info("Processing FreeForm case study with TWO-STEP AI architecture (SSE stream)")
+    events = queue.Queue()
+    base_url = image_base_url(data)
+
+    async def on_progress(stage, partial):
+        events.put((stage, partial))
+
+    async def pipeline():
+        set_cache_policy(data.get('cache'))
+        calls = start_upstream_log()
+        try:
+            result = await run_two_step_case_study(data, on_progress=on_progress, image_base_url=base_url)
+
+            # Generate or use existing generation_id for tracking
+            generation_id = data.get('generation_id', get_generation_id())
+            await asyncio.to_thread(save_version, generation_id, result)
+            events.put(('complete', {
+                "success": True,
+                "generation_id": generation_id,
+                "meta": upstream_meta(calls)
+            }))
+        except Exception as e:
+            logger.error(f"Two-step generation stream failed: {e}")
+            events.put(('error', {"error": f"Two-step generation failed: {str(e)}"}))
+
+    asyncio.run_coroutine_threadsafe(pipeline(), async_runner.loop)
+
+    def stream():
+        yield format_sse('started', {"stages": ['analysis', 'infographic']})
+        while True:
+            try:
+                event, payload = events.get(timeout=15)
+            except queue.Empty:
+                # Comment line keeps proxies from closing the idle connection
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(event, payload)
+            if event in ('complete', 'error'):
+                break
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll a background job for its status, partial results and final payload"""
+    try:
+        job = job_runner.store.get(job_id)
+        if job is None:
+            return jsonify({"error": f"Job not found: {job_id}"}), 404
+
+        return jsonify({
+            "success": True,
+            "job": job
+        })
+
+    except Exception as e:
+        logger.error(f"Error fetching job {job_id}: {str(e)}")
+        return jsonify({"error": "Failed to fetch job"}), 500
+
+@app.route('/api/jobs/<job_id>/stream', methods=['GET'])
+def stream_job(job_id):
+    """Follow a background job as Server-Sent Events until it finishes
+
+    Emits `status` when the status or stage changes and `progress` when new partial
+    results arrive, then `complete` with the job (or `error`). The job store is
+    shared, so any worker can stream a job another worker is running.
+    """
+    job = job_runner.store.get(job_id)
+    if job is None:
+        return jsonify({"error": f"Job not found: {job_id}"}), 404
+
+    def stream():
+        nonlocal job
+        status = partial = None
+        idle_since = time.monotonic()
+        while True:
+            if (job['status'], job['stage']) != status:
+                status = (job['status'], job['stage'])
+                yield format_sse('status', {"job_id": job_id, "status": job['status'], "stage": job['stage']})
+                idle_since = time.monotonic()
+            if job['partial'] is not None and job['partial'] != partial:
+                partial = job['partial']
+                yield format_sse('progress', {"job_id": job_id, "stage": job['stage'], "partial": partial})
+                idle_since = time.monotonic()
+            if job['status'] == 'completed':
+                yield format_sse('complete', {"success": True, "job": job})
+                break
+            if job['status'] == 'failed':
+                yield format_sse('error', {"job_id": job_id, "error": job['error']})
+                break
+            if time.monotonic() - idle_since >= 15:
+                # Comment line keeps proxies from closing the idle connection
+                yield ": keep-alive\n\n"
+                idle_since = time.monotonic()
+
+            time.sleep(app.config['JOB_STREAM_POLL_SECONDS'])
+            job = job_runner.store.get(job_id)
+            if job is None:
+                yield format_sse('error', {"job_id": job_id, "error": "Job expired"})
+                break
+
+    return Response(stream(), mimetype='text/event-stream', headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
+
+@app.route('/api/images/<image_hash>', methods=['GET'])
+def get_image(image_hash):
+    """Serve a stored image by content hash (strong ETag, conditional and Range requests)"""
+    path = image_blobs.path(image_hash)
+    if path is None:
+        return jsonify({"error": f"Image not found: {image_hash}"}), 404
+
+    try:
+        # send_file stats and opens the path before returning, so a purge after this is harmless
+        response = send_file(
+            path,
+            mimetype=image_blobs.mime_type(image_hash),
+            conditional=True,
+            etag=image_hash,
+            max_age=31536000
+        )
+    except FileNotFoundError:
+        # Purged between the existence check and the send
+        return jsonify({"error": f"Image not found: {image_hash}"}), 404
+    # Content-addressed, so the bytes behind a hash never change
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
 
 @app.route('/api/presentation/generate', methods=['POST'])
-def generate_presentation():
+async def generate_presentation():
     """Generate presentation based on input data"""
     try:
         data = request.get_json()
+        set_cache_policy(data.get('cache'))
+        calls = start_upstream_log()
 
         # Validate required fields
         required_fields = ['title', 'objective', 'audience', 'duration', 'keyPoints']
         for field in required_fields:
             if field not in data:
-                return jsonify({"error": f"Missing required field: {field}"}), 400
+                return {"error": f"Missing required field: {field}"}, 400
 
         # Generate presentation using AI service (async call)
-        result = asyncio.run(ai_service.generate_presentation(data))
+        result = await ai_service.generate_presentation(data)
 
-        return jsonify({
+        return {
             "success": True,
-            "data": result
-        })
+            "data": result,
+            "meta": upstream_meta(calls)
+        }
 
     except Exception as e:
         logger.error(f"Error generating presentation: {str(e)}")
-        return jsonify({"error": "Failed to generate presentation"}), 500
+        return {"error": "Failed to generate presentation"}, 500
 
 @app.route('/api/presentation/refine', methods=['POST'])
 def refine_presentation():
@@ -1974,293 +5579,120 @@ def refine_presentation():
         return jsonify({"error": "Failed to refine presentation"}), 500
 
 @app.route('/api/recruiting/generate', methods=['POST'])
-def generate_recruiting_artifact():
+async def generate_recruiting_artifact():
     """Generate recruiting artifact based on input data"""
     try:
         data = request.get_json()
+        set_cache_policy(data.get('cache'))
+        calls = start_upstream_log()
 
         logger.info(f"Received recruiting request: {data}")
 
         # Validate required fields
         if 'tool' not in data or 'input' not in data:
             logger.error(f"Missing required fields. Data: {data}")
-            return jsonify({"error": "Missing required fields: tool and input"}), 400
+            return {"error": "Missing required fields: tool and input"}, 400
 
         # Generate recruiting artifact using AI service (async call)
-        result = asyncio.run(ai_service.generate_recruiting_artifact(data))
+        result = await ai_service.generate_recruiting_artifact(data)
 
-        return jsonify({
+        return {
             "success": True,
-            "data": result
-        })
+            "data": result,
+            "meta": upstream_meta(calls)
+        }
 
     except Exception as e:
         logger.error(f"Error generating recruiting artifact: {str(e)}")
-        return jsonify({"error": "Failed to generate recruiting artifact"}), 500
+        return {"error": "Failed to generate recruiting artifact"}, 500
 
 @app.route('/api/export/pdf', methods=['POST'])
 def export_pdf():
     """Export content as PDF - prioritizes infographic image for clean, scannable output
 
-    Two modes:
-    1. INFOGRAPHIC MODE: If hero image is an infographic (from unified approach), show ONLY the infographic
-       - Clean, single-page output that's easy to scan
-       - No walls of text, just the visual document
-    2. LEGACY MODE: If no infographic or multiple separate images, fall back to text-based layout
+    JSON mode (default) returns the PDF base64-encoded as `pdf_data`. Binary mode
+    (`?format=pdf`, `"format": "pdf"` or `Accept: application/pdf`) streams
+    application/pdf with Content-Disposition and a strong ETag; If-None-Match
+    short-circuits to 304 before anything is rendered. Renders are cached by
+    content hash, so repeat exports skip ReportLab entirely; a cached render is
+    also addressable (GET/HEAD) at the Content-Location returned with it.
     """
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         case_study_data = data.get('caseStudy', {})
-        images = case_study_data.get('images', [])
-
-        # Create PDF in memory (Letter size, 8.5x11)
-        buffer = io.BytesIO()
-
-        # Check if we have an infographic image (from unified approach)
-        # Infographic mode: single hero image that IS the complete document
-        hero_img = next((img for img in images if img.get('placement') == 'hero'), None)
-        has_infographic = hero_img and hero_img.get('url') and len(images) == 1
-
-        # Also check for infographic ID pattern (from new unified approach)
-        if hero_img and hero_img.get('id', '').startswith('infographic_'):
-            has_infographic = True
-
-        if has_infographic:
-            # INFOGRAPHIC MODE: Output just the infographic image with minimal margins
-            logger.info("PDF Export: Using INFOGRAPHIC mode (single visual document)")
-
-            doc = SimpleDocTemplate(
-                buffer,
-                pagesize=letter,
-                rightMargin=0.25*inch,
-                leftMargin=0.25*inch,
-                topMargin=0.25*inch,
-                bottomMargin=0.25*inch
-            )
-
-            story = []
-
-            # Add the infographic image at full page size
-            img_buffer = base64_to_image_buffer(hero_img['url'])
-            if img_buffer:
-                try:
-                    # Calculate dimensions to fit 8.5x11 with minimal margins (8x10.5 usable)
-                    rl_img = RLImage(img_buffer, width=8*inch, height=10.5*inch)
-                    story.append(rl_img)
-                    logger.info("Added full-page infographic to PDF")
-                except Exception as e:
-                    logger.error(f"Error adding infographic to PDF: {str(e)}")
-                    # Fall back to legacy mode
-                    has_infographic = False
-
-            if has_infographic and story:
-                doc.build(story)
-
-                # Get PDF bytes and encode
-                pdf_bytes = buffer.getvalue()
-                buffer.close()
-
-                pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
-                client_name = case_study_data.get('client_name', case_study_data.get('clientName', 'export'))
-
-                return jsonify({
-                    "success": True,
-                    "pdf_data": pdf_base64,
-                    "filename": f"case-study-{client_name.lower().replace(' ', '-')}.pdf"
-                })
-
-        # LEGACY MODE: Full text-based layout with embedded images
-        logger.info("PDF Export: Using LEGACY mode (text + images)")
-
-        doc = SimpleDocTemplate(
-            buffer,
-            pagesize=letter,
-            rightMargin=0.75*inch,
-            leftMargin=0.75*inch,
-            topMargin=0.75*inch,
-            bottomMargin=0.75*inch
-        )
-
-        # Define styles matching draft preview
-        styles = getSampleStyleSheet()
-
-        title_style = ParagraphStyle(
-            'TitleStyle',
-            parent=styles['Heading1'],
-            fontSize=22,
-            textColor=colors.HexColor('#1e3a5f'),
-            spaceAfter=8,
-            fontName='Helvetica-Bold',
-            leading=26
-        )
-
-        subtitle_style = ParagraphStyle(
-            'SubtitleStyle',
-            parent=styles['Normal'],
-            fontSize=12,
-            textColor=colors.HexColor('#6b7280'),
-            spaceAfter=20,
-            leading=16
-        )
-
-        heading_style = ParagraphStyle(
-            'HeadingStyle',
-            parent=styles['Heading2'],
-            fontSize=14,
-            textColor=colors.HexColor('#1e3a5f'),
-            spaceAfter=10,
-            spaceBefore=16,
-            fontName='Helvetica-Bold'
+        binary = (
+            request.args.get('format') == 'pdf'
+            or data.get('format') == 'pdf'
+            or request.accept_mimetypes.best == 'application/pdf'
         )
 
-        body_style = ParagraphStyle(
-            'BodyStyle',
-            parent=styles['Normal'],
-            fontSize=10,
-            textColor=colors.HexColor('#374151'),
-            leading=14,
-            spaceAfter=12
-        )
-
-        story = []
-
-        # Page Header - Calance Branding
-        header_data = [['CALANCE', 'CASE STUDY']]
-        header_table = Table(header_data, colWidths=[3*inch, 3.5*inch])
-        header_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, 0), colors.HexColor('#1e3a5f')),
-            ('BACKGROUND', (1, 0), (1, 0), colors.HexColor('#1e3a5f')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-            ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-            ('VALIGN', (0, 0), (-1, 0), 'MIDDLE'),
-            ('LEFTPADDING', (0, 0), (-1, 0), 12),
-            ('RIGHTPADDING', (0, 0), (-1, 0), 12),
-            ('TOPPADDING', (0, 0), (-1, 0), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 8),
-        ]))
-        story.append(header_table)
-        story.append(Spacer(1, 0.3*inch))
-
-        # Hero Image (full width) - only if not infographic mode
-        if hero_img and hero_img.get('url'):
-            img_buffer = base64_to_image_buffer(hero_img['url'])
-            if img_buffer:
-                try:
-                    rl_img = RLImage(img_buffer, width=6.5*inch, height=3.66*inch)
-                    story.append(rl_img)
-                    story.append(Spacer(1, 0.25*inch))
-                    logger.info("Added hero image to PDF")
-                except Exception as e:
-                    logger.error(f"Error adding hero image to PDF: {str(e)}")
-
-        # Title and Subtitle
-        if case_study_data.get('title'):
-            story.append(Paragraph(case_study_data['title'], title_style))
-
-        if case_study_data.get('subtitle'):
-            story.append(Paragraph(case_study_data['subtitle'], subtitle_style))
-
-        # Executive Summary (if available)
-        if case_study_data.get('executiveSummary'):
-            story.append(Paragraph("Executive Summary", heading_style))
-            story.append(Paragraph(case_study_data['executiveSummary'], body_style))
-
-        # Challenge Section
-        if case_study_data.get('challenge'):
-            story.append(Paragraph("The Challenge", heading_style))
-            story.append(Paragraph(case_study_data['challenge'], body_style))
-
-        # Solution Section
-        if case_study_data.get('solution'):
-            story.append(Paragraph("Our Solution", heading_style))
-            story.append(Paragraph(case_study_data['solution'], body_style))
-
-        # Implementation (if available)
-        if case_study_data.get('implementation'):
-            story.append(Paragraph("Implementation", heading_style))
-
-            # Timeline Image (if available)
-            timeline_img = next((img for img in images if img.get('placement') == 'timeline'), None)
-            if timeline_img and timeline_img.get('url'):
-                img_buffer = base64_to_image_buffer(timeline_img['url'])
-                if img_buffer:
-                    try:
-                        rl_img = RLImage(img_buffer, width=6.5*inch, height=2.44*inch)
-                        story.append(rl_img)
-                        story.append(Spacer(1, 0.15*inch))
-                        logger.info("Added timeline image to PDF")
-                    except Exception as e:
-                        logger.error(f"Error adding timeline image to PDF: {str(e)}")
-
-            story.append(Paragraph(case_study_data['implementation'], body_style))
-
-        # Results & Impact
-        if case_study_data.get('results'):
-            story.append(Paragraph("Results & Impact", heading_style))
-            story.append(Paragraph(case_study_data['results'], body_style))
-
-        # Metrics Dashboard Image (visual representation)
-        metrics_img = next((img for img in images if img.get('placement') == 'metrics'), None)
-        if metrics_img and metrics_img.get('url'):
-            story.append(Paragraph("Key Metrics", heading_style))
-            img_buffer = base64_to_image_buffer(metrics_img['url'])
-            if img_buffer:
-                try:
-                    rl_img = RLImage(img_buffer, width=6.5*inch, height=3.66*inch)
-                    story.append(rl_img)
-                    story.append(Spacer(1, 0.15*inch))
-                    logger.info("Added metrics dashboard image to PDF")
-                except Exception as e:
-                    logger.error(f"Error adding metrics image to PDF: {str(e)}")
-
-        # ROI Statement
-        if case_study_data.get('roi'):
-            story.append(Paragraph("ROI", heading_style))
-            story.append(Paragraph(case_study_data['roi'], body_style))
-
-        # Testimonial (if available)
-        if case_study_data.get('testimonial'):
-            story.append(Paragraph("Client Testimonial", heading_style))
-            # Create a styled testimonial box
-            testimonial_style = ParagraphStyle(
-                'TestimonialStyle',
-                parent=body_style,
-                leftIndent=20,
-                rightIndent=20,
-                fontName='Helvetica-Oblique',
-                textColor=colors.HexColor('#1e3a5f')
-            )
-            story.append(Paragraph(f'"{case_study_data["testimonial"]}"', testimonial_style))
+        key = RenderCache.make_key('pdf', case_study_data)
 
-        # Future Outlook (if available)
-        if case_study_data.get('futureOutlook'):
-            story.append(Paragraph("What's Next", heading_style))
-            story.append(Paragraph(case_study_data['futureOutlook'], body_style))
+        if not binary:
+            # Create base64 encoded PDF for frontend download
+            pdf_base64 = base64.b64encode(render_case_study_pdf(case_study_data, key)).decode('utf-8')
 
-        # Build PDF
-        doc.build(story)
+            return jsonify({
+                "success": True,
+                "pdf_data": pdf_base64,
+                "filename": pdf_filename(case_study_data)
+            })
 
-        # Get PDF bytes and encode
-        pdf_bytes = buffer.getvalue()
-        buffer.close()
+        headers = {
+            "ETag": f'"{key}"',
+            "Content-Disposition": f'attachment; filename="{pdf_filename(case_study_data)}"',
+            "Cache-Control": "private, no-cache"
+        }
+        if key in request.if_none_match:
+            return Response(status=304, headers=headers)
 
-        # Create base64 encoded PDF for frontend download
-        pdf_base64 = base64.b64encode(pdf_bytes).decode('utf-8')
-        client_name = case_study_data.get('client_name', case_study_data.get('clientName', 'export'))
+        cached = render_cache.get(key)
+        if cached is not None:
+            headers["Content-Location"] = f"/api/export/pdf/{key}"
+            return Response(cached, mimetype='application/pdf', headers=headers)
 
-        return jsonify({
-            "success": True,
-            "pdf_data": pdf_base64,
-            "filename": f"case-study-{client_name.lower().replace(' ', '-')}.pdf"
-        })
+        # ReportLab writes into a spooled file that only touches disk for large PDFs
+        output = tempfile.SpooledTemporaryFile(max_size=app.config['PDF_SPOOL_MAX_BYTES'])
+        try:
+            build_case_study_pdf(case_study_data, output)
+        except Exception:
+            output.close()
+            raise
+        size = output.tell()
+        headers["Content-Length"] = str(size)
+        on_complete = None
+        if size <= app.config['PDF_SPOOL_MAX_BYTES']:
+            # Cached from the chunks as they stream, before the last one goes out
+            on_complete = functools.partial(render_cache.set, key)
+            headers["Content-Location"] = f"/api/export/pdf/{key}"
+
+        return Response(
+            iter_file_chunks(output, on_complete=on_complete),
+            mimetype='application/pdf',
+            headers=headers,
+            direct_passthrough=True
+        )
 
     except Exception as e:
         logger.error(f"Error exporting PDF: {str(e)}")
         return jsonify({"error": "Failed to export PDF"}), 500
 
+@app.route('/api/export/pdf/<key>', methods=['GET'])
+def get_exported_pdf(key):
+    """Serve an already rendered PDF by its render key (the ETag of the export)
+
+    Never renders: a key that is not (or no longer) cached is a 404 and the client
+    POSTs the case study again. HEAD is answered by Flask from this GET.
+    """
+    pdf_bytes = render_cache.get(key) if RenderCache.KEY_PATTERN.match(key) else None
+    if pdf_bytes is None:
+        return jsonify({"error": f"Rendered PDF not found: {key}"}), 404
+    headers = {"ETag": f'"{key}"', "Cache-Control": "private, no-cache"}
+    if key in request.if_none_match:
+        return Response(status=304, headers=headers)
+    headers["Content-Disposition"] = 'attachment; filename="case-study.pdf"'
+    return Response(pdf_bytes, mimetype='application/pdf', headers=headers)
+
 @app.route('/api/export/html', methods=['POST'])
 def export_html():
     """Export content as HTML"""
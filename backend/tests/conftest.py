@@ -0,0 +1,67 @@
+import asyncio
+import json
+import os
+import sys
+import tempfile
+
+import httpx
+import pytest
+
+# Shared SQLite stores and image blobs go to a throwaway directory, set before app is imported
+os.environ.setdefault('DATA_DIR', tempfile.mkdtemp(prefix='calance-edge-tests-'))
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def completion(content, usage=None):
+    """Minimal OpenRouter chat completion body"""
+    body = {"choices": [{"message": {"role": "assistant", "content": content}}]}
+    if usage:
+        body["usage"] = usage
+    return body
+
+
+def sse(*chunks):
+    """Streaming response body made of SSE data lines"""
+    lines = [f"data: {json.dumps(chunk)}" for chunk in chunks] + ["data: [DONE]"]
+    return "\n\n".join(lines).encode('utf-8')
+
+
+class FakeOpenRouter:
+    """In-process stand-in for the OpenRouter API, answering per requested model"""
+
+    def __init__(self):
+        self.handlers = {}
+        self.requests = []
+
+    def __call__(self, request):
+        body = json.loads(request.content)
+        self.requests.append(body)
+        return self.handlers[body['model']](body)
+
+    def models_called(self):
+        return [body['model'] for body in self.requests]
+
+
+@pytest.fixture
+def openrouter():
+    """(service, fake, run): a fresh AIService whose pooled client talks to the fake
+
+    run(coroutine_function) executes it on a new loop with the fake client attached.
+    """
+    from app import AIService
+
+    service = AIService()
+    fake = FakeOpenRouter()
+
+    def run(coroutine_function):
+        async def main():
+            service._client = httpx.AsyncClient(transport=httpx.MockTransport(fake))
+            service._client_loop = asyncio.get_running_loop()
+            try:
+                return await coroutine_function()
+            finally:
+                await service._client.aclose()
+        return asyncio.run(main())
+
+    return service, fake, run
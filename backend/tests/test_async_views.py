@@ -0,0 +1,39 @@
+import threading
+
+import pytest
+
+import app as backend
+
+
+@pytest.fixture
+def client():
+    return backend.app.test_client()
+
+
+def test_invalid_json_is_rejected_before_the_loop(client, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("view ran on the loop")
+
+    monkeypatch.setattr(backend.async_runner, 'run', fail)
+    response = client.post('/api/recruiting/generate', data='{not json', content_type='application/json')
+    assert response.status_code == 400
+
+
+def test_view_result_is_serialised_on_the_request_thread(client, monkeypatch):
+    async def fake_artifact(data):
+        return {"artifact": "x" * 1000}
+
+    threads = []
+    dumps = backend.app.json.dumps
+
+    def recording_dumps(obj, **kwargs):
+        threads.append(threading.current_thread().name)
+        return dumps(obj, **kwargs)
+
+    monkeypatch.setattr(backend.ai_service, 'generate_recruiting_artifact', fake_artifact)
+    monkeypatch.setattr(backend.app.json, 'dumps', recording_dumps)
+    response = client.post('/api/recruiting/generate', json={"tool": "jd", "input": "role"})
+
+    assert response.status_code == 200
+    assert response.get_json()["data"] == {"artifact": "x" * 1000}
+    assert threads and 'calance-async-loop' not in threads
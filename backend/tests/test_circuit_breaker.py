@@ -0,0 +1,142 @@
+import httpx
+import pytest
+
+import app as backend
+from app import CircuitBreaker, circuit_breaker
+from conftest import completion
+
+
+@pytest.fixture
+def breaker(monkeypatch):
+    monkeypatch.setitem(backend.app.config, 'BREAKER_ENABLED', True)
+    monkeypatch.setitem(backend.app.config, 'BREAKER_FAILURE_THRESHOLD', 3)
+    monkeypatch.setitem(backend.app.config, 'BREAKER_RESET_SECONDS', 30)
+    monkeypatch.setitem(backend.app.config, 'BREAKER_HALF_OPEN_PROBES', 1)
+    return CircuitBreaker()
+
+
+def state(breaker, model):
+    return breaker.stats()["models"][model]["state"]
+
+
+def trip(breaker, model):
+    for _ in range(backend.app.config['BREAKER_FAILURE_THRESHOLD']):
+        breaker.record_failure(model)
+
+
+def test_opens_after_threshold_and_short_circuits(breaker):
+    breaker.record_failure('m')
+    breaker.record_failure('m')
+    assert state(breaker, 'm') == CircuitBreaker.CLOSED
+    breaker.record_failure('m')
+
+    assert state(breaker, 'm') == CircuitBreaker.OPEN
+    assert not breaker.allow('m')
+    assert breaker.stats()["models"]["m"]["short_circuited"] == 1
+
+
+def test_half_open_probe_success_closes(breaker, monkeypatch):
+    trip(breaker, 'm')
+    monkeypatch.setitem(backend.app.config, 'BREAKER_RESET_SECONDS', 0)
+
+    assert breaker.allow('m')
+    assert state(breaker, 'm') == CircuitBreaker.HALF_OPEN
+    breaker.record_success('m')
+    assert state(breaker, 'm') == CircuitBreaker.CLOSED
+    assert breaker.stats()["models"]["m"]["consecutive_failures"] == 0
+
+
+def test_half_open_probe_failure_reopens(breaker, monkeypatch):
+    trip(breaker, 'm')
+    monkeypatch.setitem(backend.app.config, 'BREAKER_RESET_SECONDS', 0)
+    assert breaker.allow('m')
+    breaker.record_failure('m')
+
+    assert state(breaker, 'm') == CircuitBreaker.OPEN
+    assert breaker.stats()["models"]["m"]["times_opened"] == 2
+
+
+def test_half_open_admits_only_configured_probes(breaker):
+    trip(breaker, 'm')
+    breaker._models['m']['opened_at'] -= 30
+
+    assert breaker.allow('m')
+    assert not breaker.allow('m')
+
+
+def test_rate_limit_leaves_failure_count_unchanged(breaker):
+    breaker.record_failure('m')
+    breaker.record_failure('m')
+    breaker.record_outcome('m', 429)
+    assert breaker.stats()["models"]["m"]["consecutive_failures"] == 2
+    breaker.record_outcome('m', 503)
+    assert state(breaker, 'm') == CircuitBreaker.OPEN
+
+
+def test_rate_limited_probe_hands_back_its_slot(breaker):
+    trip(breaker, 'm')
+    breaker._models['m']['opened_at'] -= 30
+    assert breaker.allow('m')
+    breaker.record_outcome('m', 429)
+
+    assert state(breaker, 'm') == CircuitBreaker.HALF_OPEN
+    assert breaker.allow('m')
+
+
+def test_fallback_probe_slot_untouched_when_primary_answers(openrouter, monkeypatch):
+    service, fake, run = openrouter
+    primary, fallback = 'test/breaker-primary', 'test/breaker-fallback'
+    monkeypatch.setitem(backend.app.config['MODEL_FALLBACKS'], 'breaker_test', [fallback])
+    trip(circuit_breaker, fallback)
+    circuit_breaker._models[fallback]['opened_at'] -= backend.app.config['BREAKER_RESET_SECONDS']
+    fake.handlers = {primary: lambda body: httpx.Response(200, json=completion("primary"))}
+
+    async def call():
+        return await service._post_chat(
+            {"model": primary, "messages": [{"role": "user", "content": "hi"}]}, task='breaker_test'
+        )
+
+    assert run(call).status_code == 200
+    assert fake.models_called() == [primary]
+    # The fallback was never asked, so its half-open probe is still available
+    assert circuit_breaker.stats()["models"][fallback]["state"] == CircuitBreaker.OPEN
+    assert circuit_breaker.allow(fallback)
+
+
+@pytest.mark.parametrize("status", [400, 401, 404, 429])
+def test_non_2xx_client_statuses_do_not_close_a_half_open_breaker(breaker, status):
+    trip(breaker, 'm')
+    breaker._models['m']['opened_at'] -= 30
+    assert breaker.allow('m')
+    breaker.record_outcome('m', status)
+
+    assert state(breaker, 'm') == CircuitBreaker.HALF_OPEN
+    assert breaker.stats()["models"]["m"]["consecutive_failures"] == 3
+    breaker.record_outcome('m', 204)
+    assert state(breaker, 'm') == CircuitBreaker.CLOSED
+
+
+def test_half_open_probe_is_never_hedged(openrouter, monkeypatch):
+    import asyncio
+
+    service, fake, run = openrouter
+    model = 'test/breaker-probe-hedge'
+    monkeypatch.setitem(backend.app.config, 'HEDGE_ENABLED', True)
+    monkeypatch.setitem(backend.app.config, 'HEDGE_DEFAULT_DELAY', 0.05)
+    monkeypatch.setitem(backend.app.config, 'HEDGE_MIN_DELAY', 0.05)
+    trip(circuit_breaker, model)
+    circuit_breaker._models[model]['opened_at'] -= backend.app.config['BREAKER_RESET_SECONDS']
+    requests = []
+
+    async def slow(request):
+        requests.append(request)
+        await asyncio.sleep(0.3)
+        return httpx.Response(200, json=completion("probe"))
+
+    async def call():
+        service._client = httpx.AsyncClient(transport=httpx.MockTransport(slow))
+        return await service._post_chat({"model": model, "messages": [{"role": "user", "content": "hi"}]}, hedge=True)
+
+    assert run(call).status_code == 200
+    assert len(requests) == 1
+    assert circuit_breaker.stats()["models"][model]["state"] == CircuitBreaker.CLOSED
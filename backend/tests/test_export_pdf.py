@@ -0,0 +1,89 @@
+import io
+
+import pytest
+
+import app as backend
+
+
+@pytest.fixture
+def client():
+    return backend.app.test_client()
+
+
+CASE_STUDY = {"clientName": "Head Check", "title": "Keyed exports", "challengeBullets": ["one"]}
+
+
+def export(client):
+    return client.post('/api/export/pdf?format=pdf', json={"caseStudy": CASE_STUDY})
+
+
+def render_key(response):
+    return response.headers['ETag'].strip('"')
+
+
+def test_rendered_pdf_is_addressable_by_key(client):
+    response = export(client)
+    assert response.status_code == 200
+    location = response.headers['Content-Location']
+    assert location == f"/api/export/pdf/{render_key(response)}"
+
+    fetched = client.get(location)
+    assert fetched.data == response.data
+    head = client.head(location)
+    assert head.data == b''
+    assert head.headers['Content-Length'] == str(len(response.data))
+
+
+def test_keyed_fetch_never_renders(client, monkeypatch):
+    def fail(*args, **kwargs):
+        raise AssertionError("rendered on a keyed fetch")
+
+    monkeypatch.setattr(backend, 'build_case_study_pdf', fail)
+    assert client.head('/api/export/pdf/' + 'f' * 64).status_code == 404
+    assert client.get('/api/export/pdf/../secrets').status_code == 404
+
+
+def test_export_route_has_no_head(client):
+    assert client.head('/api/export/pdf').status_code == 405
+
+
+def test_if_none_match_on_key(client):
+    response = export(client)
+    fetched = client.get(f"/api/export/pdf/{render_key(response)}", headers={"If-None-Match": response.headers['ETag']})
+    assert fetched.status_code == 304
+
+
+def test_streamed_chunks_fill_the_cache_before_the_last_one():
+    seen = []
+    chunks = backend.iter_file_chunks(io.BytesIO(b"abcdefghij"), chunk_size=4, on_complete=seen.append)
+
+    assert next(chunks) == b"abcd"
+    assert next(chunks) == b"efgh"
+    assert seen == []
+    assert next(chunks) == b"ij"
+    assert seen == [b"abcdefghij"]
+    assert list(chunks) == []
+
+
+def test_export_caches_the_streamed_pdf_without_rereading(client, monkeypatch):
+    reads = []
+    spool = backend.tempfile.SpooledTemporaryFile
+
+    class RecordingSpool:
+        def __init__(self, *args, **kwargs):
+            self.file = spool(*args, **kwargs)
+
+        def read(self, size=-1):
+            reads.append(size)
+            return self.file.read(size)
+
+        def __getattr__(self, name):
+            return getattr(self.file, name)
+
+    monkeypatch.setattr(backend.tempfile, 'SpooledTemporaryFile', RecordingSpool)
+    response = client.post('/api/export/pdf?format=pdf', json={"caseStudy": {**CASE_STUDY, "title": "Streamed once"}})
+
+    assert response.data.startswith(b'%PDF')
+    assert backend.render_cache.get(render_key(response)) == response.data
+    # Only bounded chunk reads; nothing read the whole spool into memory
+    assert reads and all(size > 0 for size in reads)
@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+import app as backend
+from app import hedge_controller, model_governor, model_router
+from conftest import completion
+
+
+@pytest.fixture
+def hedging(monkeypatch):
+    monkeypatch.setitem(backend.app.config, 'HEDGE_ENABLED', True)
+    monkeypatch.setitem(backend.app.config, 'HEDGE_DEFAULT_DELAY', 0.1)
+    monkeypatch.setitem(backend.app.config, 'HEDGE_MIN_DELAY', 0.05)
+    monkeypatch.setitem(backend.app.config, 'HEDGE_MAX_PER_MINUTE', 1000)
+
+
+def open_leases(model):
+    conn = model_governor._connect()
+    try:
+        return conn.execute("SELECT COUNT(*) FROM governor_leases WHERE model = ?", (model,)).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def slow_then_fast(model, cancelled):
+    """First request hangs for seconds, every later one answers at once"""
+    requests = []
+
+    async def handler(request):
+        requests.append(json.loads(request.content))
+        if len(requests) == 1:
+            try:
+                await asyncio.sleep(5)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+            return httpx.Response(200, json=completion("primary"))
+        return httpx.Response(200, json=completion("hedge"))
+    return handler, requests
+
+
+def run_with(handler, coroutine_function):
+    service = backend.AIService()
+
+    async def main():
+        service._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        service._client_loop = asyncio.get_running_loop()
+        try:
+            return await coroutine_function(service)
+        finally:
+            await service._client.aclose()
+    return asyncio.run(main())
+
+
+def test_hedge_fires_wins_and_releases_the_loser(hedging):
+    model = 'test/hedge-slow'
+    cancelled = []
+    handler, requests = slow_then_fast(model, cancelled)
+    wins = hedge_controller.stats()["hedges_won"]
+
+    async def call(service):
+        response = await service._post_chat({"model": model, "messages": [{"role": "user", "content": "hi"}]},
+                                            hedge=True)
+        # Checked before anything else runs: the loser must already have unwound
+        return response, open_leases(model)
+
+    response, leases = run_with(handler, call)
+
+    assert response.json()["choices"][0]["message"]["content"] == "hedge"
+    assert len(requests) == 2
+    assert cancelled == [True]
+    assert leases == 0
+    assert hedge_controller.stats()["hedges_won"] == wins + 1
+
+
+def test_fast_primary_is_not_hedged(hedging):
+    model = 'test/hedge-fast'
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        return httpx.Response(200, json=completion("primary"))
+
+    async def call(service):
+        return await service._post_chat({"model": model, "messages": [{"role": "user", "content": "hi"}]},
+                                        hedge=True)
+
+    assert run_with(handler, call).status_code == 200
+    assert len(requests) == 1
+
+
+def test_hedge_delay_follows_upstream_latency(hedging, monkeypatch):
+    monkeypatch.setitem(backend.app.config, 'ROUTER_MIN_SAMPLES', 3)
+    for latency in (0.2, 0.3, 0.4):
+        model_router.record('test/hedge-delay', latency, ok=True)
+    model_router.record('test/hedge-delay', 0.0, ok=False)
+    assert hedge_controller.delay_for('test/hedge-delay') == 0.4
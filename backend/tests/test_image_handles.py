@@ -0,0 +1,59 @@
+import base64
+import io
+
+from PIL import Image
+
+import app as backend
+from app import ImageHandleCache
+
+
+def png_data_url(color, side=32):
+    buffer = io.BytesIO()
+    Image.new('RGB', (side, side), color).save(buffer, format='PNG', compress_level=0)
+    return f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode('utf-8')}"
+
+
+def test_repeat_data_url_lookups_skip_decoding(monkeypatch):
+    cache = ImageHandleCache(max_bytes=10 * 1024 * 1024)
+    data_url = png_data_url('red')
+    first = cache.get(data_url)
+
+    def fail(ref):
+        raise AssertionError("data URL decoded again")
+
+    monkeypatch.setattr(backend, 'resolve_image_bytes', fail)
+    assert cache.get(data_url) is first
+    assert cache.get({"url": data_url}) is first
+    assert cache.get({"image_url": {"url": data_url}}) is first
+    assert cache.stats()["hits"] == 3
+
+
+def test_data_urls_count_against_budget_and_leave_with_handle():
+    red, blue = png_data_url('red'), png_data_url('blue')
+    handle = ImageHandleCache(max_bytes=1).get(red)
+    cache = ImageHandleCache(max_bytes=handle.nbytes + 1)
+
+    cache.get(red)
+    cache.get(blue)
+
+    assert cache.stats()["evictions"] == 1
+    assert list(cache._data_urls) == [blue]
+
+
+def test_optimizer_never_encodes_the_shared_image(monkeypatch):
+    handle = ImageHandleCache(max_bytes=10 * 1024 * 1024).get(png_data_url('green', side=64))
+    shared = handle.image()
+    saved = []
+    save = Image.Image.save
+
+    def recording_save(self, *args, **kwargs):
+        saved.append(self)
+        return save(self, *args, **kwargs)
+
+    monkeypatch.setattr(Image.Image, 'save', recording_save)
+    optimizer = backend.UploadImageOptimizer({"tiny": {"max_side": 64, "max_bytes": 1, "formats": ("PNG",)}}, 1024)
+    data, mime = optimizer._optimize(handle, optimizer.profiles["tiny"])
+
+    assert mime == 'image/png' and data
+    assert saved and all(image is not shared for image in saved)
+    assert shared.size == (64, 64)
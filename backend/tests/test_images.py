@@ -0,0 +1,65 @@
+import io
+import os
+
+import pytest
+from PIL import Image
+
+import app as backend
+from app import image_base_url, image_blobs, externalize_images
+
+
+@pytest.fixture
+def client():
+    return backend.app.test_client()
+
+
+def png_bytes(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+def test_serves_stored_image_with_etag_and_ranges(client):
+    raw = png_bytes('green')
+    image_id = image_blobs.put(raw)
+
+    response = client.get(f'/api/images/{image_id}')
+    assert response.status_code == 200
+    assert response.mimetype == 'image/png'
+    assert response.data == raw
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+
+    assert client.get(f'/api/images/{image_id}', headers={'If-None-Match': f'"{image_id}"'}).status_code == 304
+    partial = client.get(f'/api/images/{image_id}', headers={'Range': 'bytes=0-3'})
+    assert partial.status_code == 206
+    assert partial.data == raw[:4]
+
+
+@pytest.mark.parametrize("image_id", ['0' * 64, 'not-a-hash'])
+def test_unknown_image_is_404(client, image_id):
+    assert client.get(f'/api/images/{image_id}').status_code == 404
+
+
+def test_image_purged_before_send_is_404(client, monkeypatch):
+    image_id = image_blobs.put(png_bytes('purple'))
+    path = image_blobs.path(image_id)
+    # The existence check passes, then a purge removes the file before it is opened
+    monkeypatch.setattr(image_blobs, 'path', lambda image_hash, must_exist=True: path)
+    os.remove(path)
+
+    assert client.get(f'/api/images/{image_id}').status_code == 404
+
+
+def test_images_stay_inline_unless_links_are_requested(monkeypatch):
+    monkeypatch.setitem(backend.app.config, 'PUBLIC_API_URL', '')
+    data_url = "data:image/png;base64,iVBORw0KGgo="
+
+    assert externalize_images({"url": data_url}, image_base_url({})) == {"url": data_url}
+
+    linked = externalize_images({"url": data_url}, image_base_url({"image_links": True}))
+    assert linked["url"] == f"/api/images/{linked['image_id']}"
+
+    monkeypatch.setitem(backend.app.config, 'PUBLIC_API_URL', 'https://edge.example.com')
+    monkeypatch.setitem(backend.app.config, 'IMAGE_LINKS_DEFAULT', True)
+    assert image_base_url({}) == 'https://edge.example.com'
+    assert image_base_url({"image_links": False}) is None
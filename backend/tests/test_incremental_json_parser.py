@@ -0,0 +1,62 @@
+import json
+
+from app import IncrementalJSONParser, INFOGRAPHIC_REQUIRED_FIELDS, ANALYSIS_PROMPT
+
+
+def feed_in_chunks(parser, text, size):
+    completed = []
+    for start in range(0, len(text), size):
+        completed.extend(parser.feed(text[start:start + size]))
+    return completed
+
+
+def test_fields_surface_as_they_close():
+    parser = IncrementalJSONParser()
+    assert parser.feed('{"title": "Faster deals", "metrics": [{"value": "85%"') == [("title", "Faster deals")]
+    assert parser.feed('}], "roi": "2x"}') == [("metrics", [{"value": "85%"}]), ("roi", "2x")]
+    assert parser.complete
+
+
+def test_single_character_chunks_match_json_loads():
+    document = {
+        "clientName": "Acme",
+        "challengeBullets": ["Slow, manual {review}", "Quotes \"inside\" text"],
+        "metrics": [{"label": "Time [days]", "value": "3 -> 0"}],
+        "nested": {"a": {"b": [1, 2, {"c": None}]}},
+        "flag": True
+    }
+    text = json.dumps(document)
+    parser = IncrementalJSONParser()
+
+    completed = feed_in_chunks(parser, text, 1)
+
+    assert [key for key, _ in completed] == list(document)
+    assert parser.fields == document
+    assert parser.complete
+
+
+def test_leading_fence_is_skipped_and_trailing_text_ignored():
+    parser = IncrementalJSONParser()
+    feed_in_chunks(parser, '```json\n{"title": "A"}\n```', 4)
+    assert parser.fields == {"title": "A"}
+    assert parser.complete
+
+
+def test_escaped_backslash_before_closing_quote():
+    parser = IncrementalJSONParser()
+    parser.feed('{"path": "C:\\\\", "next": 1}')
+    assert parser.fields == {"path": "C:\\", "next": 1}
+
+
+def test_unparseable_field_is_skipped():
+    parser = IncrementalJSONParser()
+    completed = parser.feed('{"bad": nope, "good": 2}')
+    assert completed == [("good", 2)]
+
+
+def test_analysis_prompt_lists_infographic_fields_first():
+    schema = ANALYSIS_PROMPT.prefix
+    positions = {field: schema.index(f'"{field}"') for field in INFOGRAPHIC_REQUIRED_FIELDS}
+    last_required = max(positions.values())
+    for later in ("subtitle", "technologies", "testimonialShort", "roiStatement"):
+        assert schema.index(f'"{later}"') > last_required
@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import pytest
+
+import app as backend
+from app import JobRunner, JobStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / 'jobs.sqlite3'), ttl_seconds=3600, lease_seconds=60)
+
+
+def test_submit_poll_complete(store):
+    runner = JobRunner(store, concurrency=2, heartbeat_seconds=60)
+    seen = {}
+
+    async def job_fn(report):
+        await report('analysis', {"title": "Draft"})
+        seen['running'] = store.get(job_id)
+        return {"title": "Final"}
+
+    async def scenario():
+        nonlocal job_id
+        job = await runner.submit('case_study', job_fn)
+        job_id = job['id']
+        assert job['status'] == 'queued'
+        await runner._queue.join()
+
+    job_id = None
+    asyncio.run(scenario())
+
+    assert seen['running']['status'] == 'running'
+    assert seen['running']['partial'] == {"title": "Draft"}
+    job = store.get(job_id)
+    assert (job['status'], job['stage'], job['result']) == ('completed', 'complete', {"title": "Final"})
+    assert job_id not in runner._owned
+
+
+def test_failing_job_records_error(store):
+    runner = JobRunner(store, concurrency=1, heartbeat_seconds=60)
+
+    async def job_fn(report):
+        raise RuntimeError("upstream down")
+
+    async def scenario():
+        job = await runner.submit('case_study', job_fn)
+        await runner._queue.join()
+        return job['id']
+
+    job = store.get(asyncio.run(scenario()))
+    assert (job['status'], job['error']) == ('failed', 'upstream down')
+
+
+def test_stale_heartbeat_fails_the_job(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'), ttl_seconds=3600, lease_seconds=0.2)
+    alive, lost = store.create('case_study'), store.create('case_study')
+    time.sleep(0.15)
+    store.heartbeat([alive['id']])
+    time.sleep(0.1)
+
+    assert store.get(alive['id'])['status'] == 'queued'
+    job = store.get(lost['id'])
+    assert (job['status'], job['error']) == ('failed', JobStore.LOST_JOB_ERROR)
+
+
+def test_finished_jobs_are_never_expired_by_the_lease(tmp_path):
+    store = JobStore(str(tmp_path / 'jobs.sqlite3'), ttl_seconds=3600, lease_seconds=0.05)
+    job = store.create('case_study')
+    store.update(job['id'], status='completed', stage='complete', result={"ok": True})
+    time.sleep(0.1)
+    assert store.get(job['id'])['status'] == 'completed'
+
+
+def sse_events(body):
+    events = []
+    for block in body.decode('utf-8').strip().split('\n\n'):
+        lines = dict(line.split(': ', 1) for line in block.split('\n') if not line.startswith(':'))
+        if 'event' in lines:
+            events.append((lines['event'], backend.json.loads(lines['data'])))
+    return events
+
+
+@pytest.fixture
+def client(store, monkeypatch):
+    monkeypatch.setattr(backend.job_runner, 'store', store)
+    monkeypatch.setitem(backend.app.config, 'JOB_STREAM_POLL_SECONDS', 0.01)
+    return backend.app.test_client()
+
+
+def test_stream_follows_job_until_complete(client, store, monkeypatch):
+    job = store.create('case_study')
+    store.update(job['id'], status='running', stage='analysis', partial={"title": "Draft"})
+    updates = iter([
+        lambda: store.update(job['id'], stage='infographic'),
+        lambda: store.update(job['id'], status='completed', stage='complete', result={"title": "Final"})
+    ])
+    sleep = backend.time.sleep
+    monkeypatch.setattr(backend.time, 'sleep', lambda seconds: next(updates, lambda: None)() or sleep(0))
+
+    response = client.get(f"/api/jobs/{job['id']}/stream")
+    assert response.mimetype == 'text/event-stream'
+    events = sse_events(response.get_data())
+
+    assert [name for name, _ in events] == ['status', 'progress', 'status', 'status', 'complete']
+    assert events[1][1]['partial'] == {"title": "Draft"}
+    assert events[-1][1]['job']['result'] == {"title": "Final"}
+
+
+def test_stream_reports_lost_job(client, store):
+    store.lease_seconds = 0
+    job = store.create('case_study')
+    events = sse_events(client.get(f"/api/jobs/{job['id']}/stream").get_data())
+    assert events[-1] == ('error', {"job_id": job['id'], "error": JobStore.LOST_JOB_ERROR})
+
+
+def test_stream_unknown_job(client):
+    assert client.get('/api/jobs/missing/stream').status_code == 404
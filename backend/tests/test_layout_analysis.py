@@ -0,0 +1,89 @@
+import hashlib
+import io
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import app as backend
+from app import INFOGRAPHIC_REGIONS, ImageHandle, InfographicLayoutAnalyzer
+
+NAVY = InfographicLayoutAnalyzer.NAVY
+INK = (40, 40, 40)
+
+
+def synthetic_infographic():
+    """800x1000 page: navy header, title, two columns, four metric tiles, navy footer"""
+    pixels = np.full((1000, 800, 3), 255, dtype=np.uint8)
+    pixels[0:80] = NAVY
+    pixels[120:170, 100:700] = INK
+    pixels[250:450, 60:370] = INK
+    pixels[250:450, 430:740] = INK
+    for left in (60, 240, 420, 600):
+        pixels[550:650, left:left + 140] = INK
+    pixels[940:1000] = NAVY
+    return Image.fromarray(pixels)
+
+
+def handle_for(image):
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    raw = buffer.getvalue()
+    return ImageHandle(hashlib.sha256(raw).hexdigest(), raw)
+
+
+def assert_close(coords, expected, tolerance=0.03):
+    assert coords == pytest.approx(expected, abs=tolerance)
+
+
+def test_detects_regions_on_a_synthetic_infographic():
+    detected = InfographicLayoutAnalyzer(INFOGRAPHIC_REGIONS)._detect(synthetic_infographic())
+
+    assert set(detected) == set(INFOGRAPHIC_REGIONS)
+    assert_close(detected['style_sample'], (0.0, 0.0, 0.51, 0.09))
+    assert_close(detected['title'], (0.115, 0.11, 0.885, 0.18))
+    assert_close(detected['challenge'], (0.065, 0.24, 0.47, 0.46))
+    assert_close(detected['solution'], (0.53, 0.24, 0.935, 0.46))
+    assert_close(detected['metrics'], (0.065, 0.54, 0.935, 0.66))
+
+
+def test_regions_are_cached_per_image():
+    analyzer = InfographicLayoutAnalyzer(INFOGRAPHIC_REGIONS)
+    handle = handle_for(synthetic_infographic())
+
+    first = analyzer.regions(handle)
+    assert analyzer.regions(handle) is first
+    assert first['title']['description'] == INFOGRAPHIC_REGIONS['title']['description']
+    assert analyzer.stats()["hits"] == 1
+    assert analyzer.stats()["regions_detected"] == len(INFOGRAPHIC_REGIONS)
+
+
+def test_blank_image_keeps_the_fixed_regions():
+    analyzer = InfographicLayoutAnalyzer(INFOGRAPHIC_REGIONS)
+    regions = analyzer.regions(handle_for(Image.new('RGB', (400, 500), 'white')))
+
+    assert regions == INFOGRAPHIC_REGIONS
+    assert analyzer.stats()["regions_defaulted"] == len(INFOGRAPHIC_REGIONS)
+
+
+def test_detection_failure_falls_back_to_fixed_regions(monkeypatch):
+    analyzer = InfographicLayoutAnalyzer(INFOGRAPHIC_REGIONS)
+
+    def fail(image):
+        raise ValueError("unexpected layout")
+
+    monkeypatch.setattr(analyzer, '_detect', fail)
+    assert analyzer.regions(handle_for(synthetic_infographic())) == INFOGRAPHIC_REGIONS
+    assert analyzer.stats()["errors"] == 1
+
+
+def test_without_numpy_the_fixed_regions_are_returned(monkeypatch):
+    monkeypatch.setattr(backend, 'np', None)
+    analyzer = InfographicLayoutAnalyzer(INFOGRAPHIC_REGIONS)
+
+    def fail(image):
+        raise AssertionError("analyzed without numpy")
+
+    monkeypatch.setattr(analyzer, '_detect', fail)
+    assert analyzer.stats()["enabled"] is False
+    assert analyzer.regions(handle_for(synthetic_infographic())) is INFOGRAPHIC_REGIONS
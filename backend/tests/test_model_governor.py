@@ -0,0 +1,118 @@
+import asyncio
+
+import httpx
+import pytest
+
+import app as backend
+from app import GovernorTimeout, ModelGovernor
+from conftest import sse
+
+
+@pytest.fixture
+def governor(tmp_path, monkeypatch):
+    monkeypatch.setitem(backend.app.config, 'GOVERNOR_MAX_WAIT_SECONDS', 0.2)
+    return ModelGovernor(str(tmp_path / 'governor.sqlite3'))
+
+
+def buckets(governor, model):
+    conn = governor._connect()
+    try:
+        return governor._load_buckets(conn, model, governor.limits_for(model), backend.time.time())
+    finally:
+        conn.close()
+
+
+def test_retry_draws_another_request_token(governor, monkeypatch):
+    monkeypatch.setitem(backend.app.config['GOVERNOR_MODEL_LIMITS'], 'test/rpm', {"rpm": 2})
+
+    async def scenario():
+        async with governor.acquire('test/rpm', 10):
+            await governor.readmit('test/rpm')
+            with pytest.raises(GovernorTimeout):
+                await governor.readmit('test/rpm')
+
+    asyncio.run(scenario())
+    assert governor.stats()["models"]["test/rpm"]["retries_admitted"] == 1
+
+
+def test_actual_usage_refunds_the_estimate(governor, monkeypatch):
+    monkeypatch.setitem(backend.app.config['GOVERNOR_MODEL_LIMITS'], 'test/tpm', {"tpm": 10000})
+
+    async def scenario():
+        async with governor.acquire('test/tpm', 6000) as usage:
+            usage["actual_tokens"] = 1000
+
+    asyncio.run(scenario())
+    # Refill over the test's runtime only ever adds a few tokens
+    assert 9000 <= buckets(governor, 'test/tpm')[1] < 9100
+
+
+def test_streamed_call_reports_actual_tokens(openrouter, monkeypatch):
+    service, fake, run = openrouter
+    model = 'test/stream-usage'
+    monkeypatch.setitem(backend.app.config['GOVERNOR_MODEL_LIMITS'], model, {"tpm": 100000})
+    fake.handlers = {model: lambda body: httpx.Response(200, content=sse(
+        {"choices": [{"delta": {"content": "hello"}}]},
+        {"choices": [{"delta": {}}], "usage": {"prompt_tokens": 40, "completion_tokens": 10, "total_tokens": 50}}
+    ))}
+    payload = {"model": model, "max_tokens": 6000, "messages": [{"role": "user", "content": "hi"}]}
+
+    async def call():
+        return ''.join([delta async for delta in service._stream_chat(payload)])
+
+    assert run(call) == "hello"
+    # Without the refund the 6000-token max_tokens estimate would still be charged
+    assert buckets(backend.model_governor, model)[1] > 100000 - 100
+
+
+def lease_count(governor, model):
+    conn = governor._connect()
+    try:
+        now = backend.time.time()
+        return conn.execute(
+            "SELECT COUNT(*) FROM governor_leases WHERE model = ? AND expires_at >= ?", (model, now)
+        ).fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_held_lease_is_renewed_past_its_lifetime(governor, monkeypatch):
+    monkeypatch.setitem(backend.app.config, 'GOVERNOR_LEASE_SECONDS', 0.3)
+    monkeypatch.setitem(backend.app.config['GOVERNOR_MODEL_LIMITS'], 'test/long', {"max_in_flight": 1})
+
+    async def scenario():
+        async with governor.acquire('test/long', 10):
+            await asyncio.sleep(0.7)
+            assert lease_count(governor, 'test/long') == 1
+            # The live lease still holds the only slot
+            with pytest.raises(GovernorTimeout):
+                async with governor.acquire('test/long', 10):
+                    pass
+        assert lease_count(governor, 'test/long') == 0
+
+    asyncio.run(scenario())
+
+
+def test_local_release_wakes_waiter_without_holding_poll_lock(governor, monkeypatch):
+    monkeypatch.setitem(backend.app.config, 'GOVERNOR_MAX_WAIT_SECONDS', 5)
+    monkeypatch.setitem(backend.app.config['GOVERNOR_MODEL_LIMITS'], 'test/slots', {"max_in_flight": 1})
+
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        admitted_at = {}
+
+        async def waiter():
+            async with governor.acquire('test/slots', 10):
+                admitted_at['waiter'] = loop.time()
+
+        async with governor.acquire('test/slots', 10):
+            task = asyncio.create_task(waiter())
+            await asyncio.sleep(1.2)
+            # The waiter sleeps between polls with the poll lock free
+            assert not governor._queue_for('test/slots')["lock"].locked()
+            released_at = loop.time()
+        await task
+        return admitted_at['waiter'] - released_at
+
+    # Backoff has reached a full second by now; the release event cuts that short
+    assert asyncio.run(scenario()) < 0.15
@@ -0,0 +1,26 @@
+import asyncio
+
+import httpx
+
+from conftest import completion
+
+
+def test_connection_counts_are_read_on_the_client_loop(openrouter):
+    service, fake, run = openrouter
+    fake.handlers = {'test/pool': lambda body: httpx.Response(200, json=completion("ok"))}
+
+    async def call():
+        await service._post_chat({"model": 'test/pool', "messages": [{"role": "user", "content": "hi"}]})
+        # The health endpoint asks from a request thread, not the loop
+        return await asyncio.to_thread(service.pool_stats)
+
+    stats = run(call)
+    assert stats["requests_total"] >= 1
+    assert isinstance(stats["connections_in_use"], int) and isinstance(stats["connections_idle"], int)
+
+
+def test_no_client_reports_unknown_counts():
+    from app import AIService
+
+    stats = AIService().pool_stats()
+    assert stats["connections_in_use"] is None and stats["connections_idle"] is None
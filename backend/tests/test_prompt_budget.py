@@ -0,0 +1,68 @@
+import app as backend
+from app import PromptTemplate, allocate_token_budget, approx_token_count, fit_text_to_tokens
+
+
+class TestFitTextToTokens:
+    def test_unbudgeted_or_fitting_text_is_unchanged(self):
+        assert fit_text_to_tokens("a b c", None) == "a b c"
+        assert fit_text_to_tokens("a b c", 3) == "a b c"
+
+    def test_drops_trailing_lines_first(self):
+        text = "- first point\n- second point\n- third point"
+        fitted = fit_text_to_tokens(text, 6)
+        assert fitted == "- first point\n- second point"
+        assert approx_token_count(fitted) <= 6
+
+    def test_cuts_single_line_at_word_boundary(self):
+        fitted = fit_text_to_tokens("alpha beta gamma delta epsilon", 3)
+        assert fitted == "alpha beta…"
+        assert approx_token_count(fitted) <= 3
+
+    def test_nothing_fits(self):
+        assert fit_text_to_tokens("alpha beta", 1) == ''
+
+    def test_long_inputs_are_not_memoised(self):
+        backend._count_short_tokens.cache_clear()
+        text = "word " * 1000
+        fit_text_to_tokens(text, 50)
+        # Neither the input nor the prefixes tried by the search are kept
+        assert backend._count_short_tokens.cache_info().currsize == 0
+
+
+class TestAllocateTokenBudget:
+    def test_everything_fits(self):
+        grants = allocate_token_budget({"a": 10, "b": 20}, 100, {}, {})
+        assert grants == {"a": 10, "b": 20}
+
+    def test_higher_priority_is_served_first(self):
+        grants = allocate_token_budget({"high": 50, "low": 50}, 60, {"high": 2, "low": 1}, {})
+        assert grants == {"high": 50, "low": 10}
+
+    def test_minimums_survive_a_tight_budget(self):
+        grants = allocate_token_budget({"high": 50, "low": 50}, 60, {"high": 2, "low": 1}, {"low": 20})
+        assert grants == {"high": 40, "low": 20}
+
+    def test_short_slots_fill_and_long_slots_share(self):
+        grants = allocate_token_budget({"short": 5, "long1": 100, "long2": 100}, 65, {}, {})
+        assert grants == {"short": 5, "long1": 30, "long2": 30}
+
+    def test_negative_budget_grants_nothing(self):
+        assert allocate_token_budget({"a": 10}, -5, {}, {"a": 3}) == {"a": 0}
+
+
+class TestPromptTemplate:
+    def test_budgeted_render_is_bounded_and_memoised(self, monkeypatch):
+        monkeypatch.setattr(backend, 'PROMPT_RENDER_MEMO_MAX_CHARS', 200)
+        template = PromptTemplate("Notes: {notes}", limits={"notes": 5})
+
+        first = template.render(notes="one two three four five six seven")
+        assert first == "Notes: one two three four…"
+        assert template.render(notes="one two three four five six seven") is first
+        for index in range(20):
+            template.render(notes=f"filler {index} " + "x" * 30)
+        assert template._memo_chars <= 200
+
+    def test_unbudgeted_render_skips_memo(self):
+        template = PromptTemplate("Hello {name}")
+        assert template.render(name="world") == "Hello world"
+        assert not template._memo
@@ -0,0 +1,79 @@
+import httpx
+
+import app as backend
+from app import (
+    ANALYSIS_PROMPT, GENERATION_PROMPT, PROMPT_CACHE_MIN_TOKENS, content_token_estimate, with_cache_breakpoint
+)
+from conftest import completion
+
+
+def user_message(*parts):
+    return {"role": "user", "content": list(parts)}
+
+
+def text(value):
+    return {"type": "text", "text": value}
+
+
+LOGO = {"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA"}}
+
+
+class TestWithCacheBreakpoint:
+    def test_short_prefix_is_left_unmarked(self):
+        messages = [user_message(text("short instructions"), text("request"))]
+        assert with_cache_breakpoint(messages, 1) == messages
+
+    def test_breakpoint_goes_on_the_last_static_part(self):
+        static = text("word " * PROMPT_CACHE_MIN_TOKENS)
+        marked = with_cache_breakpoint([user_message(static, LOGO, text("request"))], 2)[0]["content"]
+        assert "cache_control" not in marked[0]
+        assert marked[1]["cache_control"] == {"type": "ephemeral"}
+        assert "cache_control" not in marked[2]
+
+    def test_earlier_messages_count_towards_the_prefix(self):
+        half = "word " * (PROMPT_CACHE_MIN_TOKENS // 2 + 1)
+        messages = [{"role": "system", "content": half}, user_message(text(half), text("request"))]
+        assert "cache_control" in with_cache_breakpoint(messages, 1)[1]["content"][0]
+        assert "cache_control" not in with_cache_breakpoint(messages[1:], 1)[0]["content"][0]
+
+    def test_analysis_prefix_is_below_the_minimum(self):
+        parts = ANALYSIS_PROMPT.render_parts(raw_notes="notes", client_name="Acme", industry="Retail")
+        assert content_token_estimate(parts[:1]) < PROMPT_CACHE_MIN_TOKENS
+        assert with_cache_breakpoint([user_message(*parts)], 1)[0]["content"] == parts
+
+
+class TestPreparePayload:
+    def payload(self, static_words):
+        return {"messages": with_cache_breakpoint([user_message(text("word " * static_words), text("x"))], 1)}
+
+    def test_usage_accounting_only_with_a_breakpoint(self, openrouter):
+        service = openrouter[0]
+        routed = service._prepare_payload(self.payload(PROMPT_CACHE_MIN_TOKENS), 'anthropic/claude-haiku-4.5')
+        assert routed["usage"] == {"include": True}
+        assert "cache_control" in routed["messages"][0]["content"][0]
+
+        assert "usage" not in service._prepare_payload(self.payload(10), 'anthropic/claude-haiku-4.5')
+
+    def test_other_providers_never_see_markers(self, openrouter):
+        service = openrouter[0]
+        routed = service._prepare_payload(self.payload(PROMPT_CACHE_MIN_TOKENS), 'openai/gpt-4o')
+        assert "usage" not in routed
+        assert all("cache_control" not in part for part in routed["messages"][0]["content"])
+
+
+def test_generation_request_caches_through_the_logo(openrouter, monkeypatch):
+    service, fake, run = openrouter
+    model = backend.app.config['MODEL_CASE_STUDY_IMAGE']
+    monkeypatch.setattr(service, 'api_key', 'test-key')
+    fake.handlers = {model: lambda body: httpx.Response(200, json=completion('{"title": "Case"}'))}
+
+    run(lambda: service.generate_case_study({"clientName": "Acme", "industry": "Retail"}))
+
+    content = fake.requests[0]["messages"][0]["content"]
+    assert [part["type"] for part in content] == ["text", "image_url", "text"]
+    assert content[0]["text"] == GENERATION_PROMPT.prefix
+    assert "cache_control" not in content[0]
+    # The constant logo sits inside the cached prefix; the case study data follows it
+    assert content[1]["cache_control"] == {"type": "ephemeral"}
+    assert "cache_control" not in content[2]
+    assert fake.requests[0]["usage"] == {"include": True}
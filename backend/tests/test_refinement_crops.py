@@ -0,0 +1,56 @@
+import pytest
+
+import app as backend
+from app import INFOGRAPHIC_REGIONS, determine_relevant_crops, select_crops_within_budget
+
+
+@pytest.fixture(autouse=True)
+def image_costs(monkeypatch):
+    # One second per image plus one per MB keeps the seconds budget easy to reason about
+    monkeypatch.setitem(backend.app.config, 'REFINEMENT_IMAGE_SECONDS_EACH', 1.0)
+    monkeypatch.setitem(backend.app.config, 'REFINEMENT_IMAGE_SECONDS_PER_MB', 1.0)
+
+
+def candidate(crop_type, full_size, thumb_size):
+    return (crop_type, 'f' * full_size, 't' * thumb_size)
+
+
+class TestDetermineRelevantCrops:
+    def test_results_feedback_maps_to_metrics_region(self):
+        assert determine_relevant_crops("Make the results pop") == ['metrics']
+        assert determine_relevant_crops("fix the metric numbers and the outcome") == ['metrics']
+
+    def test_every_crop_is_a_known_region(self):
+        feedback = "title metric challenge solution result color"
+        assert set(determine_relevant_crops(feedback)) <= set(INFOGRAPHIC_REGIONS)
+
+
+class TestSelectCropsWithinBudget:
+    def test_everything_fits_at_full_size(self):
+        candidates = [candidate('title', 100, 10), candidate('metrics', 100, 10)]
+        assert select_crops_within_budget(candidates, 1000, 60) == [
+            ('title', 'f' * 100, False), ('metrics', 'f' * 100, False)
+        ]
+
+    def test_thumbnails_first_then_upgrades_in_rank_order(self):
+        candidates = [candidate('title', 100, 10), candidate('metrics', 100, 10)]
+        assert select_crops_within_budget(candidates, 120, 60) == [
+            ('title', 'f' * 100, False), ('metrics', 't' * 10, True)
+        ]
+
+    def test_keeps_longest_ranked_prefix_that_fits(self):
+        candidates = [candidate('title', 100, 50), candidate('metrics', 100, 50), candidate('solution', 100, 50)]
+        selected = select_crops_within_budget(candidates, 110, 60)
+        assert [crop_type for crop_type, _, _ in selected] == ['title', 'metrics']
+        assert all(is_thumb for _, _, is_thumb in selected)
+
+    def test_seconds_budget_limits_crop_count(self):
+        candidates = [candidate('title', 10, 5), candidate('metrics', 10, 5), candidate('solution', 10, 5)]
+        assert len(select_crops_within_budget(candidates, 10000, 2.5)) == 2
+
+    def test_missing_thumbnail_uses_full_crop(self):
+        selected = select_crops_within_budget([('title', 'f' * 40, None)], 100, 60)
+        assert selected == [('title', 'f' * 40, False)]
+
+    def test_nothing_fits(self):
+        assert select_crops_within_budget([candidate('title', 100, 50)], 10, 60) == []
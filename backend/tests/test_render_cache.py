@@ -0,0 +1,65 @@
+import os
+
+import app as backend
+from app import RenderCache
+
+
+def test_memory_lru_evicts_by_bytes_without_disk():
+    cache = RenderCache(memory_max_bytes=25)
+    cache.set("a", b"x" * 10)
+    cache.set("b", b"y" * 10)
+    assert cache.get("a") == b"x" * 10
+    cache.set("c", b"z" * 10)
+
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert cache.stats()["memory_bytes"] == 20
+
+
+def test_evicted_renders_spill_to_disk_and_are_promoted(tmp_path):
+    cache = RenderCache(memory_max_bytes=25, disk_dir=str(tmp_path), disk_max_bytes=1000)
+    cache.set("a", b"x" * 10)
+    cache.set("b", b"y" * 10)
+    cache.set("c", b"z" * 10)
+    assert os.listdir(tmp_path) == ["a"]
+
+    assert cache.get("a") == b"x" * 10
+    stats = cache.stats()
+    assert stats["hits_disk"] == 1 and stats["spills"] >= 1
+    # Promoting "a" pushed "b" out of memory in turn
+    assert "b" in os.listdir(tmp_path)
+
+
+def test_disk_tier_is_trimmed_oldest_first(tmp_path):
+    cache = RenderCache(memory_max_bytes=10, disk_dir=str(tmp_path), disk_max_bytes=20)
+    for index, key in enumerate("abcd"):
+        cache.set(key, bytes([index]) * 10)
+        # Spill order decides age; pin mtimes so equal timestamps cannot reorder it
+        for name in os.listdir(tmp_path):
+            os.utime(tmp_path / name, ("abcd".index(name),) * 2)
+
+    assert sorted(os.listdir(tmp_path)) == ["b", "c"]
+    assert cache.get("a") is None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_oversized_render_skips_memory(tmp_path):
+    cache = RenderCache(memory_max_bytes=10, disk_dir=str(tmp_path), disk_max_bytes=100)
+    cache.set("big", b"x" * 50)
+    assert cache.stats()["memory_entries"] == 0
+    assert cache.get("big") == b"x" * 50
+
+
+def test_key_depends_on_mode_and_content():
+    payload = {"clientName": "Acme", "metrics": [1, 2]}
+    assert RenderCache.make_key("pdf", payload) == RenderCache.make_key("pdf", dict(reversed(payload.items())))
+    assert RenderCache.make_key("pdf", payload) != RenderCache.make_key("html", payload)
+    assert RenderCache.KEY_PATTERN.match(RenderCache.make_key("pdf", payload))
+
+
+def test_html_export_is_not_cached():
+    writes = backend.render_cache.stats()["writes"]
+    response = backend.app.test_client().post('/api/export/html', json={"content": "<p>Cheap to render</p>"})
+    assert response.status_code == 200
+    assert "<p>Cheap to render</p>" in response.get_json()["content"]
+    assert backend.render_cache.stats()["writes"] == writes
@@ -0,0 +1,93 @@
+import threading
+
+import httpx
+
+import app as backend
+from app import ResponseCache, response_cache, set_cache_policy
+from conftest import completion
+
+
+def chat_payload(model, text):
+    return {"model": model, "messages": [{"role": "user", "content": text}]}
+
+
+def test_memory_tier_evicts_least_recently_used_by_bytes():
+    cache = ResponseCache(memory_max_bytes=100, ttls={"scope": 60})
+    cache.set("a", {"v": "x" * 30}, "scope")
+    cache.set("b", {"v": "y" * 30}, "scope")
+    assert cache.get("a") is not None
+    cache.set("c", {"v": "z" * 30}, "scope")
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"v": "x" * 30}
+    assert cache.get("c") == {"v": "z" * 30}
+    assert cache.stats()["evictions"] == 1
+
+
+def test_key_ignores_stream_flag():
+    payload = chat_payload("m", "hi")
+    assert ResponseCache.make_key(payload) == ResponseCache.make_key({**payload, "stream": True})
+
+
+def test_fallback_answer_is_not_cached_under_primary_key(openrouter, monkeypatch):
+    service, fake, run = openrouter
+    monkeypatch.setitem(backend.app.config['MODEL_FALLBACKS'], 'cache_test', ['test/cache-fallback'])
+    fake.handlers = {
+        'test/cache-primary': lambda body: httpx.Response(404, json={"error": "gone"}),
+        'test/cache-fallback': lambda body: httpx.Response(200, json=completion("from fallback"))
+    }
+    payload = chat_payload('test/cache-primary', 'failover')
+
+    async def call():
+        set_cache_policy('prefer')
+        return await service._post_chat(payload, cache_scope='presentation', task='cache_test')
+
+    response = run(call)
+
+    assert fake.models_called() == ['test/cache-primary', 'test/cache-fallback']
+    assert response.json()["choices"][0]["message"]["content"] == "from fallback"
+    assert response_cache.get(ResponseCache.make_key(payload)) is None
+
+
+def test_primary_answer_is_cached(openrouter):
+    service, fake, run = openrouter
+    fake.handlers = {'test/cache-only': lambda body: httpx.Response(200, json=completion("primary"))}
+    payload = chat_payload('test/cache-only', 'cache me')
+
+    async def call():
+        set_cache_policy('prefer')
+        return await service._post_chat(payload, cache_scope='presentation')
+
+    run(call)
+    run(call)
+
+    assert fake.models_called() == ['test/cache-only']
+    assert response_cache.get(ResponseCache.make_key(payload))["choices"][0]["message"]["content"] == "primary"
+
+
+def test_concurrent_first_use_initialises_schema_once(tmp_path, monkeypatch):
+    cache = ResponseCache(memory_max_bytes=0, ttls={"scope": 60},
+                          disk_path=str(tmp_path / 'llm_cache.sqlite3'), disk_max_bytes=10000)
+    setups = []
+    connect = backend.sqlite3.connect
+
+    def counting_connect(path, **kwargs):
+        setups.append(cache._disk_initialized)
+        return connect(path, **kwargs)
+
+    monkeypatch.setattr(backend.sqlite3, 'connect', counting_connect)
+    barrier = threading.Barrier(8)
+
+    def first_use(index):
+        barrier.wait()
+        cache.set(f"k{index}", {"v": index}, "scope")
+
+    threads = [threading.Thread(target=first_use, args=(index,)) for index in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Exactly one connection was opened before the schema existed
+    assert setups.count(False) == 1
+    assert all(cache.get(f"k{index}") == {"v": index} for index in range(8))
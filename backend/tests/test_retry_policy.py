@@ -0,0 +1,126 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httpx
+import pytest
+
+import app as backend
+from app import RetryPolicy, parse_retry_after
+
+
+def response_with(status=503, retry_after=None):
+    headers = {'Retry-After': retry_after} if retry_after is not None else {}
+    return httpx.Response(status, headers=headers)
+
+
+class TestParseRetryAfter:
+    def test_delta_seconds(self):
+        assert parse_retry_after(response_with(retry_after='7')) == 7.0
+
+    def test_negative_is_clamped(self):
+        assert parse_retry_after(response_with(retry_after='-3')) == 0.0
+
+    def test_http_date(self):
+        when = datetime.now(timezone.utc) + timedelta(seconds=30)
+        delay = parse_retry_after(response_with(retry_after=format_datetime(when, usegmt=True)))
+        assert 25 <= delay <= 30
+
+    def test_missing_or_garbage(self):
+        assert parse_retry_after(response_with()) is None
+        assert parse_retry_after(response_with(retry_after='soon')) is None
+        assert parse_retry_after(None) is None
+
+
+class TestBackoff:
+    def test_full_jitter_stays_under_exponential_cap(self):
+        policy = RetryPolicy(max_attempts=5, deadline=60, base_delay=1.0, max_delay=5.0)
+        for attempt, cap in ((1, 1.0), (2, 2.0), (3, 4.0), (4, 5.0), (8, 5.0)):
+            for _ in range(50):
+                assert 0 <= policy.backoff(attempt) <= cap
+
+    def test_retry_after_wins_with_small_jitter(self):
+        policy = RetryPolicy(max_attempts=3, deadline=60, base_delay=1.0, max_delay=2.0)
+        for _ in range(50):
+            assert 10.0 <= policy.backoff(1, retry_after=10.0) <= 11.0
+
+    def test_model_overrides(self, monkeypatch):
+        monkeypatch.setitem(backend.app.config['RETRY_MODEL_POLICIES'], 'test/slow', {"max_attempts": 5, "deadline": 9})
+        policy = RetryPolicy.for_model('test/slow')
+        assert (policy.max_attempts, policy.deadline) == (5, 9.0)
+        assert RetryPolicy.for_model('test/other').max_attempts == backend.app.config['RETRY_MAX_ATTEMPTS']
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record backoff sleeps instead of waiting"""
+    delays = []
+
+    async def fake_sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(backend.asyncio, 'sleep', fake_sleep)
+    return delays
+
+
+def send_sequence(*outcomes):
+    outcomes = list(outcomes)
+
+    async def send(attempt_timeout):
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+    return send
+
+
+def test_retries_transient_status_then_succeeds(sleeps):
+    call = {}
+    response = asyncio.run(backend.ai_service._send_with_retry(
+        'test/retry', send_sequence(response_with(503), httpx.Response(200)), 30, call
+    ))
+    assert response.status_code == 200
+    assert call["attempts"] == 2 and call["retries"] == 1
+    assert len(sleeps) == 1
+
+
+def test_honors_retry_after(sleeps):
+    asyncio.run(backend.ai_service._send_with_retry(
+        'test/retry', send_sequence(response_with(429, retry_after='4'), httpx.Response(200)), 30
+    ))
+    assert 4.0 <= sleeps[0] <= 4.4
+
+
+def test_gives_up_after_attempt_budget(sleeps, monkeypatch):
+    monkeypatch.setitem(backend.app.config['RETRY_MODEL_POLICIES'], 'test/budget', {"max_attempts": 2})
+    response = asyncio.run(backend.ai_service._send_with_retry(
+        'test/budget', send_sequence(response_with(503), response_with(502), httpx.Response(200)), 30
+    ))
+    assert response.status_code == 502
+    assert len(sleeps) == 1
+
+
+def test_stops_when_retry_after_exceeds_deadline(sleeps, monkeypatch):
+    monkeypatch.setitem(backend.app.config['RETRY_MODEL_POLICIES'], 'test/deadline', {"deadline": 5})
+    response = asyncio.run(backend.ai_service._send_with_retry(
+        'test/deadline', send_sequence(response_with(429, retry_after='60'), httpx.Response(200)), 30
+    ))
+    assert response.status_code == 429
+    assert sleeps == []
+
+
+def test_transport_error_is_retried_then_raised(sleeps, monkeypatch):
+    monkeypatch.setitem(backend.app.config['RETRY_MODEL_POLICIES'], 'test/network', {"max_attempts": 2})
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(backend.ai_service._send_with_retry(
+            'test/network', send_sequence(httpx.ConnectError("down"), httpx.ConnectError("still down")), 30
+        ))
+    assert len(sleeps) == 1
+
+
+def test_non_retryable_status_is_returned_immediately(sleeps):
+    response = asyncio.run(backend.ai_service._send_with_retry(
+        'test/retry', send_sequence(response_with(400), httpx.Response(200)), 30
+    ))
+    assert response.status_code == 400
+    assert sleeps == []
@@ -0,0 +1,66 @@
+import asyncio
+
+import httpx
+
+import app as backend
+from app import model_governor, model_router
+from conftest import completion, sse
+
+
+def chat_payload(model):
+    return {"model": model, "messages": [{"role": "user", "content": "hi"}]}
+
+
+def test_governor_wait_is_not_sampled_as_latency(openrouter, monkeypatch):
+    service, fake, run = openrouter
+    model = 'test/sample-queued'
+    monkeypatch.setitem(backend.app.config['GOVERNOR_MODEL_LIMITS'], model, {"max_in_flight": 1})
+    fake.handlers = {model: lambda body: httpx.Response(200, json=completion("ok"))}
+
+    async def call():
+        async def hold_slot():
+            async with model_governor.acquire(model, 10):
+                await asyncio.sleep(0.4)
+
+        holder = asyncio.create_task(hold_slot())
+        await asyncio.sleep(0.05)
+        await service._post_chat(chat_payload(model))
+        await holder
+
+    run(call)
+    stats = model_router.model_stats(model)
+    assert stats["samples"] == 1 and stats["error_rate"] == 0.0
+    assert stats["p50"] < 0.2
+
+
+def test_each_attempt_is_sampled_without_backoff(openrouter):
+    service, fake, run = openrouter
+    model = 'test/sample-retried'
+    responses = iter([httpx.Response(503, headers={"Retry-After": "0.4"}), httpx.Response(200, json=completion("ok"))])
+    fake.handlers = {model: lambda body: next(responses)}
+
+    async def call():
+        return await service._post_chat(chat_payload(model))
+
+    assert run(call).status_code == 200
+    stats = model_router.model_stats(model)
+    assert stats["samples"] == 2 and stats["error_rate"] == 0.5
+    assert stats["p50"] < 0.2
+
+
+def test_stream_samples_time_to_headers(openrouter):
+    service, fake, run = openrouter
+    model = 'test/sample-stream'
+    fake.handlers = {model: lambda body: httpx.Response(200, content=sse({"choices": [{"delta": {"content": "ok"}}]}))}
+
+    async def call():
+        deltas = []
+        async for delta in service._stream_chat(chat_payload(model)):
+            # A slow consumer is local work, not model latency
+            await asyncio.sleep(0.3)
+            deltas.append(delta)
+        return deltas
+
+    assert run(call) == ["ok"]
+    stats = model_router.model_stats(model)
+    assert stats["samples"] == 1 and stats["p50"] < 0.2
@@ -0,0 +1,44 @@
+import io
+
+from PIL import Image
+
+import app as backend
+from app import StaticAssetRegistry
+
+
+def write_png(path, color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (16, 16), color).save(buffer, format='PNG')
+    path.write_bytes(buffer.getvalue())
+
+
+def test_derived_value_is_built_once_per_asset_version(tmp_path, monkeypatch):
+    monkeypatch.setitem(backend.app.config, 'STATIC_ASSET_CHECK_INTERVAL', 0)
+    write_png(tmp_path / 'logo.png', 'red')
+    registry = StaticAssetRegistry(str(tmp_path))
+    registry.register("logo", "logo.png")
+    registry.preload()
+    builds = []
+
+    def build(data_url):
+        builds.append(data_url)
+        return f"optimized:{len(builds)}"
+
+    assert registry.derived("logo", "original", "upload", build) == "optimized:1"
+    assert registry.derived("logo", "original", "upload", build) == "optimized:1"
+
+    write_png(tmp_path / 'logo.png', 'blue')
+    backend.os.utime(tmp_path / 'logo.png', (1, 1))
+    assert registry.derived("logo", "original", "upload", build) == "optimized:2"
+    assert builds[0] != builds[1]
+    assert registry.derived("missing", "original", "upload", build) is None
+
+
+def test_logo_is_optimized_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(backend.upload_images, 'data_url', lambda ref, profile: calls.append(profile) or ref)
+    backend.static_assets._assets["logo"]["derived"].clear()
+
+    first = backend.load_logo_as_base64()
+    assert backend.load_logo_as_base64() is first
+    assert calls == ["logo"]
@@ -0,0 +1,50 @@
+import httpx
+import pytest
+
+import app as backend
+from app import circuit_breaker, model_governor, model_router
+from conftest import sse
+
+
+def collect(service, payload, task=None):
+    async def call():
+        return ''.join([delta async for delta in service._stream_chat(payload, task=task)])
+    return call
+
+
+def chat_payload(model):
+    return {"model": model, "messages": [{"role": "user", "content": "notes"}]}
+
+
+def test_governor_timeout_fails_over_to_next_candidate(openrouter, monkeypatch):
+    service, fake, run = openrouter
+    primary, fallback = 'test/stream-gov-primary', 'test/stream-gov-fallback'
+    monkeypatch.setitem(backend.app.config['MODEL_FALLBACKS'], 'stream_gov', [fallback])
+    monkeypatch.setitem(backend.app.config['GOVERNOR_MODEL_LIMITS'], primary, {"rpm": 1})
+    monkeypatch.setitem(backend.app.config, 'GOVERNOR_MAX_WAIT_SECONDS', 0.2)
+    # Drain the primary's only request token so admission has to wait a full minute
+    model_governor._try_take_request(primary, model_governor.limits_for(primary))
+    fake.handlers = {fallback: lambda body: httpx.Response(200, content=sse({"choices": [{"delta": {"content": "ok"}}]}))}
+
+    assert run(collect(service, chat_payload(primary), task='stream_gov')) == "ok"
+    assert fake.models_called() == [fallback]
+    assert model_router.model_stats(primary)["error_rate"] == 1.0
+    # Our own limiter, not the model, was the problem
+    assert primary not in circuit_breaker.stats()["models"] or \
+        circuit_breaker.stats()["models"][primary]["consecutive_failures"] == 0
+
+
+@pytest.mark.parametrize("body", [
+    sse({"choices": [{"delta": {"content": "par"}}]}, {"error": {"message": "overloaded"}}),
+    b'data: {"choices": [{"delta": {"content": "par"}}]}\n\ndata: {not json\n\n'
+])
+def test_mid_stream_failure_is_recorded(openrouter, body):
+    service, fake, run = openrouter
+    model = f'test/stream-midway-{len(body)}'
+    fake.handlers = {model: lambda request_body: httpx.Response(200, content=body)}
+
+    with pytest.raises(Exception):
+        run(collect(service, chat_payload(model)))
+
+    assert model_router.model_stats(model)["error_rate"] == 1.0
+    assert circuit_breaker.stats()["models"][model]["consecutive_failures"] == 1
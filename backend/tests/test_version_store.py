@@ -0,0 +1,59 @@
+import base64
+import io
+import os
+from datetime import datetime
+
+from PIL import Image
+
+from app import VersionStore, image_blobs
+
+
+def png_data_url(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (64, 64), color).save(buffer, format='PNG', compress_level=0)
+    return f"data:image/png;base64,{base64.b64encode(buffer.getvalue()).decode('utf-8')}"
+
+
+def test_versions_reference_images_in_the_blob_store(tmp_path):
+    store = VersionStore(str(tmp_path / 'versions.sqlite3'), max_versions=3, ttl_seconds=60)
+    infographic = png_data_url('red')
+    store.append('gen', {"images": [{"url": infographic}], "title": "v1"})
+    store.append('gen', {"images": [{"url": infographic}], "title": "v2"})
+
+    with store._connect() as conn:
+        documents = [row["data"] for row in conn.execute("SELECT data FROM versions")]
+    image_id = image_blobs.put(base64.b64decode(infographic.split(',', 1)[1]))
+    assert all(image_id in document and 'base64' not in document for document in documents)
+    assert store.previous('gen') == {"images": [{"url": infographic}], "title": "v1"}
+
+
+def test_keeps_newest_versions_per_generation(tmp_path):
+    store = VersionStore(str(tmp_path / 'versions.sqlite3'), max_versions=2, ttl_seconds=60)
+    for title in ("v1", "v2", "v3"):
+        store.append('gen', {"title": title})
+    with store._connect() as conn:
+        assert conn.execute("SELECT COUNT(*) FROM versions").fetchone()[0] == 2
+    assert store.previous('gen') == {"title": "v2"}
+    assert store.previous('other') is None
+
+
+def test_missing_image_restores_as_none(tmp_path):
+    store = VersionStore(str(tmp_path / 'versions.sqlite3'), max_versions=3, ttl_seconds=60)
+    infographic = png_data_url('blue')
+    store.append('gen', {"url": infographic})
+    store.append('gen', {"url": infographic})
+    os.remove(image_blobs.path(image_blobs.put(base64.b64decode(infographic.split(',', 1)[1]))))
+
+    assert store.previous('gen') == {"url": None}
+
+
+def test_list_is_newest_first_with_numbers_and_timestamps(tmp_path):
+    store = VersionStore(str(tmp_path / 'versions.sqlite3'), max_versions=2, ttl_seconds=60)
+    ids = [store.append('gen', {"title": title}) for title in ("v1", "v2", "v3")]
+
+    versions = store.list('gen')
+    assert [(entry["version"], entry["version_id"]) for entry in versions] == [(2, ids[2]), (1, ids[1])]
+    timestamps = [datetime.fromisoformat(entry["timestamp"]) for entry in versions]
+    assert timestamps[0] >= timestamps[1]
+    assert timestamps[0].tzinfo is not None
+    assert store.list('other') == []